@@ -0,0 +1,124 @@
+"""
+Admission Control for the Load Balancer
+Per-backend concurrency limits, a bounded wait queue and per-user token buckets
+"""
+
+import threading
+import time
+
+BUSY_PREFIX = "BUSY retry_after="
+
+def busy_message(retry_after):
+    """The explicit "busy, retry after" reply clients get instead of a timeout"""
+    return f"{BUSY_PREFIX}{retry_after:.2f}".encode()
+
+def parse_busy(data):
+    """Seconds to wait if data is a busy reply, else None"""
+    if isinstance(data, bytes):
+        data = data.decode(errors='replace')
+    if not data.startswith(BUSY_PREFIX):
+        return None
+    try:
+        return float(data[len(BUSY_PREFIX):].split()[0])
+    except (ValueError, IndexError):
+        return 1.0
+
+class TokenBucket:
+    """rate tokens per second, holding at most burst"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.time()
+
+    def take(self):
+        """Spend a token; returns 0, or the seconds until one will be available"""
+        now = time.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+class AdmissionController:
+    """Decide whether a request may go to a backend now, wait briefly, or be turned away.
+
+    Each backend takes at most max_per_backend requests (or sessions,
+    in the connection-level modes) at once. A request finding every
+    backend full waits in a queue of at most queue_size for up to
+    queue_timeout seconds; past either bound it is rejected straight
+    away with a retry-after hint, so overload shows up as fast explicit
+    refusals rather than timeouts everywhere. Separately, each username
+    gets a token bucket of rate requests per second. Zero disables a limit.
+    """
+
+    def __init__(self, max_per_backend=0, queue_size=128, queue_timeout=1.0, rate=0, burst=None):
+        self.max_per_backend = max_per_backend
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.buckets = {}  # username -> TokenBucket
+        self.bucket_lock = threading.Lock()
+        self.slots = threading.Condition()
+        self.waiting = 0
+        self.stats = {'admitted': 0, 'queued': 0, 'rejected_busy': 0, 'rejected_timeout': 0, 'rejected_rate': 0}
+
+    def has_room(self, backend):
+        return not self.max_per_backend or backend.in_flight < self.max_per_backend
+
+    def check_rate(self, username):
+        """0 if username may send a request now, else the seconds until it may"""
+        if not self.rate:
+            return 0
+        with self.bucket_lock:
+            bucket = self.buckets.get(username)
+            if bucket is None:
+                bucket = self.buckets[username] = TokenBucket(self.rate, self.burst)
+            wait = bucket.take()
+        if wait:
+            self.stats['rejected_rate'] += 1
+        return wait
+
+    def admit(self, pick, block=True):
+        """Call pick() until it claims a backend slot, queueing if every backend is full.
+
+        pick() returns a server (having counted itself in) or None when
+        all are full. Returns (server, None) on success, or
+        (None, retry_after) when the request should be turned away.
+        """
+        with self.slots:
+            server = pick()
+            if server is None and block and self.waiting < self.queue_size:
+                self.waiting += 1
+                self.stats['queued'] += 1
+                deadline = time.time() + self.queue_timeout
+                try:
+                    while server is None:
+                        remaining = deadline - time.time()
+                        if remaining <= 0:
+                            self.stats['rejected_timeout'] += 1
+                            return None, self.retry_after()
+                        self.slots.wait(remaining)
+                        server = pick()
+                finally:
+                    self.waiting -= 1
+            if server is None:
+                self.stats['rejected_busy'] += 1
+                return None, self.retry_after()
+            self.stats['admitted'] += 1
+            return server, None
+
+    def release(self):
+        """A backend slot freed up: let one queued request try again"""
+        with self.slots:
+            self.slots.notify()
+
+    def retry_after(self):
+        # Roughly how long the current queue takes to drain
+        return self.queue_timeout * (1 + self.waiting / max(1, self.queue_size))
+
+    def get_stats(self):
+        return dict(self.stats, waiting=self.waiting, users=len(self.buckets))
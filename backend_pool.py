@@ -0,0 +1,147 @@
+"""
+Backend Connection Pool for the Load Balancer
+Persistent pipelined connections to each server; responses matched to requests by id
+"""
+
+import socket
+import threading
+from protocol import send_message, recv_message, pipeline_hello, pipeline_accepted
+
+class BackendConnection:
+    """One persistent connection to a server in pipeline mode.
+
+    Requests are written as frames tagged with an id and may overlap;
+    a reader thread hands each response to the callback registered
+    under its id. If the connection drops, every request still waiting
+    on it is answered with an error marked 'lost' (unlike an error the
+    server itself sent back) so no client waits forever. Frames
+    are compressed if the server agrees to the compression offered.
+    """
+
+    def __init__(self, server, on_close=None, timeout=5, compression=None):
+        self.server = server
+        self.on_close = on_close
+        self.sock = socket.create_connection(server, timeout=timeout)
+        try:
+            self.sock.sendall(pipeline_hello(compression))
+            reply = self.sock.recv(1024)
+        except OSError:
+            self.sock.close()
+            raise
+        accepted, self.compression = pipeline_accepted(reply, compression)
+        if not accepted:
+            self.sock.close()
+            raise ConnectionError(f"{server} refused pipeline mode: {reply!r}")
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.write_lock = threading.Lock()  # one frame at a time on the wire
+        self.lock = threading.Lock()        # guards alive and pending against a concurrent failure
+        self.pending = {}  # request id -> callback(response)
+        self.alive = True
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def send(self, request, callback):
+        """Write one request; callback(response) runs on the reader thread.
+
+        Raises OSError if the request could not be written and its callback
+        will never run. If the connection failed while writing but the
+        reader already answered the callback with a lost error, the failure
+        is the callback's to handle and send returns normally.
+        """
+        with self.write_lock:
+            with self.lock:
+                if not self.alive:
+                    raise ConnectionError(f"connection to {self.server} is closed")
+                self.pending[request['id']] = callback
+            try:
+                send_message(self.sock, request, self.compression)
+            except OSError:
+                with self.lock:
+                    ours = self.pending.pop(request['id'], None) is not None
+                self._fail()
+                if ours:
+                    raise
+
+    def _read_loop(self):
+        try:
+            while True:
+                response = recv_message(self.sock, self.compression)
+                if response is None:
+                    break
+                callback = self.pending.pop(response['id'], None)
+                if callback:
+                    callback(response)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._fail()
+
+    def _fail(self):
+        with self.lock:
+            if not self.alive:
+                return
+            self.alive = False
+            pending, self.pending = self.pending, {}
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        for request_id, callback in pending.items():
+            callback({'id': request_id, 'error': f"connection to {self.server} lost", 'lost': True})
+        if self.on_close:
+            self.on_close(self)
+
+    def close(self):
+        self._fail()
+
+class BackendPool:
+    """Up to `size` persistent connections to one server, opened on demand.
+
+    A request goes to an idle connection if there is one, otherwise a new
+    connection is opened until the pool is full, after which requests are
+    pipelined onto the connection with the fewest outstanding.
+    """
+
+    def __init__(self, server, size=4, compression=None):
+        self.server = server
+        self.size = size
+        self.compression = compression
+        self.connections = []
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def submit(self, request, callback):
+        """Send a request (which must carry an 'id'); raises OSError if the server cannot be reached"""
+        self._connection().send(request, callback)
+
+    def _connection(self):
+        with self.lock:
+            self.connections = [conn for conn in self.connections if conn.alive]
+            idle = [conn for conn in self.connections if not conn.pending]
+            if idle:
+                return idle[0]
+            if len(self.connections) < self.size:
+                conn = BackendConnection(self.server, on_close=self._discard, compression=self.compression)
+                self.connections.append(conn)
+                self.opened += 1
+                return conn
+            return min(self.connections, key=lambda conn: len(conn.pending))
+
+    def _discard(self, conn):
+        with self.lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+
+    def close(self):
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for conn in connections:
+            conn.close()
+
+    def snapshot(self):
+        connections = list(self.connections)
+        return {
+            'connections': len(connections),
+            'opened': self.opened,
+            'outstanding': sum(len(conn.pending) for conn in connections)
+        }
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Admission control benchmark
+Overload an l7 load balancer with more clients than its servers can serve, with and without limits
+"""
+
+import argparse
+import contextlib
+import io
+import socket
+import threading
+import time
+from admission import AdmissionController, parse_busy
+from bench_l7 import fake_server
+from load_balancer import LoadBalancer
+
+BASE_PORT = 19600
+
+def client(port, username, seconds, results):
+    """Check documents back to back; on a busy reply, wait as told and carry on"""
+    ok, busy = [], []
+    with socket.create_connection(('localhost', port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(username.encode())
+        sock.recv(1024)
+        deadline = time.time() + seconds
+        n = 0
+        while time.time() < deadline:
+            start = time.time()
+            sock.sendall(f"Ydoc{n}.txt".encode())
+            time.sleep(0.05)  # the name and the content are separate messages (client.py waits 0.1 s)
+            sock.sendall(f"document {n} from {username}".encode())
+            reply = sock.recv(4096)
+            while reply == b"LEXICON_POLL":
+                reply = sock.recv(4096)
+            retry_after = parse_busy(reply)
+            if retry_after is None:
+                ok.append(time.time() - start)
+            else:
+                busy.append(time.time() - start)
+                time.sleep(retry_after)
+            n += 1
+        sock.sendall(b"Disconnect_Client")
+    results.append((ok, busy))
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load shedding under overload")
+    parser.add_argument('--servers', type=int, default=2)
+    parser.add_argument('--clients', type=int, default=40)
+    parser.add_argument('--seconds', type=float, default=4)
+    parser.add_argument('--delay-ms', type=float, default=20, help="server time per check")
+    parser.add_argument('--max-per-backend', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=8)
+    parser.add_argument('--queue-timeout', type=float, default=0.1)
+    args = parser.parse_args()
+
+    configs = [
+        ("no limits", AdmissionController()),
+        ("limits", AdmissionController(args.max_per_backend, args.queue_size, args.queue_timeout)),
+    ]
+    log = io.StringIO()  # the balancer logs every request; keep it off the report
+    rows = []
+    for offset, (name, admission) in enumerate(configs):
+        counts = {}
+        ports = [BASE_PORT + 10 * offset + i for i in range(args.servers)]
+        with contextlib.redirect_stdout(log):
+            for port in ports:
+                fake_server(port, args.delay_ms / 1000, counts)
+            lb = LoadBalancer(BASE_PORT + 50 + offset, 'least-connections', 'l7', admission=admission)
+            for port in ports:
+                lb.add_server('localhost', port)
+                lb.health_monitor.ping_server(('localhost', port))
+            threading.Thread(target=lb.start, daemon=True).start()
+            time.sleep(0.2)
+            results = []
+            threads = [threading.Thread(target=client, args=(lb.port, f"user{i}", args.seconds, results))
+                       for i in range(args.clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            lb.stop()
+        ok = [latency for done, _ in results for latency in done]
+        busy = [latency for _, refused in results for latency in refused]
+        rows.append(f"{name:<12}{len(ok) / args.seconds:>9.1f}{percentile(ok, 0.5) * 1000:>9.0f}"
+                    f"{percentile(ok, 0.99) * 1000:>9.0f}{len(busy):>8}{percentile(busy, 0.99) * 1000:>12.0f}")
+
+    capacity = args.servers * 1000 / args.delay_ms
+    print("=" * 64)
+    print(f"ADMISSION TEST: {args.clients} clients, {args.servers} servers "
+          f"({capacity:.0f} checks/s capacity), limit {args.max_per_backend}/backend, "
+          f"queue {args.queue_size} for {args.queue_timeout * 1000:.0f} ms")
+    print("=" * 64)
+    print(f"{'config':<12}{'ok/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'busy':>8}{'busy p99 ms':>12}")
+    for row in rows:
+        print(row)
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Content-affinity routing benchmark
+Consistent-hash key movement and balance, plus cache hit rates versus round-robin
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import socket
+import threading
+import time
+from cache_manager import SpellCheckCache
+from load_balancer import LoadBalancer
+from protocol import parse_file_request, recv_exact
+from routing import ConsistentHashRing
+
+BASE_PORT = 19900
+
+def ring_report(keys, servers, vnodes):
+    """Share of keys that move when a server joins or leaves, and the load spread"""
+    ring = ConsistentHashRing(vnodes)
+    ring.sync(servers)
+    before = {key: ring.lookup(key) for key in keys}
+    shares = {}
+    for owner in before.values():
+        shares[owner] = shares.get(owner, 0) + 1
+    spread = max(shares.values()) / (len(keys) / len(servers))
+
+    ring.add(('localhost', 9999))
+    joined = sum(1 for key in keys if ring.lookup(key) != before[key]) / len(keys)
+    ring.remove(('localhost', 9999))
+    ring.remove(servers[0])
+    left = sum(1 for key in keys if ring.lookup(key) != before[key]) / len(keys)
+    return spread, joined, left
+
+def simulate_hit_rate(documents, servers, cache_size, route):
+    """Replay a request stream against one SpellCheckCache per server"""
+    caches = {server: SpellCheckCache(max_size=cache_size, ttl=3600) for server in servers}
+    for n, document in enumerate(documents):
+        cache = caches[route(n, document)]
+        if cache.get(document) is None:
+            cache.put(document, document)
+    hits = sum(cache.hits for cache in caches.values())
+    return hits / len(documents)
+
+def fake_server(port, cache_size, counters):
+    """Speaks the server's protocol (username, then Y<name> + content) with its own cache"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('localhost', port))
+    listener.listen(64)
+    cache = SpellCheckCache(max_size=cache_size, ttl=3600)
+    counters[port] = cache
+
+    def serve(conn):
+        with conn:
+            if conn.recv(1024) == b"HEARTBEAT":
+                conn.sendall(b"ALIVE")
+                return
+            conn.sendall(b"accept")
+            while True:
+                data = conn.recv(1024)
+                if not data or data == b"Disconnect_Client":
+                    return
+                if data.startswith(b"Y"):
+                    request = parse_file_request(data)  # the load balancer sends name and content as one
+                    if request:
+                        _, length, content = request
+                        content = (content + (recv_exact(conn, length - len(content)) or b"")).decode()
+                    else:
+                        content = conn.recv(4096).decode()
+                    if cache.get(content) is None:
+                        cache.put(content, content)
+                    conn.sendall(b"check" + content.encode())
+
+    def accept_loop():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+def client(port, username, documents):
+    with socket.create_connection(('localhost', port)) as sock:
+        sock.sendall(username.encode())
+        sock.recv(1024)
+        for n, document in enumerate(documents):
+            sock.sendall(f"Ydoc{n}.txt".encode())
+            time.sleep(0.02)  # the server reads name and content as separate messages
+            sock.sendall(document.encode())
+            sock.recv(4096)
+        sock.sendall(b"Disconnect_Client")
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-affinity routing benchmark")
+    parser.add_argument('--servers', type=int, default=3)
+    parser.add_argument('--documents', type=int, default=3000, help="distinct documents")
+    parser.add_argument('--requests', type=int, default=30000)
+    parser.add_argument('--cache-size', type=int, default=500, help="entries per server cache")
+    parser.add_argument('--live-requests', type=int, default=150, help="requests per client in the live run")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    servers = [('localhost', BASE_PORT + i) for i in range(args.servers)]
+    corpus = [f"document {i} " + " ".join(rng.choice(["teh", "quick", "brwn", "fox"]) for _ in range(8))
+              for i in range(args.documents)]
+    weights = [1 / (rank + 1) for rank in range(args.documents)]  # Zipf-like popularity
+    stream = rng.choices(corpus, weights, k=args.requests)
+
+    print("=" * 64)
+    print(f"CONTENT AFFINITY TEST: {args.servers} servers, {args.documents} documents, cache {args.cache_size}/server")
+    print("=" * 64)
+    keys = [f"key{i}" for i in range(100000)]
+    for vnodes in (1, 10, 100):
+        spread, joined, left = ring_report(keys, servers, vnodes)
+        print(f"vnodes {vnodes:>3}: busiest server {spread:.2f}x fair share, "
+              f"join moves {joined:.1%} (ideal {1 / (args.servers + 1):.1%}), "
+              f"leave moves {left:.1%} (ideal {1 / args.servers:.1%})")
+
+    ring = ConsistentHashRing()
+    ring.sync(servers)
+    round_robin = simulate_hit_rate(stream, servers, args.cache_size, lambda n, doc: servers[n % len(servers)])
+    affinity = simulate_hit_rate(stream, servers, args.cache_size, lambda n, doc: ring.lookup(doc.encode()))
+    print(f"Simulated hit rate:  round-robin {round_robin:.1%}, consistent-hash {affinity:.1%}")
+
+    # Live run through the load balancer, with fake servers keeping their own caches
+    log = io.StringIO()
+    for offset, name in enumerate(['round-robin', 'consistent-hash']):
+        counters = {}
+        ports = [BASE_PORT + 10 * (offset + 1) + i for i in range(args.servers)]
+        with contextlib.redirect_stdout(log):
+            for port in ports:
+                fake_server(port, args.cache_size // 5, counters)
+            lb = LoadBalancer(BASE_PORT + 50 + offset, name)
+            for port in ports:
+                lb.add_server('localhost', port)
+                lb.health_monitor.ping_server(('localhost', port))
+            threading.Thread(target=lb.start, daemon=True).start()
+            time.sleep(0.2)
+            live = rng.choices(corpus[:args.documents // 5], weights[:args.documents // 5], k=args.live_requests * 4)
+            clients = [threading.Thread(target=client, args=(lb.port, f"user{i}", live[i::4])) for i in range(4)]
+            for thread in clients:
+                thread.start()
+            for thread in clients:
+                thread.join()
+            lb.running = False
+        hits = sum(cache.hits for cache in counters.values())
+        total = sum(cache.hits + cache.misses for cache in counters.values())
+        print(f"Live hit rate ({name}): {hits / total:.1%} over {total} checks")
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
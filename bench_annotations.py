@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Annotation-only response benchmark
+Bytes a check's answer takes as the whole bracketed document and as match spans, and the CPU spent deriving
+the spans at the server and bracketing them at the client, for text from clean to full of lexicon words
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+import zlib
+from protocol import render_matches
+
+def check(text, lexicon):
+    """As the server's lexicon_check"""
+    return " ".join(f"[{word}]" if word.strip('.,!?;:').lower() in lexicon else word
+                    for word in text.strip().split(" "))
+
+def matches(text, checked):
+    """As the server's lexicon_matches"""
+    spans = []
+    offset = len(text) - len(text.lstrip())
+    for word, result in zip(text.strip().split(" "), checked.split(" ")):
+        if result != word:
+            spans.append([offset, len(word), word.strip('.,!?;:').lower()])
+        offset += len(word) + 1
+    return spans
+
+def document(rng, words, lexicon_words, size, rate):
+    """size bytes of lines of README words, each word a lexicon word with probability rate"""
+    out, length = [], 0
+    while length < size:
+        line = " ".join(rng.choice(lexicon_words) if rng.random() < rate else rng.choice(words)
+                        for _ in range(rng.randint(4, 20)))
+        out.append(line)
+        length += len(line) + 1
+    return "\n".join(out)[:size]
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole-document answers against match spans")
+    parser.add_argument('--size', type=int, default=100000, help="document size in bytes")
+    parser.add_argument('--rates', default="0,0.001,0.01,0.1,0.5", help="shares of words in the lexicon")
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "README.md")) as f:
+        words = sorted({word for line in f for word in line.split()})
+    lexicon_words = ["crypto", "cypto", "govement", "liasion", "asap"]
+    lexicon = set(lexicon_words)
+    words = [word for word in words if word.strip('.,!?;:').lower() not in lexicon]
+
+    print("=" * 92)
+    print(f"ANNOTATION-ONLY TEST: {args.size // 1000} KB documents, {args.rounds} checks each")
+    print("=" * 92)
+    print(f"{'matched':>9}{'matches':>9}{'text KB':>10}{'spans KB':>10}{'text zlib':>11}{'spans zlib':>12}"
+          f"{'spans ms':>10}{'render ms':>11}")
+    for rate in (float(rate) for rate in args.rates.split(',')):
+        text = document(rng, words, lexicon_words, args.size, rate)
+        checked = check(text, lexicon)
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            spans = matches(text, checked)
+        spans_ms = (time.perf_counter() - start) / args.rounds * 1000
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            rendered = render_matches(text, spans)
+        render_ms = (time.perf_counter() - start) / args.rounds * 1000
+        assert rendered == checked
+        # The frames a pipelined connection carries, plain and at the default zlib level
+        text_frame = json.dumps({'id': 1, 'text': checked}, separators=(',', ':')).encode("utf-8")
+        spans_frame = json.dumps({'id': 1, 'matches': spans}, separators=(',', ':')).encode("utf-8")
+        print(f"{rate:>9.1%}{len(spans):>9}{len(text_frame) / 1024:>10.1f}{len(spans_frame) / 1024:>10.2f}"
+              f"{len(zlib.compress(text_frame, 1)) / 1024:>11.1f}{len(zlib.compress(spans_frame, 1)) / 1024:>12.2f}"
+              f"{spans_ms:>10.2f}{render_ms:>11.2f}")
+    print("=" * 92)
+    print("spans ms: server, deriving the matches from the check result; render ms: client, bracketing them")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Wire compression benchmark
+Pipelined check round trips and sync-sized frames, plain and zlib-compressed: bytes on the wire and the CPU
+they cost at each end
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import string
+import threading
+import time
+from protocol import send_message, recv_message, Compression
+from lexicon_crdt import LexiconORSet
+
+def document(rng, lines, size):
+    """size bytes of English: lines of the README in random order"""
+    out, length = [], 0
+    while length < size:
+        line = rng.choice(lines)
+        out.append(line)
+        length += len(line) + 1
+    return " ".join(out)[:size]
+
+def responder(conn, lexicon, compression):
+    """Answer check frames as the server does: the document back with lexicon words bracketed"""
+    while True:
+        request = recv_message(conn, compression)
+        if request is None:
+            return
+        text = " ".join(f"[{word}]" if word in lexicon else word for word in request['content'].split(" "))
+        send_message(conn, {'id': request['id'], 'text': text}, compression)
+
+def round_trips(docs, lexicon, threshold, rounds):
+    """Check every document rounds times over one connection; returns (bytes on the wire, seconds, client, server).
+
+    threshold 0 sends everything plain (a threshold no frame reaches, so the byte counts still run).
+    """
+    client, server = socket.socketpair()
+    client_side = Compression(threshold or float('inf'))
+    server_side = Compression(threshold or float('inf'))
+    threading.Thread(target=responder, args=(server, lexicon, server_side), daemon=True).start()
+    start = time.time()
+    for n in range(rounds):
+        for i, doc in enumerate(docs):
+            send_message(client, {'id': i, 'op': 'check', 'user': "bench", 'name': f"{i}.txt", 'content': doc},
+                         client_side)
+            recv_message(client, client_side)
+    elapsed = time.time() - start
+    client.close()
+    stats = client_side.snapshot()
+    frames = stats['frames_sent'] + stats['frames_received']
+    return stats['bytes_on_wire'] + stats['bytes_received'] + 4 * frames, elapsed, client_side, server_side
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes saved and CPU spent by negotiated zlib frames")
+    parser.add_argument('--sizes', default="200,2000,20000,200000", help="document sizes in bytes")
+    parser.add_argument('--docs', type=int, default=20, help="documents per size")
+    parser.add_argument('--threshold', type=int, default=512)
+    parser.add_argument('--lexicon-words', type=int, default=200, help="lexicon words found in the documents")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "README.md")) as f:
+        lines = [line.strip() for line in f if len(line.split()) > 3]
+    words = sorted({word for line in lines for word in line.split()})
+    lexicon = set(rng.sample(words, min(args.lexicon_words, len(words))))
+
+    print("=" * 96)
+    print(f"WIRE COMPRESSION TEST: zlib level 1 for frames of {args.threshold}+ bytes, "
+          f"{args.docs} documents per size")
+    print("=" * 96)
+    print(f"{'document':>10}{'plain KB':>11}{'zlib KB':>10}{'saved':>8}{'compress ms/MB':>16}"
+          f"{'inflate ms/MB':>15}{'plain req/s':>13}{'zlib req/s':>12}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        docs = [document(rng, lines, size) for _ in range(args.docs)]
+        rounds = max(1, 2000000 // (size * args.docs))
+        plain_bytes, plain_seconds, _, _ = round_trips(docs, lexicon, 0, rounds)
+        zlib_bytes, zlib_seconds, client_side, server_side = round_trips(docs, lexicon, args.threshold, rounds)
+        client_stats, server_stats = client_side.snapshot(), server_side.snapshot()
+        # CPU per MB of payload, both ends together: each side compresses what it sends and inflates what it gets
+        payload_mb = (client_stats['bytes_in'] + server_stats['bytes_in']) / 1048576
+        compress_ms = (client_stats['compress_seconds'] + server_stats['compress_seconds']) * 1000 / payload_mb
+        inflate_ms = (client_stats['decompress_seconds'] + server_stats['decompress_seconds']) * 1000 / payload_mb
+        requests = rounds * args.docs
+        print(f"{size:>9}B{plain_bytes / rounds / 1024:>11.1f}{zlib_bytes / rounds / 1024:>10.1f}"
+              f"{1 - zlib_bytes / plain_bytes:>8.0%}{compress_ms:>16.1f}{inflate_ms:>15.1f}"
+              f"{requests / plain_seconds:>13.0f}{requests / zlib_seconds:>12.0f}")
+
+    # Sync traffic: gossip carrying a lexicon delta, as SyncManager sends it
+    print("-" * 96)
+    compression = Compression(args.threshold)
+    for count in (10, 100, 1000, 10000):
+        batch = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))) for _ in range(count)]
+        delta = LexiconORSet("server_7530").add(batch)
+        message = {'type': 'gossip', 'from': "server_7530", 'addr': ["localhost", 8530], 'heartbeat': 1,
+                   'rumors': [{'id': ["server_7530", 1], 'hops': 0, 'delta': delta}]}
+        payload = json.dumps(message, separators=(',', ':')).encode("utf-8")
+        flag, data = compression.pack(payload)
+        print(f"sync delta of {count:>5} words: {len(payload) / 1024:>8.1f} KB plain, {len(data) / 1024:>7.1f} KB "
+              f"on the wire ({1 - len(data) / len(payload):.0%} saved)")
+    stats = compression.snapshot()
+    print(f"sync frames: {stats['compress_ms_per_mb']:.1f} ms CPU per MB compressed")
+    print("=" * 96)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Failure detector simulation
+Simulated heartbeats on the HealthMonitor schedule over a clean and a noisy network: how fast each
+rule notices a crash, and how often it takes out a server that is fine
+"""
+
+import argparse
+import random
+from failure_detector import PhiAccrualDetector
+
+PROFILES = {
+    # name: (base round trip s, mean extra jitter s, chance a heartbeat is lost)
+    'clean': (0.001, 0.002, 0.0),
+    'noisy': (0.005, 0.150, 0.02),
+}
+
+BLIP = 3  # as HealthMonitor: an answer after fewer missed heartbeats than this times network noise
+
+class PhiRule:
+    """As HealthMonitor with phi_threshold: phi at the threshold on probes failed heartbeats in a row"""
+
+    def __init__(self, threshold, min_std, probes):
+        self.name = f"phi >= {threshold:g}" + (f" x{probes}" if probes > 1 else "")
+        self.threshold = threshold
+        self.min_std = min_std
+        self.probes = probes
+
+    def start(self):
+        self.detector = PhiAccrualDetector(min_std=self.min_std)
+        self.over = 0
+
+    def answered(self, now, next_due, missed):
+        self.detector.heartbeat(now, next_due, sample=missed < BLIP)
+        self.over = 0
+
+    def down(self, now, failed_checks):
+        self.over = self.over + 1 if self.detector.phi(now) >= self.threshold else 0
+        return self.over >= self.probes
+
+class CountRule:
+    def __init__(self, count):
+        self.name = f"{count} failed in a row"
+        self.count = count
+
+    def start(self):
+        pass
+
+    def answered(self, now, next_due, missed):
+        pass
+
+    def down(self, now, failed_checks):
+        return failed_checks >= self.count
+
+def simulate(rule, profile, args, rng, duration, crash_at=None, hang=False):
+    """Run one server's heartbeats on the monitor's schedule.
+
+    Returns (false downs, seconds from crash_at to the server being declared down, or None).
+    """
+    rtt, jitter, loss = PROFILES[profile]
+    rule.start()
+    interval, failed_checks, healthy, false_downs = args.min_interval, 0, False, 0
+    due = 0.0
+    while due < duration:
+        crashed = crash_at is not None and due >= crash_at
+        delay = rtt + (rng.expovariate(1 / jitter) if jitter else 0)
+        if not crashed and rng.random() >= loss and delay < args.timeout:
+            now = due + delay
+            interval = min(interval * 2, args.interval)
+            rule.answered(now, now + interval, failed_checks)
+            failed_checks, healthy = 0, True
+        else:
+            # A crashed server refuses at once (or, hung, never answers); a lost heartbeat times out
+            now = due + (rtt if crashed and not hang else args.timeout)
+            failed_checks += 1
+            interval = args.min_interval
+            if rule.down(now, failed_checks):
+                if crashed:
+                    return false_downs, now - crash_at
+                if healthy:
+                    false_downs += 1
+                healthy = False
+        due = now + interval
+    return false_downs, None
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection latency against false positives, phi-accrual vs counting")
+    parser.add_argument('--interval', type=float, default=10, help="check_interval for stable servers")
+    parser.add_argument('--min-interval', type=float, default=1, help="interval after a failed heartbeat")
+    parser.add_argument('--timeout', type=float, default=2)
+    parser.add_argument('--min-std', type=float, default=0.2)
+    parser.add_argument('--phi-probes', type=int, default=2, help="failed heartbeats in a row phi must hold at")
+    parser.add_argument('--hours', type=float, default=240, help="simulated uptime for counting false positives")
+    parser.add_argument('--crashes', type=int, default=500, help="simulated crashes for detection time")
+    args = parser.parse_args()
+
+    rules = [CountRule(count) for count in (1, 2, 3, 5)] + [PhiRule(threshold, args.min_std, probes)
+                                                            for probes in sorted({1, args.phi_probes})
+                                                            for threshold in (1, 3, 5, 8, 12)]
+    print("=" * 78)
+    print(f"FAILURE DETECTOR SIMULATION: heartbeats every {args.min_interval:g}-{args.interval:g} s, "
+          f"timeout {args.timeout:g} s, {args.hours:g} h uptime, {args.crashes} crashes")
+    for profile, (rtt, jitter, loss) in PROFILES.items():
+        print("=" * 78)
+        print(f"{profile} network: {rtt * 1000:g} ms + ~{jitter * 1000:g} ms jitter, {loss:.0%} heartbeats lost")
+        print(f"{'rule':<22}{'detect mean s':>15}{'detect p99 s':>14}{'false downs/day':>18}")
+        for rule in rules:
+            rng = random.Random(7)
+            false_downs, _ = simulate(rule, profile, args, rng, args.hours * 3600)
+            latencies = []
+            for n in range(args.crashes):
+                crash_at = rng.uniform(60, 600)  # after the schedule has backed off
+                _, latency = simulate(rule, profile, args, rng, crash_at + 3600, crash_at, hang=n % 2 == 1)
+                latencies.append(latency)
+            latencies.sort()
+            print(f"{rule.name:<22}{sum(latencies) / len(latencies):>15.2f}"
+                  f"{latencies[int(len(latencies) * 0.99)]:>14.2f}{false_downs / (args.hours / 24):>18.2f}")
+    print("=" * 78)
+
+if __name__ == "__main__":
+    main()
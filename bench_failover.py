@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Failover benchmark
+Kill a backend under load (lost requests with and without replay), then stall backends at random
+(tail latency with and without hedged requests)
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import socket
+import threading
+import time
+from load_balancer import LoadBalancer
+from protocol import send_message, recv_message
+
+BASE_PORT = 19500
+
+class FakeServer:
+    """Pipeline-mode backend doing one check at a time; can stall at random or be killed outright"""
+
+    def __init__(self, port, delay, stall_rate=0.0, stall=0.0):
+        self.delay = delay
+        self.stall_rate = stall_rate
+        self.stall = stall
+        self.rng = random.Random(port)
+        self.work = threading.Lock()
+        self.connections = []
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('localhost', port))
+        self.listener.listen(64)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            self.connections.append(conn)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            first = conn.recv(1024)
+            if first == b"HEARTBEAT":
+                conn.sendall(b"ALIVE")
+                return
+            conn.sendall(b"accept")
+            while True:
+                request = recv_message(conn)
+                if request is None:
+                    return
+                with self.work:
+                    stalled = self.rng.random() < self.stall_rate
+                    time.sleep(self.stall if stalled else self.delay)
+                send_message(conn, {'id': request['id'], 'text': request['content'].upper()})
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def kill(self):
+        """Crash in the middle of a check: refuse new connections and drop every open one"""
+        while not self.work.locked():
+            time.sleep(0.001)
+        self.listener.shutdown(socket.SHUT_RDWR)  # wakes the accept() that would otherwise take one more
+        self.listener.close()
+        for conn in self.connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+def client(port, username, seconds, results):
+    """Back-to-back checks; latency is timed from the content send to the answer"""
+    ok, failed = [], 0
+    with socket.create_connection(('localhost', port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(username.encode())
+        sock.recv(1024)
+        deadline = time.time() + seconds
+        n = 0
+        while time.time() < deadline:
+            sock.sendall(f"Ydoc{n}.txt".encode())
+            time.sleep(0.02)  # the name and the content are separate messages
+            start = time.time()
+            sock.sendall(f"document {n} from {username}".encode())
+            reply = sock.recv(4096)
+            while reply == b"LEXICON_POLL":
+                reply = sock.recv(4096)
+            if reply.startswith(b"check"):
+                ok.append(time.time() - start)
+            else:
+                failed += 1
+            n += 1
+        sock.sendall(b"Disconnect_Client")
+    results.append((ok, failed))
+
+def run(lb_port, servers, clients, seconds, victim=None, **options):
+    """Drive clients through an l7 load balancer, killing victim a second in.
+
+    Returns (latencies, failures, balancer).
+    """
+    lb = LoadBalancer(lb_port, 'least-connections', 'l7', **options)
+    for port in servers:
+        lb.add_server('localhost', port)
+        lb.health_monitor.ping_server(('localhost', port))
+    threading.Thread(target=lb.start, daemon=True).start()
+    time.sleep(0.2)
+    results = []
+    threads = [threading.Thread(target=client, args=(lb_port, f"user{i}", seconds, results))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    if victim is not None:
+        time.sleep(1)
+        victim.kill()
+    for thread in threads:
+        thread.join()
+    lb.stop()
+    return [latency for ok, _ in results for latency in ok], sum(failed for _, failed in results), lb
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and hedging under backend failure and stalls")
+    parser.add_argument('--servers', type=int, default=3)
+    parser.add_argument('--clients', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--delay-ms', type=float, default=20, help="server time per check")
+    parser.add_argument('--stall-rate', type=float, default=0.02)
+    parser.add_argument('--stall-ms', type=float, default=300)
+    parser.add_argument('--hedge-percentile', type=float, default=0.9)
+    args = parser.parse_args()
+
+    log = io.StringIO()  # the balancer logs every request; keep it off the report
+    print("=" * 64)
+    print(f"FAILOVER TEST: {args.clients} clients, {args.servers} servers at {args.delay_ms:.0f} ms/check")
+    print("=" * 64)
+
+    # A backend crashes a second into the run, with requests in flight on it
+    for offset, attempts in enumerate([1, 3]):
+        ports = [BASE_PORT + 10 * offset + i for i in range(args.servers)]
+        with contextlib.redirect_stdout(log):
+            servers = [FakeServer(port, args.delay_ms / 1000) for port in ports]
+            latencies, failed, lb = run(BASE_PORT + 80 + offset, ports, args.clients, args.seconds,
+                                        victim=servers[0], max_attempts=attempts)
+        print(f"Backend killed, max {attempts} attempt{'s' if attempts > 1 else ''}: "
+              f"{len(latencies)} ok, {failed} lost, {lb.stats['replayed']} replayed")
+
+    # Every backend occasionally stalls; hedging sends the slow ones to a second backend
+    for offset, hedge in enumerate([None, args.hedge_percentile], 3):
+        ports = [BASE_PORT + 10 * offset + i for i in range(args.servers)]
+        with contextlib.redirect_stdout(log):
+            for port in ports:
+                FakeServer(port, args.delay_ms / 1000, args.stall_rate, args.stall_ms / 1000)
+            latencies, failed, lb = run(BASE_PORT + 80 + offset, ports, args.clients, args.seconds,
+                                        hedge_percentile=hedge)
+        label = f"hedge at p{hedge * 100:.0f}" if hedge else "no hedging"
+        print(f"Stalls {args.stall_rate:.0%} x {args.stall_ms:.0f} ms, {label:<13}: "
+              f"p50 {percentile(latencies, 0.5) * 1000:.0f} ms, p99 {percentile(latencies, 0.99) * 1000:.0f} ms, "
+              f"{lb.stats['hedged']} hedged ({lb.stats['hedge_wins']} won)")
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
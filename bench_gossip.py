@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Local multi-process gossip convergence test
+Starts N headless sync nodes and measures membership, update and failure convergence
+"""
+
+import argparse
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from protocol import send_message, recv_message
+from sync_manager import SyncManager
+
+BASE_PORT = 19000
+
+def query_status(port):
+    """Ask one node for its sync status, or None if it does not answer"""
+    try:
+        sock = socket.create_connection(('localhost', port), timeout=1)
+        send_message(sock, {'type': 'status'})
+        status = recv_message(sock)
+        sock.close()
+        return status
+    except OSError:
+        return None
+
+def wait_until(predicate, timeout, interval=0.02):
+    """Poll predicate until it holds; returns elapsed seconds or None on timeout"""
+    start = time.time()
+    while time.time() - start < timeout:
+        if predicate():
+            return time.time() - start
+        time.sleep(interval)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Gossip convergence test")
+    parser.add_argument('--nodes', type=int, default=20)
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--gossip-interval', type=float, default=0.2)
+    parser.add_argument('--updates', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    here = os.path.dirname(os.path.abspath(__file__))
+    ports = [BASE_PORT + i for i in range(args.nodes)]
+    seeds = f"localhost:{ports[0]},localhost:{ports[1]}"
+    timing = ['--gossip-interval', str(args.gossip_interval), '--suspect-after', '1', '--dead-after', '2']
+
+    print("=" * 64)
+    print(f"GOSSIP CONVERGENCE TEST: {args.nodes} nodes, fanout {args.fanout}")
+    print("=" * 64)
+
+    # Node 0 runs in this process so the test can inject updates into it
+    for i in range(args.nodes):
+        with open(os.path.join(workdir, f"lexicon_{i}.txt"), "w") as f:
+            f.write("alpha beta gamma")
+    processes = []
+    for i in range(1, args.nodes):
+        cmd = [sys.executable, os.path.join(here, "sync_manager.py"), '--node-id', f"node{i}",
+               '--port', str(ports[i]), '--lexicon', os.path.join(workdir, f"lexicon_{i}.txt"),
+               '--seeds', seeds, '--fanout', str(args.fanout), '--anti-entropy-interval', '3600'] + timing
+        processes.append(subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    origin = SyncManager("node0", os.path.join(workdir, "lexicon_0.txt"), ports[0], fanout=args.fanout,
+                         gossip_interval=args.gossip_interval, anti_entropy_interval=3600,
+                         suspect_after=1, dead_after=2)
+    origin.add_peer(('localhost', ports[1]))
+    origin.start()
+
+    try:
+        def statuses(live_ports):
+            return [query_status(port) for port in live_ports]
+
+        elapsed = wait_until(lambda: all(s and s['peers'] == args.nodes - 1 for s in statuses(ports)), 60, 0.1)
+        print(f"Membership converged:   {elapsed:.2f}s" if elapsed is not None else "Membership: TIMEOUT")
+
+        times = []
+        for n in range(args.updates):
+            origin.broadcast_update([f"word{n}"])
+            digest = origin.digest()
+            elapsed = wait_until(lambda: all(s and s['digest'] == digest for s in statuses(ports[1:])), 30)
+            times.append(elapsed)
+            print(f"Update {n + 1} reached all nodes: " + (f"{elapsed * 1000:.0f} ms" if elapsed is not None else "TIMEOUT"))
+
+        final = statuses(ports)
+        hops = max(s['max_rumor_hops'] for s in final if s)
+        messages = sum(s['gossip_messages'] for s in final if s)
+        duplicates = sum(s['duplicate_rumors'] for s in final if s)
+        connections = max(s['connected_peers'] for s in final if s)
+        print(f"Max rumor hops:         {hops} (log2 N = {math.log2(args.nodes):.1f})")
+        print(f"Gossip messages sent:   {messages} ({duplicates} duplicate rumor deliveries)")
+        print(f"Max open peer sockets:  {connections} per node (full mesh would be {args.nodes - 1})")
+        p99 = max(s['apply_latency_ms']['p99'] for s in final if s)
+        depth = max(s['max_apply_queue'] for s in final if s)
+        print(f"Delta apply latency:    p99 {p99:.1f} ms worst node, apply queue peaked at {depth}")
+
+        # Failure detection: stop one node and wait until every survivor drops it
+        victim = processes.pop()
+        victim.terminate()
+        victim.wait()
+        survivors = ports[:-1]
+        elapsed = wait_until(lambda: all(s and s['peers'] == args.nodes - 2 for s in statuses(survivors)), 30, 0.1)
+        print(f"Failure detected by all: {elapsed:.2f}s" if elapsed is not None else "Failure detection: TIMEOUT")
+    finally:
+        origin.stop()
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    print("=" * 64)
+    ok = [t for t in times if t is not None]
+    if ok:
+        print(f"Update convergence: median {sorted(ok)[len(ok) // 2] * 1000:.0f} ms, max {max(ok) * 1000:.0f} ms")
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
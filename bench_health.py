@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Health check benchmark
+Fake servers crash or hang while two monitors watch them: the old one-at-a-time loop and the
+concurrent adaptive one. Reports how long each takes to notice an outage and the recovery.
+"""
+
+import argparse
+import contextlib
+import io
+import random
+import socket
+import threading
+import time
+from health_monitor import HealthMonitor
+
+BASE_PORT = 19900
+
+class FakeServer:
+    """Answers HEARTBEAT with ALIVE; can crash (refuse connections) or hang (accept, never answer)"""
+
+    def __init__(self, port):
+        self.port = port
+        self.hung = False
+        self.listener = None
+        self.held = []  # connections a hung server is sitting on
+        self.up()
+
+    def up(self):
+        self.hung = False
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('localhost', self.port))
+        self.listener.listen(64)
+        threading.Thread(target=self._accept_loop, args=(self.listener,), daemon=True).start()
+
+    def crash(self):
+        self.listener.close()
+
+    def hang(self):
+        self.hung = True
+
+    def recover(self):
+        if self.hung:
+            self.hung = False
+        else:
+            self.up()
+
+    def _accept_loop(self, listener):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            if self.hung:
+                self.held.append(conn)
+                continue
+            with conn:
+                if conn.recv(1024) == b"HEARTBEAT":
+                    conn.sendall(b"ALIVE")
+
+class SequentialMonitor(HealthMonitor):
+    """The previous loop: blocking pings one server after another, then a fixed sleep (and 3 strikes)"""
+
+    def _monitor_loop(self):
+        while self.monitoring:
+            for server_addr in list(self.servers):
+                result = self.probe([server_addr])[server_addr]
+                self._record(server_addr, result)
+            time.sleep(self.check_interval)
+
+def watch(monitors, server_addr, healthy, since, times):
+    """Record, per monitor, seconds from since until server_addr's health equals healthy"""
+    pending = set(range(len(monitors)))
+    while pending:
+        for i in list(pending):
+            if (server_addr in monitors[i].get_healthy_servers()) == healthy:
+                times[i].append(time.time() - since)
+                pending.discard(i)
+        time.sleep(0.01)
+
+def summary(times):
+    return f"mean {sum(times) / len(times):5.1f} s, max {max(times):5.1f} s"
+
+def main():
+    parser = argparse.ArgumentParser(description="Outage detection time, sequential vs concurrent adaptive probing")
+    parser.add_argument('--servers', type=int, default=10)
+    parser.add_argument('--outages', type=int, default=4, help="servers that fail (half crash, half hang)")
+    parser.add_argument('--interval', type=float, default=10, help="check_interval, seconds")
+    parser.add_argument('--min-interval', type=float, default=1)
+    parser.add_argument('--timeout', type=float, default=2, help="heartbeat timeout, seconds")
+    parser.add_argument('--scale', type=float, default=0.25,
+                        help="multiply every interval and timeout by this to keep the run short")
+    args = parser.parse_args()
+
+    interval, min_interval, timeout = (value * args.scale for value in
+                                       (args.interval, args.min_interval, args.timeout))
+    servers = [FakeServer(BASE_PORT + i) for i in range(args.servers)]
+    monitors = [SequentialMonitor(interval, timeout=timeout, phi_threshold=None),
+                HealthMonitor(interval, min_interval, timeout)]
+    log = io.StringIO()  # the monitors log every state change; keep them off the report
+    with contextlib.redirect_stdout(log):
+        for monitor in monitors:
+            for server in servers:
+                monitor.add_server(('localhost', server.port))
+            monitor.start_monitoring()
+        time.sleep(interval * 2)  # long enough for the adaptive intervals to back off fully
+
+        rng = random.Random(1)
+        detect = [[] for _ in monitors]
+        recover = [[] for _ in monitors]
+        for n, server in enumerate(rng.sample(servers, args.outages)):
+            time.sleep(rng.uniform(0, interval))  # outages land at any point in the schedule
+            server.hang() if n % 2 else server.crash()
+            watch(monitors, ('localhost', server.port), False, time.time(), detect)
+            server.recover()
+            watch(monitors, ('localhost', server.port), True, time.time(), recover)
+        for monitor in monitors:
+            monitor.stop_monitoring()
+
+    print("=" * 72)
+    print(f"HEALTH CHECK TEST: {args.servers} servers, {args.outages} outages, check interval "
+          f"{args.interval:g} s, timeout {args.timeout:g} s (times scaled by {args.scale:g})")
+    print("=" * 72)
+    for name, detected, recovered in zip(["sequential, fixed interval", "concurrent, adaptive"], detect, recover):
+        print(f"{name:<28} detect {summary([t / args.scale for t in detected])}   "
+              f"recover {summary([t / args.scale for t in recovered])}")
+    print("=" * 72)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Incremental check benchmark
+Small edits to long documents, checked in full and as edits against the stored version: bytes sent and
+received, and the CPU each end spends
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+from protocol import content_digest
+from incremental import DocumentStore, split_document, join_document, apply_edits, diff_document, apply_patch
+
+def document(rng, words, size):
+    """size bytes of lines of README words in random order, a dozen or so to the line"""
+    out, length = [], 0
+    while length < size:
+        line = " ".join(rng.choices(words, k=rng.randint(4, 20)))
+        out.append(line)
+        length += len(line) + 1
+    return "\n".join(out)[:size]
+
+def edit(rng, text, edits):
+    """text with edits words replaced, inserted or deleted at random"""
+    words = text.split(" ")
+    for _ in range(edits):
+        i = rng.randrange(len(words))
+        kind = rng.random()
+        if kind < 0.6:
+            words[i] = rng.choice(["edited", "revised", "cypto", "changed."])
+        elif kind < 0.8:
+            words.insert(i, "inserted words")
+        elif len(words) > 1:
+            del words[i]
+    return " ".join(words)
+
+def check_word(word, lexicon):
+    """As the server checks each word"""
+    return f"[{word}]" if word.strip('.,!?;:').lower() in lexicon else word
+
+def full_check(text, lexicon):
+    return " ".join(check_word(word, lexicon) for word in text.strip().split(" "))
+
+def recheck(store, base, digest, change, lexicon):
+    """As the server answers an incremental check (same lexicon version throughout)"""
+    text, corrected, version = store.get(base)
+    tokens = apply_edits(split_document(text)[1], change['edits'])
+    new_text = join_document(change['lead'], tokens, change['trail'])
+    assert content_digest(new_text) == digest
+    patch = [[start, end, [check_word(word, lexicon) for word in replacement]]
+             for start, end, replacement in change['edits']]
+    updated = " ".join(apply_edits(corrected.split(" "), patch))
+    store.put(digest, new_text, updated, version)
+    return {'patch': patch, 'result': content_digest(updated), 'version': version}
+
+def main():
+    parser = argparse.ArgumentParser(description="Full uploads against edits-only checks of edited documents")
+    parser.add_argument('--sizes', default="2000,20000,200000,1000000", help="document sizes in bytes")
+    parser.add_argument('--edits', default="1,10,100", help="words edited between checks")
+    parser.add_argument('--rounds', type=int, default=10, help="edit-and-check rounds per document")
+    parser.add_argument('--lexicon-words', type=int, default=200, help="lexicon words found in the documents")
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "README.md")) as f:
+        lines = [line.strip() for line in f if len(line.split()) > 3]
+    words = sorted({word for line in lines for word in line.split()})
+    lexicon = {word.lower() for word in rng.sample(words, min(args.lexicon_words, len(words)))} | {"cypto"}
+
+    print("=" * 100)
+    print(f"INCREMENTAL CHECK TEST: {args.rounds} edit-and-check rounds per document")
+    print("=" * 100)
+    print(f"{'document':>10}{'edits':>7}{'full sent KB':>14}{'edits sent KB':>15}{'full recv KB':>14}"
+          f"{'patch recv KB':>15}{'full ms':>9}{'edits ms':>10}{'  (client/server)':>18}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        for edits in (int(edits) for edits in args.edits.split(',')):
+            store = DocumentStore()
+            text = document(rng, words, size)
+            corrected = full_check(text, lexicon)
+            store.put(content_digest(text), text, corrected, "v1")
+            sent = {'full': 0, 'edits': 0}
+            received = {'full': 0, 'edits': 0}
+            seconds = {'full': 0.0, 'client': 0.0, 'server': 0.0}
+            for _ in range(args.rounds):
+                new_text = edit(rng, text, edits)
+                start = time.perf_counter()
+                expected = full_check(new_text, lexicon)
+                seconds['full'] += time.perf_counter() - start
+                sent['full'] += len(json.dumps({'op': 'check', 'content': new_text}))
+                received['full'] += len(json.dumps({'text': expected}))
+
+                start = time.perf_counter()
+                change = diff_document(text, new_text)
+                client_seconds = time.perf_counter() - start
+                if change is None:
+                    corrected = expected  # too much changed: the client uploads in full
+                    sent['edits'] += len(json.dumps({'op': 'check', 'content': new_text}))
+                    received['edits'] += len(json.dumps({'text': expected}))
+                    store.put(content_digest(new_text), new_text, expected, "v1")
+                else:
+                    request = dict(change, op='recheck', base=content_digest(text), digest=content_digest(new_text))
+                    start = time.perf_counter()
+                    response = recheck(store, request['base'], request['digest'], change, lexicon)
+                    seconds['server'] += time.perf_counter() - start
+                    start = time.perf_counter()
+                    corrected = apply_patch(corrected, response['patch'])
+                    assert content_digest(corrected) == response['result']
+                    client_seconds += time.perf_counter() - start
+                    sent['edits'] += len(json.dumps(request))
+                    received['edits'] += len(json.dumps(response))
+                seconds['client'] += client_seconds
+                assert corrected == expected
+                text = new_text
+            n = args.rounds
+            print(f"{size:>9}B{edits:>7}{sent['full'] / n / 1024:>14.1f}{sent['edits'] / n / 1024:>15.2f}"
+                  f"{received['full'] / n / 1024:>14.1f}{received['edits'] / n / 1024:>15.2f}"
+                  f"{seconds['full'] / n * 1000:>9.2f}{(seconds['client'] + seconds['server']) / n * 1000:>10.2f}"
+                  f"{seconds['client'] / n * 1000:>9.2f}/{seconds['server'] / n * 1000:.2f}")
+    print("=" * 100)
+    print("full ms: server check of the whole document; edits ms: client diff and patch plus server re-check")
+
+if __name__ == "__main__":
+    main()
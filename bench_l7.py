@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Request-level load balancing benchmark
+Heavy and light clients through the load balancer: per-session pinning versus per-request (l7) routing
+"""
+
+import argparse
+import contextlib
+import io
+import socket
+import threading
+import time
+from load_balancer import LoadBalancer
+from protocol import send_message, recv_message
+
+BASE_PORT = 19700
+
+def fake_server(port, delay, counts):
+    """Speaks both the client protocol and the load balancer's PIPELINE mode.
+
+    Checks are processed one at a time per server (each takes `delay`),
+    like a server whose CPU is the bottleneck.
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('localhost', port))
+    listener.listen(64)
+    work = threading.Lock()
+    counts[port] = 0
+
+    def check(content):
+        with work:
+            time.sleep(delay)
+            counts[port] += 1
+        return content.upper()
+
+    def serve(conn):
+        with conn:
+            first = conn.recv(1024)
+            if first == b"HEARTBEAT":
+                conn.sendall(b"ALIVE")
+                return
+            conn.sendall(b"accept")
+            if first.split(b" ")[0] == b"PIPELINE":
+                while True:
+                    request = recv_message(conn)
+                    if request is None:
+                        return
+                    send_message(conn, {'id': request['id'], 'text': check(request['content'])})
+            while True:
+                data = conn.recv(1024)
+                if not data or data == b"Disconnect_Client":
+                    return
+                if data.startswith(b"Y"):
+                    content = conn.recv(4096).decode()
+                    conn.sendall(b"check" + check(content).encode())
+
+    def accept_loop():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+def client(port, username, requests, done):
+    with socket.create_connection(('localhost', port)) as sock:
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(username.encode())
+        sock.recv(1024)
+        start = time.time()
+        for n in range(requests):
+            sock.sendall(f"Ydoc{n}.txt".encode())
+            time.sleep(0.002)  # the name and the content are separate messages
+            sock.sendall(f"document {n} from {username}".encode())
+            sock.recv(4096)
+        done[username] = time.time() - start
+        sock.sendall(b"Disconnect_Client")
+
+def main():
+    parser = argparse.ArgumentParser(description="Session pinning vs request-level routing")
+    parser.add_argument('--servers', type=int, default=2)
+    parser.add_argument('--heavy', type=int, default=2, help="heavy clients")
+    parser.add_argument('--light', type=int, default=2, help="light clients")
+    parser.add_argument('--heavy-requests', type=int, default=150)
+    parser.add_argument('--light-requests', type=int, default=10)
+    parser.add_argument('--delay-ms', type=float, default=20, help="server time per check")
+    args = parser.parse_args()
+
+    log = io.StringIO()  # the balancer logs every request; keep it off the report
+    rows = []
+    for offset, mode in enumerate(['selector', 'l7']):
+        counts = {}
+        ports = [BASE_PORT + 10 * offset + i for i in range(args.servers)]
+        with contextlib.redirect_stdout(log):
+            for port in ports:
+                fake_server(port, args.delay_ms / 1000, counts)
+            lb = LoadBalancer(BASE_PORT + 50 + offset, 'round-robin', mode)
+            for port in ports:
+                lb.add_server('localhost', port)
+                lb.health_monitor.ping_server(('localhost', port))
+            threading.Thread(target=lb.start, daemon=True).start()
+            time.sleep(0.2)
+            # Heavy and light clients alternate, so round-robin session pinning stacks the heavy ones
+            plan = []
+            for i in range(max(args.heavy, args.light)):
+                if i < args.heavy:
+                    plan.append((f"heavy{i}", args.heavy_requests))
+                if i < args.light:
+                    plan.append((f"light{i}", args.light_requests))
+            done = {}
+            start = time.time()
+            threads = []
+            for username, requests in plan:
+                thread = threading.Thread(target=client, args=(lb.port, username, requests, done))
+                thread.start()
+                threads.append(thread)
+                time.sleep(0.05)
+            for thread in threads:
+                thread.join()
+            elapsed = time.time() - start
+            lb.stop()
+        total = sum(counts.values())
+        shares = " / ".join(f"{counts[port] / total:.0%}" for port in ports)
+        rows.append(f"{mode:<10}{elapsed:>10.2f}{total / elapsed:>10.1f}"
+                    f"{max(done.values()):>14.2f}   {shares}")
+
+    print("=" * 70)
+    print(f"L7 TEST: {args.heavy} heavy x {args.heavy_requests} and {args.light} light x {args.light_requests} "
+          f"checks, {args.servers} servers at {args.delay_ms:.0f} ms/check")
+    print("=" * 70)
+    print(f"{'mode':<10}{'total s':>10}{'checks/s':>10}{'slowest s':>14}   share per server")
+    for row in rows:
+        print(row)
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
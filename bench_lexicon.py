@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the huge-lexicon mode
+Compares an in-memory set against the Bloom filter + mmap index
+"""
+
+import argparse
+import os
+import random
+import string
+import tempfile
+import time
+import tracemalloc
+from lexicon_index import BloomLexicon, iter_lexicon_words
+
+def random_word(rng, length):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(length))
+
+def make_lexicon(path, num_words, rng):
+    """Write num_words random words to a lexicon file and return a sample of them"""
+    sample = []
+    with open(path, "w") as f:
+        for i in range(num_words):
+            word = random_word(rng, rng.randint(4, 12))
+            f.write(word + " ")
+            if i % 100 == 0:
+                sample.append(word)
+    return sample
+
+def make_tokens(lexicon_sample, num_tokens, hit_ratio, rng):
+    """Build a document-like token stream where hit_ratio of tokens are in the lexicon"""
+    tokens = []
+    for _ in range(num_tokens):
+        if rng.random() < hit_ratio:
+            tokens.append(rng.choice(lexicon_sample))
+        else:
+            # A trailing digit keeps these out of the lowercase lexicon
+            tokens.append(random_word(rng, rng.randint(4, 12)) + "0")
+    return tokens
+
+def time_lookups(lexicon, tokens):
+    start = time.perf_counter()
+    found = 0
+    for token in tokens:
+        if token in lexicon:
+            found += 1
+    elapsed = time.perf_counter() - start
+    return found, len(tokens) / elapsed
+
+def bench_set(lexicon_file, tokens):
+    tracemalloc.start()
+    words = set(iter_lexicon_words(lexicon_file))
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    found, rate = time_lookups(words, tokens)
+    return len(words), memory, found, rate
+
+def bench_bloom(lexicon_file, tokens, error_rate):
+    index_file = lexicon_file + f".{error_rate}.idx"
+    start = time.perf_counter()
+    lexicon = BloomLexicon(lexicon_file, index_file=index_file, error_rate=error_rate)
+    build_time = time.perf_counter() - start
+    found, rate = time_lookups(lexicon, tokens)
+    stats = lexicon.get_stats()
+    lexicon.index.close()
+    os.remove(index_file)
+    return stats, found, rate, build_time
+
+def main():
+    parser = argparse.ArgumentParser(description="Bloom filter lexicon benchmark")
+    parser.add_argument('--words', type=int, default=1000000)
+    parser.add_argument('--tokens', type=int, default=200000)
+    parser.add_argument('--hit-ratio', type=float, default=0.05)
+    parser.add_argument('--error-rates', default="0.05,0.01,0.001")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp()
+    lexicon_file = os.path.join(workdir, "lexicon.txt")
+
+    print("=" * 72)
+    print(f"HUGE LEXICON BENCHMARK: {args.words} words, {args.tokens} tokens, {args.hit_ratio:.0%} hits")
+    print("=" * 72)
+
+    sample = make_lexicon(lexicon_file, args.words, rng)
+    tokens = make_tokens(sample, args.tokens, args.hit_ratio, rng)
+
+    size, memory, expected, rate = bench_set(lexicon_file, tokens)
+    print(f"{'mode':<18}{'memory':>12}{'fp rate':>12}{'tokens/sec':>14}{'build':>10}")
+    print(f"{'python set':<18}{memory / 1048576:>10.1f}MB{'-':>12}{rate:>14,.0f}{'-':>10}")
+
+    for error_rate in [float(r) for r in args.error_rates.split(",")]:
+        stats, found, rate, build_time = bench_bloom(lexicon_file, tokens, error_rate)
+        status = "OK" if found == expected else f"MISMATCH ({found} != {expected})"
+        print(f"{'bloom p=' + str(error_rate):<18}{stats['memory_bytes'] / 1048576:>10.1f}MB"
+              f"{stats['fp_rate']:>12}{rate:>14,.0f}{build_time:>9.1f}s  {status}")
+
+    os.remove(lexicon_file)
+    os.rmdir(workdir)
+    print("=" * 72)
+    print("fp rate = Bloom positives that the exact index rejected / all absent tokens")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Load balancer proxy benchmark
+Idle connection capacity, bulk throughput, CPU per GB and request rate:
+event loop versus thread-per-client copying or splicing
+"""
+
+import argparse
+import os
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BACKEND_PORT = 19950
+LB_PORT = 19960
+
+def echo_backend(port):
+    """Single-threaded echo server that also answers the health monitor"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('localhost', port))
+    listener.listen(4096)
+    listener.setblocking(False)
+    selector = selectors.DefaultSelector()
+    selector.register(listener, selectors.EVENT_READ)
+    pending = {}
+    counts = {'open': 0}
+
+    def loop():
+        while True:
+            for key, _ in selector.select():
+                sock = key.fileobj
+                if sock is listener:
+                    try:
+                        conn, _ = listener.accept()
+                    except BlockingIOError:
+                        continue
+                    conn.setblocking(False)
+                    selector.register(conn, selectors.EVENT_READ)
+                    pending[conn] = b""
+                    counts['open'] += 1
+                    continue
+                try:
+                    if pending[sock]:
+                        sent = sock.send(pending[sock])
+                        pending[sock] = pending[sock][sent:]
+                        if not pending[sock]:
+                            selector.modify(sock, selectors.EVENT_READ)
+                        continue
+                    data = sock.recv(262144)
+                    if data == b"HEARTBEAT":
+                        data = b"ALIVE"
+                    if not data:
+                        raise ConnectionResetError
+                    sent = sock.send(data)
+                    if sent < len(data):
+                        pending[sock] = data[sent:]
+                        selector.modify(sock, selectors.EVENT_WRITE)
+                except (BlockingIOError, InterruptedError):
+                    continue
+                except OSError:
+                    selector.unregister(sock)
+                    del pending[sock]
+                    counts['open'] -= 1
+                    sock.close()
+
+    threading.Thread(target=loop, daemon=True).start()
+    return counts
+
+def process_info(pid):
+    """Thread count and resident memory of a process (Linux /proc)"""
+    info = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                info[key] = value.strip()
+    except OSError:
+        return "n/a", "n/a"
+    return info.get('Threads', 'n/a'), info.get('VmRSS', 'n/a')
+
+def process_cpu(pid):
+    """User plus system CPU seconds a process has used so far (Linux /proc)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')  # utime, stime
+
+def wait_for_port(port, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('localhost', port), timeout=1).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+def idle_connections(count, backend_counts):
+    """Open many idle client connections and report how long until all reach the backend"""
+    start = time.time()
+    base = backend_counts['open']
+    sockets = []
+    for _ in range(count):
+        sockets.append(socket.create_connection(('localhost', LB_PORT)))
+    while backend_counts['open'] - base < count and time.time() - start < 60:
+        time.sleep(0.05)
+    return sockets, time.time() - start, backend_counts['open'] - base
+
+def bulk_throughput(streams, megabytes):
+    """Each stream pushes data through the proxy to the echo backend and reads it back"""
+    payload = os.urandom(256 * 1024)
+    total = megabytes * 1024 * 1024
+
+    def stream():
+        with socket.create_connection(('localhost', LB_PORT)) as sock:
+            def reader():
+                remaining = total
+                while remaining > 0:
+                    chunk = sock.recv(262144)
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+            thread = threading.Thread(target=reader)
+            thread.start()
+            sent = 0
+            while sent < total:
+                sock.sendall(payload[:min(len(payload), total - sent)])
+                sent += min(len(payload), total - sent)
+            thread.join()
+
+    start = time.time()
+    threads = [threading.Thread(target=stream) for _ in range(streams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return streams * megabytes * 2, time.time() - start  # both directions cross the proxy
+
+def request_rate(clients, seconds):
+    """Small ping-pong requests over persistent connections"""
+    done = []
+    deadline = time.time() + seconds
+
+    def client():
+        count = 0
+        with socket.create_connection(('localhost', LB_PORT)) as sock:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            while time.time() < deadline:
+                sock.sendall(b"Y" + b"x" * 63)
+                sock.recv(1024)
+                count += 1
+        done.append(count)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(done) / seconds
+
+def main():
+    parser = argparse.ArgumentParser(description="Event-loop vs threaded proxy benchmark")
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--streams', type=int, default=4)
+    parser.add_argument('--megabytes', type=int, default=50, help="per stream")
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--modes', default="threads,splice,selector")
+    args = parser.parse_args()
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    backend_counts = echo_backend(BACKEND_PORT)
+    results = []
+    for mode in args.modes.split(','):
+        lb = subprocess.Popen([sys.executable, os.path.join(here, "load_balancer.py"), '--port', str(LB_PORT),
+                               '--mode', mode, '--servers', f"localhost:{BACKEND_PORT}"],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(LB_PORT):
+                print(f"{mode}: load balancer did not start")
+                continue
+            time.sleep(0.5)
+            sockets, elapsed, reached = idle_connections(args.connections, backend_counts)
+            threads, rss = process_info(lb.pid)
+            for sock in sockets:
+                sock.close()
+            time.sleep(1)
+            cpu_before = process_cpu(lb.pid)
+            moved, seconds = bulk_throughput(args.streams, args.megabytes)
+            cpu_after = process_cpu(lb.pid)
+            cpu_per_gb = (cpu_after - cpu_before) / (moved / 1024) if cpu_before is not None else float('nan')
+            rate = request_rate(args.clients, args.seconds)
+            results.append((mode, reached, elapsed, threads, rss, moved / seconds, cpu_per_gb, rate))
+        finally:
+            lb.terminate()
+            lb.wait()
+            time.sleep(0.5)
+
+    print("=" * 88)
+    print(f"PROXY TEST: {args.connections} idle connections, {args.streams}x{args.megabytes} MB streams, "
+          f"{args.clients} ping-pong clients")
+    print("=" * 88)
+    print(f"{'mode':<10}{'connected':>10}{'setup s':>9}{'threads':>9}{'RSS':>12}{'MB/s':>9}{'CPU s/GB':>10}{'req/s':>9}")
+    for mode, reached, elapsed, threads, rss, throughput, cpu_per_gb, rate in results:
+        print(f"{mode:<10}{reached:>10}{elapsed:>9.2f}{threads:>9}{rss:>12}{throughput:>9.1f}"
+              f"{cpu_per_gb:>10.2f}{rate:>9.0f}")
+    print("=" * 88)
+
+if __name__ == "__main__":
+    main()
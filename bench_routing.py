@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Load balancer routing benchmark
+Three fake backends, one deliberately slowed; compares tail latency per routing strategy
+"""
+
+import argparse
+import contextlib
+import io
+import socket
+import threading
+import time
+from load_balancer import LoadBalancer
+from routing import STRATEGIES
+
+BASE_PORT = 19800
+
+def fake_backend(port, delay):
+    """Minimal spell-check server: HEARTBEAT -> ALIVE, every other message answered after delay"""
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('localhost', port))
+    listener.listen(64)
+
+    def serve(conn):
+        with conn:
+            while True:
+                data = conn.recv(1024)
+                if not data:
+                    return
+                if data == b"HEARTBEAT":
+                    conn.sendall(b"ALIVE")
+                    return
+                time.sleep(delay)
+                conn.sendall(b"check" + data)
+
+    def accept_loop():
+        while True:
+            conn, _ = listener.accept()
+            threading.Thread(target=serve, args=(conn,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+
+def client_sessions(port, sessions, requests, latencies):
+    """Open a session through the load balancer, time each request/response, repeat"""
+    for _ in range(sessions):
+        with socket.create_connection(('localhost', port)) as sock:
+            for n in range(requests):
+                start = time.time()
+                sock.sendall(f"Ytext{n}".encode())
+                sock.recv(1024)
+                latencies.append(time.time() - start)
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Routing strategy tail-latency benchmark")
+    parser.add_argument('--clients', type=int, default=12)
+    parser.add_argument('--sessions', type=int, default=40, help="sessions per client")
+    parser.add_argument('--requests', type=int, default=5, help="requests per session")
+    parser.add_argument('--fast-ms', type=float, default=5)
+    parser.add_argument('--slow-ms', type=float, default=100)
+    args = parser.parse_args()
+
+    backends = [BASE_PORT + 1, BASE_PORT + 2, BASE_PORT + 3]
+    for port, delay in zip(backends, [args.fast_ms, args.fast_ms, args.slow_ms]):
+        fake_backend(port, delay / 1000)
+
+    rows = []
+    log = io.StringIO()  # the balancer logs every connection; keep it off the report
+    # Content-aware strategies relay the spell-check protocol itself; see bench_affinity.py
+    names = [name for name, strategy in STRATEGIES.items() if not strategy.content_aware]
+    for offset, name in enumerate(names, 10):
+        lb_port = BASE_PORT + offset
+        latencies = []
+        with contextlib.redirect_stdout(log):
+            lb = LoadBalancer(lb_port, name)
+            for port in backends:
+                lb.add_server('localhost', port)
+                lb.health_monitor.ping_server(('localhost', port))
+            threading.Thread(target=lb.start, daemon=True).start()
+            time.sleep(0.2)
+            clients = [threading.Thread(target=client_sessions,
+                                        args=(lb_port, args.sessions, args.requests, latencies))
+                       for _ in range(args.clients)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            lb.running = False
+        slow_share = lb.backend_stats[('localhost', backends[-1])].total / (args.clients * args.sessions)
+        rows.append(f"{name:<20}{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.95) * 1000:>9.1f}"
+                    f"{percentile(latencies, 0.99) * 1000:>9.1f}{slow_share:>9.0%}")
+
+    print("=" * 64)
+    print(f"ROUTING TEST: {args.clients} clients, backend {backends[-1]} slowed to {args.slow_ms:.0f} ms")
+    print("=" * 64)
+    print(f"{'strategy':<20}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'to slow':>10}")
+    for row in rows:
+        print(row)
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Snapshot bootstrap benchmark
+Starts one sync node on a large lexicon, then times a fresh node joining it
+"""
+
+import argparse
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from bench_gossip import query_status, wait_until
+from sync_manager import SyncManager
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot bootstrap benchmark")
+    parser.add_argument('--words', type=int, default=1000000)
+    parser.add_argument('--port', type=int, default=19500)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    here = os.path.dirname(os.path.abspath(__file__))
+    rng = random.Random(42)
+    words = {''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 12))) for _ in range(args.words)}
+    source_file = os.path.join(workdir, "source.txt")
+    with open(source_file, "w") as f:
+        f.write(" ".join(words))
+    joiner_file = os.path.join(workdir, "joiner.txt")
+    with open(joiner_file, "w") as f:
+        f.write("")
+
+    print("=" * 64)
+    print(f"SNAPSHOT BOOTSTRAP TEST: {len(words)} words")
+    print("=" * 64)
+
+    source = subprocess.Popen([sys.executable, os.path.join(here, "sync_manager.py"), '--node-id', "source",
+                               '--port', str(args.port), '--lexicon', source_file],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    joiner = None
+    try:
+        def source_ready():
+            status = query_status(args.port)
+            return status and not status['bootstrapping'] and status['words'] == len(words)
+        elapsed = wait_until(source_ready, 600, 0.5)
+        if elapsed is None:
+            print("Source node did not come up")
+            return
+        print(f"Source node seeded:     {elapsed:.2f}s")
+
+        joiner = SyncManager("joiner", joiner_file, args.port + 1, anti_entropy_interval=3600)
+        joiner.add_peer(('localhost', args.port))
+        start = time.time()
+        joiner.start()
+        elapsed = wait_until(lambda: not joiner.bootstrapping, 600, 0.05)
+        if elapsed is None:
+            print("Bootstrap: TIMEOUT")
+            return
+        status = joiner.get_status()
+        raw = sum(len(word) + 12 for word in words)  # rough size of the uncompressed entry lines
+        print(f"Joined in:              {elapsed:.2f}s ({status['words'] / elapsed:,.0f} words/s)")
+        print(f"  transfer + apply:     {status['last_snapshot_seconds']:.2f}s")
+        print(f"Compressed transfer:    {status['snapshot_bytes'] / 1e6:.1f} MB (~{raw / 1e6:.1f} MB uncompressed)")
+        print(f"Words received:         {status['words']}")
+        print(f"Digests match:          {joiner.digest() == query_status(args.port)['digest']}")
+
+        # The joiner now follows deltas like any other member
+        joiner.broadcast_update(["snapshotcheckword"])
+        def caught_up():
+            status = query_status(args.port)
+            return status and status['digest'] == joiner.digest()
+        elapsed = wait_until(caught_up, 30)
+        print("Delta after snapshot:   " + (f"{elapsed * 1000:.0f} ms" if elapsed is not None else "TIMEOUT"))
+    finally:
+        if joiner:
+            joiner.stop()
+        source.terminate()
+        source.wait()
+    print("=" * 64)
+
+if __name__ == "__main__":
+    main()
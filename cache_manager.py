@@ -5,10 +5,12 @@ LRU Cache with TTL for performance optimization
 
 import time
 from collections import OrderedDict
+from protocol import content_digest
 
 class SpellCheckCache:
     def __init__(self, max_size=100, ttl=300):
         self.cache = OrderedDict()
+        self.digests = {}  # content digest -> text, for conditional checks that send only the digest
         self.max_size = max_size
         self.ttl = ttl  # Time to live in seconds
         self.hits = 0
@@ -22,6 +24,7 @@ class SpellCheckCache:
             # Check if expired
             if time.time() - timestamp > self.ttl:
                 del self.cache[text]
+                self.digests.pop(content_digest(text), None)
                 self.misses += 1
                 return None
                 
@@ -36,10 +39,20 @@ class SpellCheckCache:
     def put(self, text, corrected_text):
         """Store corrected text in cache"""
         # Remove oldest if cache is full
-        if len(self.cache) >= self.max_size:
-            self.cache.popitem(last=False)
+        if text not in self.cache and len(self.cache) >= self.max_size:
+            oldest, _ = self.cache.popitem(last=False)
+            self.digests.pop(content_digest(oldest), None)
             
         self.cache[text] = (time.time(), corrected_text)
+        self.digests[content_digest(text)] = text
+        
+    def get_by_digest(self, digest):
+        """Get corrected text for the document with this content digest, if cached"""
+        text = self.digests.get(digest)
+        if text is None:
+            self.misses += 1
+            return None
+        return self.get(text)
         
     def get_stats(self):
         """Get simple cache statistics"""
@@ -56,5 +69,6 @@ class SpellCheckCache:
     def clear(self):
         """Clear all cache entries"""
         self.cache.clear()
+        self.digests.clear()
         self.hits = 0
         self.misses = 0
\ No newline at end of file
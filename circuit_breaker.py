@@ -0,0 +1,115 @@
+"""
+Circuit Breakers for the Load Balancer
+Per-backend passive health from live traffic: closed, open and half-open
+"""
+
+import threading
+import time
+from collections import deque
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+class CircuitBreaker:
+    """Stop sending traffic to a backend that keeps failing, and let it back in gradually.
+
+    Closed, every request goes through and its outcome lands in a window
+    of the last window outcomes; a failure, or an answer slower than
+    slow_call seconds, counts against the backend. failure_threshold
+    failures in a row, or a failure rate of failure_rate once min_calls
+    outcomes are in, opens the breaker: no traffic for open_timeout
+    seconds. Then it goes half-open and lets through at most trials
+    requests; if they all succeed it closes again, and if any fails it
+    reopens for twice as long (up to max_open_timeout).
+    """
+
+    def __init__(self, failure_rate=0.5, failure_threshold=3, window=20, min_calls=5,
+                 open_timeout=5.0, max_open_timeout=60.0, trials=3, slow_call=None, name=None):
+        self.failure_rate = failure_rate
+        self.failure_threshold = failure_threshold
+        self.outcomes = deque(maxlen=window)  # True for each failure
+        self.min_calls = min_calls
+        self.base_open_timeout = open_timeout
+        self.open_timeout = open_timeout
+        self.max_open_timeout = max_open_timeout
+        self.trials = trials
+        self.slow_call = slow_call
+        self.name = name
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.changed_at = time.time()
+        self.trials_started = 0
+        self.trials_passed = 0
+        self.lock = threading.Lock()
+        self.stats = {'opened': 0, 'recovered': 0}
+
+    def available(self):
+        """Whether a request may be routed here now (an open breaker whose time is up goes half-open)"""
+        with self.lock:
+            now = time.time()
+            if self.state == OPEN and now - self.changed_at >= self.open_timeout:
+                self._move(HALF_OPEN, now)
+            if self.state == HALF_OPEN and now - self.changed_at >= self.open_timeout:
+                # Trials were sent but never answered (idle sessions): allow a fresh set
+                self.changed_at = now
+                self.trials_started = self.trials_passed = 0
+            if self.state == CLOSED or (self.state == HALF_OPEN and self.trials_started < self.trials):
+                return True
+            return False
+
+    def attempt(self):
+        """A request was routed here; half-open, it uses up one of the trials"""
+        with self.lock:
+            if self.state == HALF_OPEN:
+                self.trials_started += 1
+
+    def record_success(self, seconds=None):
+        """A request got its answer, seconds after it was sent"""
+        if self.slow_call is not None and seconds is not None and seconds > self.slow_call:
+            self.record_failure()
+            return
+        with self.lock:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.trials_passed += 1
+                if self.trials_passed >= self.trials:
+                    self.open_timeout = self.base_open_timeout
+                    self._move(CLOSED, time.time())
+            elif self.state == CLOSED:
+                self.outcomes.append(False)
+
+    def record_failure(self):
+        """A request failed (or was too slow) on this backend"""
+        with self.lock:
+            now = time.time()
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self.open_timeout = min(self.open_timeout * 2, self.max_open_timeout)
+                self._move(OPEN, now)
+            elif self.state == CLOSED:
+                self.outcomes.append(True)
+                failures = sum(self.outcomes)
+                if (self.consecutive_failures >= self.failure_threshold
+                        or (len(self.outcomes) >= self.min_calls and failures / len(self.outcomes) >= self.failure_rate)):
+                    self._move(OPEN, now)
+
+    def _move(self, state, now):
+        # Called with the lock held
+        print(f"[BREAKER] {self.name or 'backend'}: {self.state} -> {state}")
+        if state == OPEN:
+            self.stats['opened'] += 1
+        elif state == CLOSED:
+            self.stats['recovered'] += 1
+        self.state = state
+        self.changed_at = now
+        self.outcomes.clear()
+        self.consecutive_failures = 0
+        self.trials_started = self.trials_passed = 0
+
+    def snapshot(self):
+        with self.lock:
+            failures = sum(self.outcomes)
+            return dict(self.stats, state=self.state,
+                        failure_rate=round(failures / len(self.outcomes), 2) if self.outcomes else 0.0,
+                        open_timeout=self.open_timeout)
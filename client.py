@@ -9,6 +9,13 @@ import tkinter as tk
 from tkinter import messagebox 
 import json
 import time
+import glob
+import os
+from collections import deque
+from protocol import (send_message, recv_message, content_digest, parse_lookup_reply, parse_matches_reply,
+                      render_matches, Compression, pipeline_hello, pipeline_accepted)
+from result_cache import ResultCache, SourceHistory
+from incremental import diff_document, apply_patch
 
 #=================================================================================================================
 """Declaring global variables"""
@@ -24,6 +31,12 @@ wordsList = []
 dconflag = tk.StringVar
 username = None
 connected = False
+pending_files = deque() # (name, digest, lexicon version, content) of uploaded files, oldest first; replies come back in order
+pending_lookups = deque() # (name, content, digest, stored result) of files whose digest was sent, oldest first
+results = ResultCache("client/cache/") # corrected texts by digest and lexicon version, so unchanged files need no upload
+sources = SourceHistory("client/cache/sources/") # the last version of each file checked in a batch, so edited files send only their edits
+BATCH_WINDOW = 8 # default number of batch requests outstanding at once
+COMPRESS_THRESHOLD = 512 # batch frames of this many bytes or more are zlib-compressed if the server agrees
 
 #=================================================================================================================
 
@@ -102,6 +115,7 @@ def connect():
             disconnect_button.configure(state=tk.NORMAL)
             submit_button.configure(state=tk.NORMAL)
             add_word_button.configure(state=tk.NORMAL)
+            remove_word_button.configure(state=tk.NORMAL)
             
             # Start receive thread
             receive_thread = threading.Thread(target=receive)
@@ -146,6 +160,7 @@ def disconnect():
         disconnect_button.configure(state=tk.DISABLED)
         submit_button.configure(state=tk.DISABLED)
         add_word_button.configure(state=tk.DISABLED)
+        remove_word_button.configure(state=tk.DISABLED)
 
 def receive():
     """Continuously receive messages from server"""
@@ -163,14 +178,11 @@ def receive():
                 # Server sent corrected text
                 corrected_content = data[5:]  # Remove "check" prefix
                 
-                # Get the filename that was submitted
-                last_filename = getattr(receive, 'last_filename', 'unknown.txt')
-                base_name = last_filename.replace('.txt', '')
-                corrected_filename = f"corrected_{base_name}.txt"
-                
-                # Save corrected file
-                with open(f"{RECV_DIR}{corrected_filename}", "w") as f:
-                    f.write(corrected_content)
+                # The oldest submission still waiting is the one this answers
+                submitted, digest, version, _ = pending_files.popleft() if pending_files else ('unknown.txt', None, None, None)
+                corrected_filename = save_result(submitted, corrected_content)
+                if digest:
+                    results.put(digest, version, corrected_content)
                     
                 msg.insert(tk.END, f"[SAVED]: Corrected file saved as '{corrected_filename}'\n")
                 msg.insert(tk.END, f"[RESULT]: Words in brackets [] are in the faulty lexicon\n")
@@ -179,6 +191,21 @@ def receive():
 
                 auto_scroll(msg)
                 
+            elif parse_matches_reply(data) is not None and pending_files:
+                # Annotation-only answer: bracket the matched words of our own copy
+                matches = parse_matches_reply(data)
+                submitted, digest, version, content = pending_files.popleft()
+                corrected_content = render_matches(content, matches)
+                corrected_filename = save_result(submitted, corrected_content)
+                if digest:
+                    results.put(digest, version, corrected_content)
+                    
+                msg.insert(tk.END, f"[SAVED]: Corrected file saved as '{corrected_filename}'\n")
+                msg.insert(tk.END, f"[MATCHES]: {len(matches)} lexicon words marked from a {len(data)}-byte answer: "
+                                   f"{', '.join(entry for _, _, entry in matches[:5])}{'...' if len(matches) > 5 else ''}\n")
+                msg.insert(tk.END, "-" * 60 + "\n")
+                auto_scroll(msg)
+                
             elif data == "PollingSuccess":
                 msg.insert(tk.END, "[LEXICON]: Server confirmed lexicon update\n")
                 wordsList.clear()
@@ -214,6 +241,24 @@ def receive():
                 msg.insert(tk.END, "-" * 60 + "\n")
                 auto_scroll(msg)
                 
+            elif parse_lookup_reply(data) and pending_lookups:
+                # The answer to a file's digest: our stored result stands, the server had it, or upload it
+                lookup = parse_lookup_reply(data)
+                file_name, file_content, digest, stored = pending_lookups.popleft()
+                if lookup.get('unchanged') and stored is not None:
+                    corrected_filename = save_result(file_name, stored)
+                    msg.insert(tk.END, f"[UNCHANGED]: '{file_name}' and the lexicon are unchanged, no upload needed\n")
+                elif 'text' in lookup:
+                    corrected_filename = save_result(file_name, lookup['text'])
+                    results.put(digest, lookup['version'], lookup['text'])
+                    msg.insert(tk.END, f"[CACHED]: Server already had '{file_name}', no upload needed\n")
+                else:
+                    upload_file(file_name, file_content, digest, lookup['version'])
+                    continue
+                msg.insert(tk.END, f"[SAVED]: Corrected file saved as '{corrected_filename}'\n")
+                msg.insert(tk.END, "-" * 60 + "\n")
+                auto_scroll(msg)
+                
             else:
                 # Regular server message
                 msg.insert(tk.END, f"[SERVER]: {data}\n")
@@ -225,6 +270,23 @@ def receive():
                 auto_scroll(msg)
             break
 
+def save_result(file_name, corrected_content):
+    """Write a corrected file to the receive folder; returns the name it was saved under"""
+    base_name = os.path.basename(file_name).replace('.txt', '')
+    corrected_filename = f"corrected_{base_name}.txt"
+    with open(f"{RECV_DIR}{corrected_filename}", "w") as f:
+        f.write(corrected_content)
+    return corrected_filename
+
+def saved_result(file_name):
+    """The corrected file saved for file_name by an earlier check, or None"""
+    base_name = os.path.basename(file_name).replace('.txt', '')
+    try:
+        with open(f"{RECV_DIR}corrected_{base_name}.txt", "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
 def submit_file():
     """Submit a file for spell checking"""
     global CLIENT
@@ -235,9 +297,6 @@ def submit_file():
         return
 
     file_name = filename_entry.get().strip()
-    
-    # Store filename for receive function
-    receive.last_filename = file_name
 
     # Validate filename
     if not file_name:
@@ -260,15 +319,12 @@ def submit_file():
         msg.insert(tk.END, f"[FILE CONTENT]: {file_content[:100]}...\n" if len(file_content) > 100 else f"[FILE CONTENT]: {file_content}\n")
         auto_scroll(msg)
         
-        # Send file indicator and name
-        CLIENT.send(f"Y{file_name}".encode(FORMAT))
-        time.sleep(0.1)  # Small delay
-        
-        # Send file content
-        CLIENT.send(file_content.encode(FORMAT))
-        
-        msg.insert(tk.END, f"[SENT]: File '{file_name}' sent to server for processing.\n")
-        auto_scroll(msg)
+        # Send only the digest first, with the lexicon version of any result we already have;
+        # the content goes up only if the server asks for it
+        digest = content_digest(file_content)
+        version, stored = results.latest(digest)
+        pending_lookups.append((file_name, file_content, digest, stored))
+        CLIENT.send(f"DIGEST {digest} {version or '-'}".encode(FORMAT))
         
         # Clear filename entry after successful submission
         filename_entry.delete(0, tk.END)
@@ -281,6 +337,201 @@ def submit_file():
         msg.insert(tk.END, f"[ERROR]: Failed to send file - {e}\n")
         auto_scroll(msg)
 
+def upload_file(file_name, file_content, digest, version):
+    """Send a file's content for a full check (the server did not have its result)"""
+    try:
+        # Send file indicator and name ("A" asks for the matches only); remember it for the reply
+        pending_files.append((file_name, digest, version, file_content))
+        CLIENT.send(f"{'A' if annotate_var.get() else 'Y'}{file_name}".encode(FORMAT))
+        time.sleep(0.1)  # Small delay
+        
+        # Send file content
+        CLIENT.send(file_content.encode(FORMAT))
+        
+        msg.insert(tk.END, f"[SENT]: File '{file_name}' sent to server for processing.\n")
+        auto_scroll(msg)
+    except Exception as e:
+        msg.insert(tk.END, f"[ERROR]: Failed to send file - {e}\n")
+        auto_scroll(msg)
+
+def submit_batch():
+    """Check every file in the send folder matching the batch pattern, over one pipelined connection"""
+    pattern = batch_entry.get().strip() or "*.txt"
+    paths = sorted(path for path in glob.glob(os.path.join(SEND_DIR, pattern)) if os.path.isfile(path))
+    if not paths:
+        msg.insert(tk.END, f"[ERROR]: No files match '{pattern}' in {SEND_DIR}\n")
+        auto_scroll(msg)
+        return
+    try:
+        window_size = max(1, int(window_entry.get().strip() or BATCH_WINDOW))
+    except ValueError:
+        window_size = BATCH_WINDOW
+    server = server_entry.get().strip() or "localhost"
+    try:
+        port = int(port_entry.get().strip() or 7520)
+    except ValueError:
+        port = 7520
+    user = username_entry.get().strip() or "batch"
+    
+    batch_button.configure(state=tk.DISABLED)
+    msg.insert(tk.END, f"[BATCH]: Submitting {len(paths)} files to {server}:{port}, up to {window_size} at a time\n")
+    auto_scroll(msg)
+    thread = threading.Thread(target=run_batch, args=((server, port), user, paths, window_size, annotate_var.get()))
+    thread.daemon = True
+    thread.start()
+
+def run_batch(address, user, paths, window_size, annotate=False):
+    """Pipeline the files' checks over one connection, keeping window_size outstanding.
+    
+    Each request carries an id, so answers may come back in any order
+    (a load balancer in l7 mode spreads them over all servers) and each
+    result is saved under the right name as soon as it arrives. A file
+    changed since the last batch that checked it is sent as its edits,
+    and the answer patches its corrected file; if the server no longer
+    has the old version, the file is sent again in full. With annotate,
+    full checks are answered with the matches only and bracketed here.
+    """
+    pending = {} # request id -> (path, content, time sent, (edit request, saved result) or None)
+    pending_lock = threading.Lock()
+    send_lock = threading.Lock()
+    slots = threading.Semaphore(window_size)
+    done = threading.Event()
+    latencies = []
+    counts = {'saved': 0, 'failed': 0, 'busy': 0, 'bytes': 0, 'patched': 0}
+    compression = Compression(COMPRESS_THRESHOLD)
+    wire = None # the compression the server agreed to
+    
+    def send(request_id):
+        path, content, _, recheck = pending[request_id]
+        with pending_lock:
+            pending[request_id] = (path, content, time.time(), recheck)
+        if recheck:
+            request = dict(recheck[0], id=request_id, op='recheck', user=user, name=os.path.basename(path))
+        else:
+            request = {'id': request_id, 'op': 'check', 'user': user, 'name': os.path.basename(path), 'content': content,
+                       'annotate': annotate}
+        with send_lock:
+            send_message(sock, request, wire)
+    
+    def patched(recheck, response):
+        """The corrected text from an incremental check's answer, or None if it has to be sent in full"""
+        if recheck is None or 'patch' not in response:
+            return None
+        try:
+            corrected = apply_patch(recheck[1], response['patch'])
+        except ValueError:
+            return None
+        return corrected if content_digest(corrected) == response['result'] else None
+    
+    def read_responses():
+        try:
+            while len(latencies) + counts['failed'] < len(paths):
+                response = recv_message(sock, wire)
+                if response is None:
+                    break
+                with pending_lock:
+                    entry = pending.get(response.get('id'))
+                if entry is None:
+                    continue # not a request of ours, or one already answered
+                path, content, sent_at, recheck = entry
+                if 'busy' in response:
+                    # The cluster is saturated: send it again once it says to
+                    counts['busy'] += 1
+                    timer = threading.Timer(response['busy'], send, args=(response['id'],))
+                    timer.daemon = True
+                    timer.start()
+                    continue
+                corrected = response.get('text')
+                if 'matches' in response:
+                    corrected = render_matches(content, response['matches'])
+                if recheck:
+                    corrected = patched(recheck, response)
+                    if corrected is None:
+                        # Our old version is gone from the server (or our corrected file no longer matches it)
+                        with pending_lock:
+                            pending[response['id']] = (path, content, sent_at, None)
+                        send(response['id'])
+                        continue
+                    counts['patched'] += 1
+                with pending_lock:
+                    del pending[response['id']]
+                if corrected is not None:
+                    latencies.append(time.time() - sent_at)
+                    counts['bytes'] += len(content.encode(FORMAT))
+                    corrected_filename = save_result(path, corrected)
+                    sources.remember(os.path.basename(path), content)
+                    counts['saved'] += 1
+                    msg.insert(tk.END, f"[BATCH]: {os.path.basename(path)} -> {corrected_filename}{' (edits only)' if recheck else ''}\n")
+                else:
+                    counts['failed'] += 1
+                    msg.insert(tk.END, f"[BATCH ERROR]: {os.path.basename(path)}: {response.get('error')}\n")
+                auto_scroll(msg)
+                slots.release()
+        except (OSError, ValueError) as e:
+            msg.insert(tk.END, f"[BATCH ERROR]: Connection lost - {e}\n")
+            auto_scroll(msg)
+        finally:
+            done.set()
+            slots.release() # unblock the sender if the connection died
+    
+    start_time = time.time()
+    try:
+        sock = socket.create_connection(address, timeout=10)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.sendall(pipeline_hello(compression))
+        reply = sock.recv(SIZE)
+        accepted, wire = pipeline_accepted(reply, compression)
+        if not accepted:
+            raise ConnectionError(reply.decode(FORMAT, errors='replace') or "connection closed")
+        sock.settimeout(None)
+    except (OSError, ConnectionError) as e:
+        msg.insert(tk.END, f"[BATCH ERROR]: Could not open a pipelined connection - {e}\n")
+        auto_scroll(msg)
+        batch_button.configure(state=tk.NORMAL)
+        return
+    
+    reader = threading.Thread(target=read_responses)
+    reader.daemon = True
+    reader.start()
+    try:
+        for request_id, path in enumerate(paths, 1):
+            slots.acquire()
+            if done.is_set():
+                break
+            with open(path, "r") as f:
+                content = f.read()
+            recheck = None
+            previous = sources.previous(os.path.basename(path))
+            saved = saved_result(path) if previous is not None and previous != content else None
+            change = diff_document(previous, content) if saved is not None else None
+            if change:
+                recheck = (dict(change, base=content_digest(previous), digest=content_digest(content)), saved)
+            with pending_lock:
+                pending[request_id] = (path, content, time.time(), recheck)
+            send(request_id)
+        done.wait()
+    except OSError as e:
+        msg.insert(tk.END, f"[BATCH ERROR]: {e}\n")
+    finally:
+        sock.close()
+        batch_button.configure(state=tk.NORMAL)
+    
+    elapsed = time.time() - start_time
+    latencies.sort()
+    msg.insert(tk.END, "-" * 60 + "\n")
+    msg.insert(tk.END, f"[BATCH DONE]: {counts['saved']}/{len(paths)} files checked in {elapsed:.2f}s "
+                       f"({counts['saved'] / elapsed:.1f} files/s, {counts['bytes'] / 1024 / elapsed:.1f} KB/s)\n")
+    if latencies:
+        msg.insert(tk.END, f"[BATCH DONE]: Latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+                           f"p99 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000:.0f} ms; "
+                           f"{counts['busy']} busy retries, {counts['failed']} failed, {counts['patched']} sent as edits\n")
+    stats = compression.snapshot()
+    if wire and stats['bytes_in']:
+        msg.insert(tk.END, f"[BATCH DONE]: Compressed: sent {stats['bytes_in'] / 1024:.0f} KB as {stats['bytes_on_wire'] / 1024:.0f} KB, "
+                           f"received {stats['bytes_received'] / 1024:.0f} KB for {stats['bytes_decompressed'] / 1024:.0f} KB\n")
+    msg.insert(tk.END, "-" * 60 + "\n")
+    auto_scroll(msg)
+
 def add_words():
     """Add words to lexicon list"""
     global wordsList
@@ -307,6 +558,30 @@ def add_words():
     # Clear entry
     lexicon_entry.delete(0, tk.END)
 
+def remove_words():
+    """Queue a word for removal from the lexicon (sent as "-word" on the next poll)"""
+    global wordsList
+    word = lexicon_entry.get().strip()
+    
+    # Validate word
+    if not word:
+        msg.insert(tk.END, "[ERROR]: Cannot remove an empty word. Please enter a valid word.\n")
+        auto_scroll(msg)
+        return
+    
+    entry = f"-{word}"
+    if entry in wordsList:
+        msg.insert(tk.END, f"[WARNING]: '{word}' already queued for removal.\n")
+        auto_scroll(msg)
+        return
+    
+    wordsList.append(entry)
+    lexicon_listbox.insert(tk.END, entry)
+    msg.insert(tk.END, f"[LEXICON]: Queued '{word}' for removal from the lexicon.\n")
+    auto_scroll(msg)
+    
+    lexicon_entry.delete(0, tk.END)
+
 # GUI Setup
 window = tk.Tk()
 window.title("SPELL CHECKER CLIENT")
@@ -377,6 +652,27 @@ filename_entry.pack(side=tk.LEFT, padx=5)
 submit_button = tk.Button(file_frame, text="Submit File", command=submit_file, bg='#52BE80', fg='black', state=tk.DISABLED, font=('Arial', 9, 'bold'),activebackground='#27AE60', activeforeground='white')
 submit_button.pack(pady=5)
 
+annotate_var = tk.BooleanVar(value=False)
+annotate_check = tk.Checkbutton(file_frame, text="Matches only (bracket words here)", variable=annotate_var, bg='#E8F4FD', fg='#2C3E50')
+annotate_check.pack(pady=2)
+
+# Batch submission: every matching file in the send folder over its own pipelined connection
+batch_input_frame = tk.Frame(file_frame, bg='#E8F4FD')
+batch_input_frame.pack(pady=5)
+
+tk.Label(batch_input_frame, text="Batch:", bg='#E8F4FD', fg='#2C3E50').pack(side=tk.LEFT, padx=5)
+batch_entry = tk.Entry(batch_input_frame, width=15)
+batch_entry.insert(0, "*.txt")
+batch_entry.pack(side=tk.LEFT, padx=5)
+
+tk.Label(batch_input_frame, text="Window:", bg='#E8F4FD', fg='#2C3E50').pack(side=tk.LEFT, padx=5)
+window_entry = tk.Entry(batch_input_frame, width=4)
+window_entry.insert(0, str(BATCH_WINDOW))
+window_entry.pack(side=tk.LEFT, padx=5)
+
+batch_button = tk.Button(file_frame, text="Submit Batch", command=submit_batch, bg='#52BE80', fg='black', font=('Arial', 9, 'bold'),activebackground='#27AE60', activeforeground='white')
+batch_button.pack(pady=5)
+
 # Right side - Lexicon management
 lexicon_frame = tk.Frame(middle_frame, bg='#E8F4FD', relief=tk.RAISED, bd=2)
 lexicon_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(5, 0))
@@ -394,6 +690,9 @@ lexicon_entry.pack(side=tk.LEFT, padx=5)
 add_word_button = tk.Button(lexicon_frame, text="Add to Lexicon", command=add_words, bg='#F39C12', fg='black', state=tk.DISABLED, font=('Arial', 9, 'bold'),activebackground='#E67E22', activeforeground='white')
 add_word_button.pack(pady=5)
 
+remove_word_button = tk.Button(lexicon_frame, text="Remove from Lexicon", command=remove_words, bg='#E59866', fg='black', state=tk.DISABLED, font=('Arial', 9, 'bold'),activebackground='#DC7633', activeforeground='white')
+remove_word_button.pack(pady=5)
+
 # Lexicon listbox
 lexicon_listbox = tk.Listbox(lexicon_frame, height=6, width=35, bg='#FFFACD', fg='#2C3E50',  font=('Arial', 9, 'bold'),selectbackground='#3498DB',selectforeground='white')
 lexicon_listbox.pack(pady=5, padx=10)
@@ -0,0 +1,243 @@
+"""
+Event-Loop Proxy for the Load Balancer
+One thread multiplexes every client/server pair with selectors (epoll on Linux)
+"""
+
+import errno
+import selectors
+import socket
+import time
+from admission import busy_message
+
+BUFFER_SIZE = 256 * 1024
+
+class Pipe:
+    """One direction of a proxied connection: bytes read from src waiting to reach dst"""
+
+    def __init__(self, src, dst):
+        self.src = src
+        self.dst = dst
+        self.pending = b""     # read but not yet accepted by dst
+        self.eof = False       # src finished sending
+        self.closed = False    # EOF passed on to dst
+
+class ProxiedConnection:
+    """A client, its backend, and the two pipes between them"""
+
+    def __init__(self, client, client_addr):
+        self.client = client
+        self.client_addr = client_addr
+        self.server = None
+        self.server_addr = None
+        self.server_socket = None
+        self.backend = None
+        self.attempts = 0
+        self.upstream = None    # client -> server
+        self.downstream = None  # server -> client
+        self.request_sent = None  # time of the client write awaiting a response
+
+class EventLoopProxy:
+    """Forward client connections to backends without a thread per connection.
+
+    The listening socket and every proxied socket are non-blocking and
+    registered with one selector. Data is read with recv_into into a single
+    shared buffer and written straight on; only what the destination will
+    not take yet is kept, and the source is not read again until that
+    remainder drains, so a slow reader pushes back on its writer instead
+    of growing memory. Backend choice, failover and the in-flight and
+    latency stats are the load balancer's own.
+    """
+
+    def __init__(self, balancer, max_retries=2):
+        self.balancer = balancer
+        self.max_retries = max_retries
+        self.selector = selectors.DefaultSelector()
+        self.buffer = bytearray(BUFFER_SIZE)
+        self.view = memoryview(self.buffer)
+        self.connections = set()
+        self.stats = {'bytes_forwarded': 0, 'peak_connections': 0}
+
+    def serve(self, listener):
+        """Run until the balancer stops; listener must already be bound and listening"""
+        listener.setblocking(False)
+        self.selector.register(listener, selectors.EVENT_READ, ('accept', None))
+        try:
+            while self.balancer.running:
+                for key, mask in self.selector.select(timeout=1):
+                    kind, conn = key.data
+                    if kind == 'accept':
+                        self._accept(listener)
+                    elif kind == 'connect':
+                        self._connected(conn)
+                    else:
+                        self._service(conn, key.fileobj, mask)
+        finally:
+            for conn in list(self.connections):
+                self._close(conn)
+            self.selector.unregister(listener)
+            self.selector.close()
+
+    def _accept(self, listener):
+        while True:
+            try:
+                client, client_addr = listener.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            self.balancer.stats['requests_handled'] += 1
+            if self.balancer.max_clients and len(self.connections) >= self.balancer.max_clients:
+                self.balancer.reject_client(client)  # a short reply to a fresh socket does not block
+                continue
+            client.setblocking(False)
+            conn = ProxiedConnection(client, client_addr)
+            self.connections.add(conn)
+            self.stats['peak_connections'] = max(self.stats['peak_connections'], len(self.connections))
+            self._connect_backend(conn)
+
+    def _connect_backend(self, conn):
+        """Start a non-blocking connect to the best server, or give up after max_retries.
+
+        The event loop cannot wait in the admission queue, so a cluster
+        at its limits turns the client away at once with a busy reply.
+        """
+        server, backend, retry_after = None, None, None
+        if conn.attempts < self.max_retries:
+            server, backend, retry_after = self.balancer.reserve_server(block=False)
+        if server is None:
+            if retry_after is not None:
+                reply = busy_message(retry_after)
+            else:
+                print(f"[ERROR] No healthy servers available for {conn.client_addr}")
+                reply = b"ERROR: No servers available"
+            try:
+                conn.client.send(reply)
+            except OSError:
+                pass
+            self._close(conn)
+            return
+        conn.attempts += 1
+        conn.server_addr = server
+        conn.backend = backend  # reserve_server counted us in
+        conn.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        conn.server_socket.setblocking(False)
+        result = conn.server_socket.connect_ex(server)
+        if result not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            self._connect_failed(conn, OSError(result, errno.errorcode.get(result, "connect failed")))
+            return
+        self.selector.register(conn.server_socket, selectors.EVENT_WRITE, ('connect', conn))
+
+    def _connected(self, conn):
+        error = conn.server_socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        self.selector.unregister(conn.server_socket)
+        if error:
+            self._connect_failed(conn, OSError(error, errno.errorcode.get(error, "connect failed")))
+            return
+        conn.server = conn.server_socket
+        conn.server_socket = None
+        conn.server.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn.upstream = Pipe(conn.client, conn.server)
+        conn.downstream = Pipe(conn.server, conn.client)
+        self.selector.register(conn.client, selectors.EVENT_READ, ('pipe', conn))
+        self.selector.register(conn.server, selectors.EVENT_READ, ('pipe', conn))
+        self.balancer.stats['connections_forwarded'] += 1
+
+    def _connect_failed(self, conn, error):
+        print(f"[FAILOVER] Server {conn.server_addr} failed: {error}")
+        self.balancer.backend_failed(conn.server_addr)
+        conn.server_socket.close()
+        conn.server_socket = None
+        conn.backend.release()
+        conn.backend = None
+        self._connect_backend(conn)
+
+    def _service(self, conn, sock, mask):
+        """Handle readiness on one side of a proxied connection"""
+        if conn not in self.connections:
+            return  # closed earlier in this round of events
+        try:
+            if mask & selectors.EVENT_WRITE:
+                # sock drained enough to take what the other side had waiting
+                pipe = conn.upstream if sock is conn.server else conn.downstream
+                self._flush(conn, pipe)
+            if mask & selectors.EVENT_READ and conn in self.connections:
+                pipe = conn.upstream if sock is conn.client else conn.downstream
+                self._read(conn, pipe)
+        except OSError as e:
+            if e.errno not in (errno.EPIPE, errno.ECONNRESET):
+                print(f"[FORWARD] {conn.client_addr} ended: {e}")
+            self._close(conn)
+
+    def _read(self, conn, pipe):
+        try:
+            count = pipe.src.recv_into(self.buffer)
+        except BlockingIOError:
+            return
+        if count == 0:
+            pipe.eof = True
+            self._flush(conn, pipe)
+            return
+        if pipe is conn.upstream:
+            if conn.request_sent is None:
+                conn.request_sent = time.time()
+        elif conn.request_sent is not None:
+            conn.backend.succeeded(time.time() - conn.request_sent)
+            conn.request_sent = None
+        self.stats['bytes_forwarded'] += count
+        try:
+            sent = pipe.dst.send(self.view[:count])
+        except BlockingIOError:
+            sent = 0
+        if sent < count:
+            pipe.pending = bytes(self.view[sent:count])
+            self._update_interest(conn)
+
+    def _flush(self, conn, pipe):
+        """Push a pipe's leftover bytes; pass EOF on once they are gone"""
+        if pipe.pending:
+            try:
+                sent = pipe.dst.send(pipe.pending)
+            except BlockingIOError:
+                sent = 0
+            pipe.pending = pipe.pending[sent:]
+        if pipe.eof and not pipe.pending and not pipe.closed:
+            pipe.closed = True
+            try:
+                pipe.dst.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+        if conn.upstream.closed and conn.downstream.closed:
+            self._close(conn)
+        else:
+            self._update_interest(conn)
+
+    def _update_interest(self, conn):
+        """Read a side only while its pipe is empty and open; watch for writability while it is not"""
+        for sock, outgoing, incoming in ((conn.client, conn.upstream, conn.downstream),
+                                         (conn.server, conn.downstream, conn.upstream)):
+            events = 0
+            if not outgoing.eof and not outgoing.pending:
+                events |= selectors.EVENT_READ
+            if incoming.pending:
+                events |= selectors.EVENT_WRITE
+            key = self.selector.get_map().get(sock)
+            if events and key is None:
+                self.selector.register(sock, events, ('pipe', conn))
+            elif events and key.events != events:
+                self.selector.modify(sock, events, ('pipe', conn))
+            elif not events and key is not None:
+                self.selector.unregister(sock)
+
+    def _close(self, conn):
+        if conn not in self.connections:
+            return
+        self.connections.discard(conn)
+        for sock in (conn.client, conn.server, conn.server_socket):
+            if sock is None:
+                continue
+            if sock in self.selector.get_map():
+                self.selector.unregister(sock)
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if conn.backend:
+            conn.backend.release()
@@ -0,0 +1,89 @@
+"""
+Request Failover for the Load Balancer
+In-flight request tracking for replay after backend failure, and hedged requests
+"""
+
+import heapq
+import threading
+import time
+from collections import deque
+
+class TrackedRequest:
+    """One client request the load balancer holds until a backend answers it.
+
+    It may be sent more than once (replayed after a backend failure, or
+    hedged to a second backend when slow); the first answer wins and any
+    later duplicate is dropped.
+    """
+
+    def __init__(self, request, reply, key=None, prefer=None):
+        self.request = request
+        self.reply = reply
+        self.key = key
+        self.prefer = prefer  # a server to try first (one that holds state for this request)
+        self.tried = []  # servers it was sent to, in order
+        self.started = time.time()
+        self.done = False
+        self.hedged = False
+        self.outstanding = 0  # attempts sent and not yet answered or failed
+        self.lock = threading.Lock()
+
+    def finish(self):
+        """Claim the request for the answer at hand; False if another attempt already answered"""
+        with self.lock:
+            if self.done:
+                return False
+            self.done = True
+            return True
+
+class LatencyTracker:
+    """Recent request latencies and a cached percentile of them"""
+
+    def __init__(self, percentile=0.95, window=1000, min_samples=20, refresh=50):
+        self.percentile = percentile
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.refresh = refresh  # recompute the percentile every this many samples
+        self.threshold = None
+        self.count = 0
+
+    def observe(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        if len(self.samples) >= self.min_samples and (self.threshold is None or self.count % self.refresh == 0):
+            ordered = sorted(self.samples)
+            self.threshold = ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+class HedgeScheduler:
+    """One thread that fires callbacks at their deadlines, for hedging slow requests"""
+
+    def __init__(self):
+        self.heap = []
+        self.counter = 0  # tie-breaker so the heap never compares callbacks
+        self.cond = threading.Condition()
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def schedule(self, delay, callback):
+        with self.cond:
+            self.counter += 1
+            heapq.heappush(self.heap, (time.time() + delay, self.counter, callback))
+            self.cond.notify()
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while self.running and (not self.heap or self.heap[0][0] > time.time()):
+                    self.cond.wait(self.heap[0][0] - time.time() if self.heap else None)
+                if not self.running:
+                    return
+                _, _, callback = heapq.heappop(self.heap)
+            try:
+                callback()
+            except Exception as e:
+                print(f"[HEDGE] Callback failed: {e}")
@@ -0,0 +1,59 @@
+"""
+Phi-Accrual Failure Detector
+A continuous suspicion level for each server, from how late its heartbeat is
+"""
+
+import math
+import statistics
+from collections import deque
+
+MAX_PHI = 1000.0  # past this the heartbeat is so late that the exact figure stops mattering
+
+class PhiAccrualDetector:
+    """Phi-accrual failure detection (Hayashibara et al.) for scheduled heartbeats.
+
+    The monitor decides when each heartbeat is due, so what varies is
+    how late an answer arrives past its due time (round trip, monitor
+    lag, network jitter). The detector keeps the last window of those
+    delays. phi(now) is -log10 of the probability that an answer still
+    on its way would be this late, under a normal fit of the delays;
+    phi 1 means about a 10% chance that the server is merely slow, and
+    phi 8 about one in a hundred million. A jittery network widens the
+    fit, so the same phi takes longer to reach. min_std stops a very
+    steady network from making a few milliseconds look damning, and
+    acceptable_pause is slack added to every deadline.
+    """
+
+    def __init__(self, window=1000, min_std=0.2, acceptable_pause=0.0):
+        self.delays = deque(maxlen=window)
+        self.min_std = min_std
+        self.acceptable_pause = acceptable_pause
+        self.expected = None  # when the next heartbeat answer is due
+
+    def heartbeat(self, now, next_due, sample=True):
+        """An answer arrived at now; the next one is due at next_due.
+
+        sample=False skips timing this one: the caller passes it for the
+        first answer after a real outage, whose delay measures the outage
+        rather than the network. An answer after a lost heartbeat or two
+        should be timed, so that a lossy network raises the bar.
+        """
+        if sample and self.expected is not None:
+            self.delays.append(max(0.0, now - self.expected))
+        self.expected = next_due
+
+    def expect_by(self, due):
+        """Bring the next heartbeat forward (an early re-check)"""
+        self.expected = due if self.expected is None else min(self.expected, due)
+
+    def phi(self, now):
+        """Suspicion that the server is down, 0 (on time) and up"""
+        if self.expected is None:
+            return 0.0
+        mean = statistics.fmean(self.delays) if self.delays else 0.0
+        std = max(statistics.pstdev(self.delays) if len(self.delays) > 1 else 0.0, self.min_std)
+        late = now - self.expected - self.acceptable_pause
+        p_later = 0.5 * math.erfc((late - mean) / (std * math.sqrt(2)))  # P(an answer is later still)
+        if p_later <= 0:
+            return MAX_PHI
+        return min(-math.log10(p_later), MAX_PHI)
@@ -3,17 +3,49 @@ Health Monitor for Spell Checker Servers
 Checks if servers are working properly
 """
 
+import errno
+import selectors
 import socket
 import threading
 import time
 import json
+from failure_detector import PhiAccrualDetector
 
 class HealthMonitor:
-    def __init__(self, check_interval=10):
+    """Heartbeats every server concurrently, each on its own schedule.
+    
+    A probe round connects to all due servers at once on one selectors
+    loop, so a hung server costs the round at most timeout rather than
+    delaying everyone behind it. A server's interval doubles with each
+    healthy answer up to check_interval, and drops to min_interval after
+    a failure (or a recheck after live traffic failed), so the checks
+    that confirm it, and later its recovery, come quickly.
+    
+    A server leaves rotation after failure_threshold failed checks in a
+    row. With phi_threshold set it leaves instead once its phi-accrual
+    suspicion is at phi_threshold or more on phi_probes failed checks in
+    a row (a lost heartbeat is late by the whole timeout, so a single
+    one would look damning), and suspicion(server) above suspect_phi
+    lets the load balancer avoid it before then.
+    """
+    
+    def __init__(self, check_interval=10, min_interval=1, timeout=2, failure_threshold=3, lexicon_grace=2,
+                 phi_threshold=None, suspect_phi=3.0, min_std=0.2, phi_probes=2):
         self.servers = {} 
         self.healthy_servers = [] 
         self.check_interval = check_interval
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.lexicon_grace = lexicon_grace  # seconds a lexicon change gets to reach every server
+        self.phi_threshold = phi_threshold
+        self.suspect_phi = suspect_phi
+        self.phi_probes = phi_probes
+        self.min_std = min_std
+        self.detectors = {}  # server -> PhiAccrualDetector
         self.monitoring = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()  # a server was added or marked unhealthy: reschedule now
         
     def add_server(self, server_addr):
         """Add a new server to monitor"""
@@ -21,63 +53,197 @@ class HealthMonitor:
             'status': 'unknown',
             'last_check': 0,
             'response_time': 0,
-            'failed_checks': 0
+            'failed_checks': 0,
+            'interval': self.min_interval,
+            'next_check': 0,
+            'report': None,  # the server's last load report, if it sends them
+            'report_at': 0,
+            'phi': 0.0,
+            'phi_over': 0  # failed checks in a row with phi at the threshold
         }
+        self.detectors[server_addr] = PhiAccrualDetector(min_std=self.min_std)
+        self.wake.set()
         
-    def ping_server(self, server_addr):
-        """Send a ping to check if server is alive"""
-        try:
-            start_time = time.time()
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(2)
-            sock.connect(server_addr)
-            sock.send(b"HEARTBEAT")
-            response = sock.recv(1024)
-            sock.close()
+    def remove_server(self, server_addr):
+        """Stop monitoring a server that has left"""
+        with self.lock:
+            self.servers.pop(server_addr, None)
+            self.detectors.pop(server_addr, None)
+            if server_addr in self.healthy_servers:
+                self.healthy_servers.remove(server_addr)
             
-            response_time = time.time() - start_time
+    def probe(self, server_addrs):
+        """Send HEARTBEAT to every server at once.
+        
+        Returns {server: (response time, load report or None), or None if it failed}.
+        """
+        selector = selectors.DefaultSelector()
+        results = {}
+        for server_addr in server_addrs:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setblocking(False)
+            try:
+                error = sock.connect_ex(server_addr)
+            except OSError:
+                error = errno.EHOSTUNREACH
+            if error not in (0, errno.EINPROGRESS):
+                sock.close()
+                results[server_addr] = None
+                continue
+            selector.register(sock, selectors.EVENT_WRITE, (server_addr, time.time()))
             
-            if response == b"ALIVE":
-                self.servers[server_addr]['status'] = 'healthy'
-                self.servers[server_addr]['response_time'] = response_time
-                self.servers[server_addr]['failed_checks'] = 0
+        deadline = time.time() + self.timeout
+        while selector.get_map():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            for key, events in selector.select(remaining):
+                sock, (server_addr, start_time) = key.fileobj, key.data
+                try:
+                    if events & selectors.EVENT_WRITE:
+                        if sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+                            raise ConnectionRefusedError
+                        sock.send(b"HEARTBEAT")
+                        selector.modify(sock, selectors.EVENT_READ, key.data)
+                        continue
+                    response = sock.recv(4096)
+                    results[server_addr] = (time.time() - start_time, self.parse_report(response)) \
+                        if response.split(b" ", 1)[0] == b"ALIVE" else None
+                except OSError:
+                    results[server_addr] = None
+                selector.unregister(sock)
+                sock.close()
+                
+        for key in list(selector.get_map().values()):  # no answer within timeout
+            results[key.data[0]] = None
+            key.fileobj.close()
+        selector.close()
+        return results
+        
+    @staticmethod
+    def parse_report(response):
+        """The load report after "ALIVE " (servers that reply a bare ALIVE have none)"""
+        try:
+            report = json.loads(response[len(b"ALIVE "):])
+        except ValueError:
+            return None
+        return report if isinstance(report, dict) else None
+        
+    def ping_server(self, server_addr):
+        """Send a ping to check if server is alive"""
+        return self._record(server_addr, self.probe([server_addr])[server_addr])
+        
+    def _record(self, server_addr, result):
+        with self.lock:
+            entry = self.servers.get(server_addr)
+            detector = self.detectors.get(server_addr)
+            if entry is None or detector is None:
+                return False  # removed while the probe was out
+            now = time.time()
+            entry['last_check'] = now
+            if result is not None:
+                entry['status'] = 'healthy'
+                entry['response_time'], report = result
+                if report is not None:
+                    entry['report'], entry['report_at'] = report, now
+                entry['interval'] = min(entry['interval'] * 2, self.check_interval)  # stable: back off
+                entry['next_check'] = now + entry['interval']
+                # A gap of a heartbeat or two is network noise for the detector to learn; longer was an outage
+                detector.heartbeat(now, entry['next_check'], sample=entry['failed_checks'] < self.failure_threshold)
+                entry['failed_checks'] = 0
+                entry['phi'] = 0.0
+                entry['phi_over'] = 0
                 
                 if server_addr not in self.healthy_servers:
                     self.healthy_servers.append(server_addr)
                     print(f"[HEALTH] Server {server_addr} is now HEALTHY")
                 return True
                 
-        except Exception as e:
             # Server didn't respond or connection failed
-            self.servers[server_addr]['failed_checks'] += 1
-            if self.servers[server_addr]['failed_checks'] >= 3:
-                self.servers[server_addr]['status'] = 'unhealthy'
+            entry['failed_checks'] += 1
+            entry['interval'] = self.min_interval  # confirm the failure (or catch the recovery) soon
+            entry['next_check'] = now + entry['interval']
+            entry['phi'] = round(detector.phi(now), 2)
+            if self.phi_threshold is not None:
+                entry['phi_over'] = entry['phi_over'] + 1 if entry['phi'] >= self.phi_threshold else 0
+                down = entry['phi_over'] >= self.phi_probes
+            else:
+                down = entry['failed_checks'] >= self.failure_threshold
+            if down:
+                entry['status'] = 'unhealthy'
                 
                 if server_addr in self.healthy_servers:
                     self.healthy_servers.remove(server_addr)
                     print(f"[HEALTH] Server {server_addr} is now UNHEALTHY")
             return False
             
+    def recheck(self, server_addr):
+        """Live traffic saw a failure: probe the server again soon rather than at its next interval"""
+        with self.lock:
+            entry = self.servers.get(server_addr)
+            if entry:
+                entry['interval'] = self.min_interval
+                entry['next_check'] = min(entry['next_check'], time.time() + self.min_interval)
+                self.detectors[server_addr].expect_by(entry['next_check'])
+        self.wake.set()
+            
+    def suspicion(self, server_addr):
+        """Phi for a server right now: how overdue its heartbeat answer is"""
+        detector = self.detectors.get(server_addr)
+        return detector.phi(time.time()) if detector else 0.0
+        
+    def suspect(self, server_addr):
+        """Whether routing should avoid a server that is still in rotation"""
+        return self.phi_threshold is not None and self.suspicion(server_addr) >= self.suspect_phi
+        
+    def stale_lexicon(self, server_addr):
+        """Whether a server's last report shows it missing lexicon changes another server had earlier.
+        
+        lexicon_version counts the lexicon events a server has seen, so a
+        lower count means events it has not got yet. Another server's
+        higher count only makes this one stale if it was reported more
+        than lexicon_grace before this one's report, i.e. sync has had
+        time to deliver it.
+        """
+        entry = self.servers.get(server_addr)
+        report = entry and entry['report']
+        if not report or report.get('lexicon_version') is None:
+            return False
+        for other in list(self.servers.values()):
+            other_report = other['report']
+            if (other_report and (other_report.get('lexicon_version') or 0) > report['lexicon_version']
+                    and other['report_at'] + self.lexicon_grace < entry['report_at']):
+                return True
+        return False
+        
     def get_healthy_servers(self):
         """Get list of servers that are working"""
         return self.healthy_servers.copy()  # Return copy of healthy servers list
         
     def start_monitoring(self):
         """Start checking servers continuously"""
+        if self.monitoring:
+            return
         self.monitoring = True
         threading.Thread(target=self._monitor_loop, daemon=True).start()
         
     def stop_monitoring(self):
         """Stop monitoring servers"""
         self.monitoring = False
+        self.wake.set()
         
     def _monitor_loop(self):
-        """Main loop that checks all servers"""
+        """Probe every server that is due, together, then sleep until the next one is"""
         while self.monitoring:
-            for server_addr in self.servers:
-                self.ping_server(server_addr)
-                self.servers[server_addr]['last_check'] = time.time()
-            time.sleep(self.check_interval)
+            now = time.time()
+            due = [server_addr for server_addr, entry in list(self.servers.items()) if entry['next_check'] <= now]
+            if due:
+                for server_addr, result in self.probe(due).items():
+                    self._record(server_addr, result)
+            next_check = min((entry['next_check'] for entry in list(self.servers.values())),
+                             default=time.time() + self.check_interval)
+            self.wake.wait(max(0, next_check - time.time()))
+            self.wake.clear()
             
     def get_server_stats(self):
         """Get summary of all monitored servers"""
@@ -0,0 +1,166 @@
+"""
+Incremental Checks
+Token edits between two versions of a document, and the per-document state a server keeps to re-check only
+the edited tokens
+"""
+
+import difflib
+import threading
+from collections import OrderedDict
+
+MAX_EDIT_FRACTION = 0.5  # past this share of the new document's tokens, uploading it whole is as cheap
+
+def split_document(text):
+    """(leading whitespace, tokens, trailing whitespace) of a document.
+
+    The tokens are the words a check looks at, split exactly as
+    lexicon_check splits them, so a check's result has one token for
+    each of them and an edit to the tokens maps onto the result.
+    """
+    stripped = text.strip()
+    if not stripped:
+        return text, [""], ""
+    lead = text[:len(text) - len(text.lstrip())]
+    trail = text[len(text.rstrip()):]
+    return lead, stripped.split(" "), trail
+
+def join_document(lead, tokens, trail):
+    return lead + " ".join(tokens) + trail
+
+def _chunks(tokens):
+    """Token offsets where lines and sentences start, and the chunks between them as hashable tuples"""
+    starts, chunks, start = [], [], 0
+    for i, token in enumerate(tokens):
+        if "\n" in token or token.endswith(('.', '!', '?')) or i == len(tokens) - 1:
+            starts.append(start)
+            chunks.append(tuple(tokens[start:i + 1]))
+            start = i + 1
+    starts.append(start)
+    return starts, chunks
+
+def diff_tokens(old, new):
+    """Edits turning the token list old into new: [start, end, tokens] replacing old[start:end], in order.
+
+    The matcher is quadratic at worst, so it first matches whole lines
+    and sentences, then only the tokens of the chunks that differ.
+    """
+    # Small edits to a long document: skip the common ends altogether
+    prefix, limit = 0, min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    old_middle, new_middle = old[prefix:len(old) - suffix], new[prefix:len(new) - suffix]
+    old_starts, old_chunks = _chunks(old_middle)
+    new_starts, new_chunks = _chunks(new_middle)
+    edits = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_chunks, new_chunks, False).get_opcodes():
+        if tag == 'equal':
+            continue
+        old_start, new_start = old_starts[i1], new_starts[j1]
+        old_tokens, new_tokens = old_middle[old_start:old_starts[i2]], new_middle[new_start:new_starts[j2]]
+        for tag, k1, k2, l1, l2 in difflib.SequenceMatcher(None, old_tokens, new_tokens, False).get_opcodes():
+            if tag != 'equal':
+                edits.append([prefix + old_start + k1, prefix + old_start + k2, new_tokens[l1:l2]])
+    return edits
+
+def apply_edits(tokens, edits):
+    """The token list with edits (as diff_tokens makes them) applied; ValueError if they do not fit it"""
+    result, position = [], 0
+    for start, end, replacement in edits:
+        if not position <= start <= end <= len(tokens):
+            raise ValueError(f"edit [{start}, {end}] out of order or past {len(tokens)} tokens")
+        result.extend(tokens[position:start])
+        result.extend(replacement)
+        position = end
+    result.extend(tokens[position:])
+    return result
+
+def _line_starts(lines):
+    """The token each line starts in (the one holding the newline before it), and the last token"""
+    starts, token = [], 0
+    for line in lines:
+        starts.append(token)
+        token += line.count(" ")
+    starts.append(token)
+    return starts
+
+def _changed_ranges(old_text, new_text):
+    """[old start, old end, new start, new end] token ranges around the lines that differ, merged where they touch"""
+    old_lines, new_lines = old_text.split("\n"), new_text.split("\n")
+    old_starts, new_starts = _line_starts(old_lines), _line_starts(new_lines)
+    prefix, limit = 0, min(len(old_lines), len(new_lines))
+    while prefix < limit and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    matcher = difflib.SequenceMatcher(None, old_lines[prefix:len(old_lines) - suffix],
+                                      new_lines[prefix:len(new_lines) - suffix])
+    ranges = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        # From the token holding the newline before the first changed line to the one after the last
+        i1, i2, j1, j2 = i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix
+        changed = [old_starts[i1], old_starts[i2] + 1, new_starts[j1], new_starts[j2] + 1]
+        if ranges and changed[0] <= ranges[-1][1]:
+            ranges[-1][1], ranges[-1][3] = changed[1], changed[3]
+        else:
+            ranges.append(changed)
+    return ranges
+
+def diff_document(old_text, new_text):
+    """The request fields of an incremental check from old_text to new_text.
+
+    Returns {'edits', 'lead', 'trail'}, or None when so much changed
+    that uploading the document whole costs about the same. Lines are
+    matched first, so only the tokens of changed lines are compared.
+    """
+    _, old, _ = split_document(old_text)
+    lead, new, trail = split_document(new_text)
+    edits = []
+    for old_start, old_end, new_start, new_end in _changed_ranges(old_text.strip(), new_text.strip()):
+        for start, end, replacement in diff_tokens(old[old_start:old_end], new[new_start:new_end]):
+            edits.append([old_start + start, old_start + end, replacement])
+    if sum(len(replacement) for _, _, replacement in edits) > len(new) * MAX_EDIT_FRACTION:
+        return None
+    return {'edits': edits, 'lead': lead, 'trail': trail}
+
+def apply_patch(corrected, patch):
+    """A stored check result with an incremental check's patch applied"""
+    return " ".join(apply_edits(corrected.split(" "), patch))
+
+class DocumentStore:
+    """The documents a server checked lately, for incremental checks against them.
+
+    Keyed by content digest, each entry holds the document, its check
+    result and the lexicon version it was checked against. Threads share
+    it, so every access takes the lock; past max_documents the least
+    recently used document goes.
+    """
+
+    def __init__(self, max_documents=200):
+        self.documents = OrderedDict()  # digest -> (text, corrected text, lexicon version)
+        self.max_documents = max_documents
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self.lock:
+            state = self.documents.get(digest)
+            if state is None:
+                self.misses += 1
+                return None
+            self.documents.move_to_end(digest)
+            self.hits += 1
+            return state
+
+    def put(self, digest, text, corrected, version):
+        with self.lock:
+            self.documents[digest] = (text, corrected, version)
+            self.documents.move_to_end(digest)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
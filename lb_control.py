@@ -0,0 +1,89 @@
+"""
+Load Balancer Control Channel
+Servers register and deregister themselves at runtime; the control panel reads load from it
+"""
+
+import socket
+import threading
+from protocol import send_message, recv_message
+
+def control_request(address, message, timeout=5):
+    """Send one control message to a load balancer and return its reply"""
+    with socket.create_connection(address, timeout=timeout) as sock:
+        send_message(sock, message)
+        reply = recv_message(sock)
+    if reply is None:
+        raise ConnectionError(f"load balancer at {address} closed the control connection")
+    return reply
+
+class ControlChannel:
+    """One framed JSON request and reply per connection on the control port.
+
+    ops:
+      register    {host, port}                 add a backend (or cancel its draining)
+      deregister  {host, port, drain, wait}    stop routing to it; with drain, forget it once its
+                                               in-flight work is done, and with wait, reply only then
+      stats       {}                           the load balancer's get_stats()
+      list        {}                           backends and which are draining
+    """
+
+    def __init__(self, balancer, port, host='localhost'):
+        self.balancer = balancer
+        self.address = (host, port)
+        self.listener = None
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(self.address)
+        self.listener.listen(64)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f"[CONTROL] Listening on port {self.address[1]}")
+
+    def stop(self):
+        if self.listener:
+            self.listener.close()
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            try:
+                message = recv_message(conn)
+                if message is None:
+                    return
+                send_message(conn, self.handle(message))
+            except (OSError, ValueError) as e:
+                print(f"[CONTROL] Bad control connection: {e}")
+
+    def handle(self, message):
+        op = message.get('op')
+        if op in ('register', 'deregister'):
+            if not isinstance(message.get('host'), str) or not isinstance(message.get('port'), int):
+                return {'ok': False, 'error': f"{op} needs host and port"}
+            server = (message['host'], message['port'])
+            if op == 'register':
+                self.balancer.add_server(*server)
+                return {'ok': True}
+            in_flight = self.balancer.remove_server(server, drain=message.get('drain', True))
+            if in_flight is None:
+                return {'ok': False, 'error': f"{server[0]}:{server[1]} is not registered"}
+            drained = self.balancer.wait_drained(server) if message.get('wait') else None
+            return {'ok': True, 'in_flight': in_flight, 'drained': drained}
+        if op == 'stats':
+            stats = self.balancer.get_stats()
+            health = stats['servers']
+            stats['servers'] = dict(health, servers={f"{host}:{port}": info
+                                                     for (host, port), info in health['servers'].items()})
+            return {'ok': True, 'stats': stats}
+        if op == 'list':
+            return {'ok': True,
+                    'servers': [f"{host}:{port}" for host, port in self.balancer.servers],
+                    'draining': [f"{host}:{port}" for host, port in self.balancer.draining]}
+        return {'ok': False, 'error': f"unknown op {op!r}"}
@@ -0,0 +1,310 @@
+"""
+Replicated Lexicon CRDT for Distributed Spell Checker
+Add-wins observed-remove set with per-node vector clocks and delta encoding
+"""
+
+import hashlib
+
+def encode_dots(dots):
+    """Compress a set of (node, counter) dots into {node: [[lo, hi], ...]} ranges"""
+    by_node = {}
+    for node, counter in sorted(dots):
+        ranges = by_node.setdefault(node, [])
+        if ranges and ranges[-1][1] == counter - 1:
+            ranges[-1][1] = counter
+        else:
+            ranges.append([counter, counter])
+    return by_node
+
+def decode_dots(encoded):
+    """Inverse of encode_dots"""
+    return {(node, counter)
+            for node, ranges in encoded.items()
+            for lo, hi in ranges
+            for counter in range(lo, hi + 1)}
+
+def encode_chunk(items):
+    """Serialize (word, dots) pairs for a snapshot stream.
+
+    The first line names the nodes; every other line is
+    word<TAB>node_index:counter[,node_index:counter...]. Plain text with
+    small integers compresses far better than the JSON entry encoding.
+    """
+    nodes = {}
+    lines = []
+    for word, dots in items:
+        tags = ",".join(f"{nodes.setdefault(node, len(nodes))}:{counter}" for node, counter in dots)
+        lines.append(f"{word}\t{tags}")
+    return ("\t".join(nodes) + "\n" + "\n".join(lines)).encode("utf-8")
+
+def decode_chunk(data):
+    """Inverse of encode_chunk, returning {word: sorted tuple of dots}"""
+    header, _, body = data.decode("utf-8").partition("\n")
+    nodes = header.split("\t")
+    entries = {}
+    for line in body.split("\n") if body else ():
+        word, _, tags = line.partition("\t")
+        if "," in tags:
+            entries[word] = tuple(sorted((nodes[int(index)], int(counter))
+                                         for index, _, counter in (tag.partition(":") for tag in tags.split(","))))
+        else:
+            index, _, counter = tags.partition(":")
+            entries[word] = ((nodes[int(index)], int(counter)),)
+    return entries
+
+class DotContext:
+    """Causal context: a vector clock plus a cloud of dots seen out of order.
+
+    vv[node] = n means every event 1..n from that node has been observed.
+    Dots that arrive ahead of a gap wait in the cloud and are folded into
+    the vector clock by compact() once the gap fills, so the metadata for
+    removed words shrinks back to one counter per node.
+    """
+
+    def __init__(self, vv=None, cloud=None):
+        self.vv = dict(vv or {})
+        self.cloud = set(cloud or ())
+
+    def contains(self, dot):
+        node, counter = dot
+        return counter <= self.vv.get(node, 0) or dot in self.cloud
+
+    def next_dot(self, node):
+        """Allocate the next event for a local node"""
+        counter = self.vv.get(node, 0) + 1
+        self.vv[node] = counter
+        return (node, counter)
+
+    def add(self, dot):
+        self.cloud.add(dot)
+
+    def merge(self, other):
+        for node, counter in other.vv.items():
+            if counter > self.vv.get(node, 0):
+                self.vv[node] = counter
+        self.cloud |= other.cloud
+        self.compact()
+
+    def compact(self):
+        """Garbage-collect cloud dots that are covered by, or extend, the vector clock"""
+        for dot in sorted(self.cloud):
+            node, counter = dot
+            current = self.vv.get(node, 0)
+            if counter <= current:
+                self.cloud.discard(dot)
+            elif counter == current + 1:
+                self.vv[node] = counter
+                self.cloud.discard(dot)
+
+    def to_dict(self):
+        return {'vv': dict(self.vv), 'dots': encode_dots(self.cloud)}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('vv'), decode_dots(data.get('dots', {})))
+
+class LexiconORSet:
+    """Add-wins observed-remove set of lexicon words (delta-state CRDT).
+
+    Every add tags the word with a fresh dot (node, counter). A remove
+    drops the word's dots but keeps them in the causal context, so a peer
+    merging the delta knows those dots were observed and removed rather
+    than never seen. A concurrent add carries a dot the remover never
+    observed, so it survives: adds win. Merges are commutative,
+    associative and idempotent, so any number of servers converge no
+    matter the order or duplication of deltas.
+
+    Deltas and full states share one encoding:
+        {'e': {node: [[word, counter], ...]}, 'c': {'vv': {...}, 'dots': {...}},
+         'r': [word, ...]}
+    Deltas also carry 'r', the words whose dots their context removes, so
+    a receiver need not index every dot to find them. Without 'r' the
+    message is a full state, and its context is checked against every word.
+    """
+
+    def __init__(self, node_id):
+        self.node_id = node_id
+        self.entries = {}     # word -> sorted tuple of live dots (usually just one)
+        self.context = DotContext()
+
+    def __contains__(self, word):
+        return word in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def version_vector(self):
+        return dict(self.context.vv)
+
+    def tag(self, word):
+        """Stable signature of a word's dots, used by the Merkle digest"""
+        dots = self.entries.get(word, ())
+        if len(dots) == 1:
+            return "%s:%d" % dots[0]
+        return ",".join(f"{node}:{counter}" for node, counter in dots)
+
+    def _set_dots(self, word, dots):
+        if dots:
+            self.entries[word] = tuple(sorted(dots))
+        else:
+            self.entries.pop(word, None)
+
+    @staticmethod
+    def _encode_entries(entries):
+        by_node = {}
+        for word, dots in entries.items():
+            for node, counter in dots:
+                by_node.setdefault(node, []).append([word, counter])
+        return by_node
+
+    @staticmethod
+    def _decode_entries(encoded):
+        entries = {}
+        for node, items in encoded.items():
+            for word, counter in items:
+                dot = (node, counter)
+                dots = entries.get(word)
+                entries[word] = tuple(sorted(set(dots + (dot,)))) if dots else (dot,)
+        return entries
+
+    def add(self, words):
+        """Add words locally and return the delta to ship to peers"""
+        delta_entries = {}
+        delta_dots = set()
+        for word in dict.fromkeys(words):
+            dot = self.context.next_dot(self.node_id)
+            # The new dot supersedes every dot we had observed for this word
+            delta_dots.update(self.entries.get(word, ()))
+            delta_dots.add(dot)
+            self.entries[word] = delta_entries[word] = (dot,)
+        return {'e': self._encode_entries(delta_entries), 'c': {'vv': {}, 'dots': encode_dots(delta_dots)}, 'r': []}
+
+    def remove(self, words):
+        """Remove words locally and return the delta to ship to peers"""
+        delta_dots = set()
+        removed = []
+        for word in dict.fromkeys(words):
+            dots = self.entries.get(word)
+            if dots:
+                delta_dots.update(dots)
+                removed.append(word)
+                self._set_dots(word, ())
+        return {'e': {}, 'c': {'vv': {}, 'dots': encode_dots(delta_dots)}, 'r': removed}
+
+    def merge(self, delta, scope=None, local_words=None):
+        """Join a delta or full state into this replica.
+
+        scope restricts the merge to words for which it returns True; it is
+        used when a peer sent only some Merkle buckets. A scoped merge still
+        judges removals by the sender's full context, but only absorbs the
+        dots it actually saw, since the rest of the sender's context refers
+        to words outside the scope. local_words, if given, lists this
+        replica's words inside the scope so they need not be searched for.
+
+        Returns (added, removed, changed): words that became visible, words
+        that disappeared, and every word whose dots changed.
+        """
+        theirs_entries = self._decode_entries(delta.get('e', {}))
+        theirs_ctx = DotContext.from_dict(delta.get('c', {}))
+
+        if scope is None and not self.entries and not self.context.vv and not self.context.cloud:
+            # Empty replica (a restart or a snapshot load): the join is just their state
+            self.entries = theirs_entries
+            self.context = theirs_ctx
+            self.context.compact()
+            words = list(theirs_entries)
+            return words, [], words
+
+        affected = set(theirs_entries)
+        if scope is not None:
+            if local_words is None:
+                local_words = [word for word in self.entries if scope(word)]
+            affected |= set(local_words)
+        elif 'r' in delta:
+            affected |= {word for word in delta['r'] if word in self.entries}
+        elif theirs_ctx.vv or theirs_ctx.cloud:
+            # A full state: any local dot its context holds, in the clock or the cloud, may be removed
+            affected |= set(self.entries)
+
+        added, removed, changed = [], [], []
+        observed = set()
+        for word in affected:
+            if scope is not None and not scope(word):
+                continue
+            mine = self.entries.get(word, ())
+            theirs = theirs_entries.get(word, ())
+            if mine == theirs:
+                continue
+            if not theirs:
+                keep = tuple(dot for dot in mine if not theirs_ctx.contains(dot))
+            elif not mine:
+                keep = tuple(dot for dot in theirs if not self.context.contains(dot))
+            else:
+                keep = tuple(sorted((set(mine) & set(theirs))
+                                    | {dot for dot in mine if not theirs_ctx.contains(dot)}
+                                    | {dot for dot in theirs if not self.context.contains(dot)}))
+            if scope is not None:
+                observed.update(theirs)
+                observed.update(dot for dot in mine if dot not in keep)
+            if keep != mine:
+                self._set_dots(word, keep)
+                changed.append(word)
+                if not mine:
+                    added.append(word)
+                elif not keep:
+                    removed.append(word)
+
+        if scope is None:
+            self.context.merge(theirs_ctx)
+        else:
+            for dot in observed:
+                self.context.add(dot)
+            self.context.compact()
+        return added, removed, changed
+
+    def seed(self, words):
+        """Load an initial word list with dots every replica derives identically.
+
+        The dots belong to a pseudo-node named after the list's hash, so
+        servers started from the same lexicon file agree on them without
+        talking, and a removal on one server covers the others' copies.
+        """
+        words = sorted(set(words))
+        origin = "seed-" + hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()[:8]
+        for counter, word in enumerate(words, 1):
+            dots = self.entries.get(word)
+            self.entries[word] = tuple(sorted(set(dots + ((origin, counter),)))) if dots else ((origin, counter),)
+        self.context.merge(DotContext({origin: len(words)}))
+
+    def load_entries(self, entries):
+        """Bulk-load decoded snapshot entries into a replica being bootstrapped.
+
+        No join is done: the caller must absorb the snapshot's context
+        afterwards and only then merge in anything else it knows.
+        """
+        self.entries.update(entries)
+
+    def absorb_context(self, context):
+        """Take a peer's causal context without its entries.
+
+        Only safe when both replicas hold identical entries; otherwise dots
+        this replica has not received yet would look already removed.
+        """
+        self.context.merge(DotContext.from_dict(context))
+
+    def state(self, words=None):
+        """Full state (or the state of some words) in delta encoding"""
+        if words is None:
+            entries = self.entries
+        else:
+            entries = {word: self.entries[word] for word in words if word in self.entries}
+        return {'e': self._encode_entries(entries), 'c': self.context.to_dict()}
+
+    @classmethod
+    def from_state(cls, node_id, state):
+        replica = cls(node_id)
+        replica.merge(state)
+        return replica
@@ -0,0 +1,300 @@
+"""
+Lexicon Index for Spell Checker
+Bloom filter prefilter backed by a memory-mapped exact index for huge lexicons
+"""
+
+import hashlib
+import heapq
+import math
+import mmap
+import os
+import tempfile
+
+def iter_lexicon_words(path, block_size=1 << 20):
+    """Stream whitespace separated words from a lexicon file without loading it whole"""
+    with open(path, "r") as f:
+        leftover = ""
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            block = leftover + block
+            words = block.split()
+            # The last word may continue in the next block
+            if words and not block[-1].isspace():
+                leftover = words.pop()
+            else:
+                leftover = ""
+            yield from words
+        if leftover:
+            yield leftover
+
+def build_index(lexicon_file, index_file, run_size=500000):
+    """Build a sorted, de-duplicated, newline separated index from a lexicon file.
+
+    Words are sorted in runs of run_size and merged, so memory stays bounded
+    even for lexicons of tens of millions of words.
+    """
+    runs = []
+    try:
+        run = []
+        for word in iter_lexicon_words(lexicon_file):
+            run.append(word.encode("utf-8"))
+            if len(run) >= run_size:
+                runs.append(_write_run(run))
+                run = []
+        if run or not runs:
+            runs.append(_write_run(run))
+
+        files = [open(path, "rb") for path in runs]
+        try:
+            count = 0
+            last = None
+            tmp_index = index_file + ".tmp"
+            with open(tmp_index, "wb") as out:
+                for line in heapq.merge(*files):
+                    if line != last:
+                        out.write(line)
+                        last = line
+                        count += 1
+            os.replace(tmp_index, index_file)
+        finally:
+            for f in files:
+                f.close()
+    finally:
+        for path in runs:
+            os.remove(path)
+    return count
+
+def _write_run(words):
+    """Write one sorted run to a temporary file and return its path"""
+    words.sort()
+    fd, path = tempfile.mkstemp(suffix=".run")
+    with os.fdopen(fd, "wb") as f:
+        for word in words:
+            f.write(word + b"\n")
+    return path
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate=0.01):
+        self.capacity = max(1, capacity)
+        self.error_rate = error_rate
+        # Optimal sizing: m = -n ln(p) / ln(2)^2, k = m/n ln(2)
+        self.num_bits = max(64, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, word):
+        """Double hashing: derive all k bit positions from one 128-bit digest"""
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, word):
+        """Add a word to the filter"""
+        for pos in self._positions(word):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, word):
+        bits = self.bits
+        for pos in self._positions(word):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def memory_bytes(self):
+        """Size of the bit array in bytes"""
+        return len(self.bits)
+
+class MmapIndex:
+    def __init__(self, index_file):
+        self.index_file = index_file
+        self._file = open(index_file, "rb")
+        size = os.path.getsize(index_file)
+        # mmap cannot map an empty file
+        self.mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __contains__(self, word):
+        """Binary search over the sorted lines directly in the mapped file"""
+        key = word.encode("utf-8")
+        mm = self.mm
+        lo, hi = 0, len(mm)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = mm.rfind(b"\n", 0, mid) + 1
+            end = mm.find(b"\n", start)
+            if end == -1:
+                end = len(mm)
+            line = mm[start:end]
+            if line == key:
+                return True
+            if line < key:
+                lo = end + 1
+            else:
+                hi = start
+        return False
+
+    def __iter__(self):
+        with open(self.index_file, "rb") as f:
+            for line in f:
+                yield line.rstrip(b"\n").decode("utf-8")
+
+    def close(self):
+        """Release the mapping and file handle"""
+        if self.mm:
+            self.mm.close()
+        self._file.close()
+
+class BloomLexicon:
+    """Set-like lexicon for memory-constrained nodes.
+
+    A Bloom filter in RAM answers most lookups (every clean word) without
+    touching disk. Bloom positives are confirmed against the memory-mapped
+    exact index, so false positives never reach the client. Words added at
+    runtime live in a small in-memory set until save() merges them.
+    """
+
+    def __init__(self, lexicon_file, index_file=None, error_rate=0.01, compact_threshold=100000):
+        self.lexicon_file = lexicon_file
+        self.index_file = index_file or lexicon_file + ".idx"
+        self.error_rate = error_rate
+        self.compact_threshold = compact_threshold
+        self.pending = set()   # added since the index was built
+        self.unsaved = []      # added since the lexicon file was written
+        self.removed = set()   # still in the index (and the Bloom bits) but deleted
+        self.index = None
+        self.bloom = None
+        self.source_mtime = 0
+        self.reset_stats()
+        self.reload()
+
+    def reload(self, rebuild=False):
+        """(Re)build the exact index and the Bloom filter from the lexicon file"""
+        if self.index:
+            self.index.close()
+        self.source_mtime = os.path.getmtime(self.lexicon_file)
+        if (rebuild or not os.path.exists(self.index_file)
+                or os.path.getmtime(self.index_file) < self.source_mtime):
+            self.size = build_index(self.lexicon_file, self.index_file)
+        else:
+            with open(self.index_file, "rb") as f:
+                self.size = sum(1 for _ in f)
+        self.index = MmapIndex(self.index_file)
+        self.pending = set(self.unsaved)
+        self.size += len(self.pending)
+        # Leave headroom so runtime additions do not push the error rate up
+        self.bloom = BloomFilter(int(self.size * 1.25) + 1024, self.error_rate)
+        for word in self.index:
+            self.bloom.add(word)
+        for word in self.pending:
+            self.bloom.add(word)
+
+    def reset_stats(self):
+        """Reset lookup counters"""
+        self.lookups = 0
+        self.bloom_negatives = 0
+        self.true_positives = 0
+        self.false_positives = 0
+
+    def __contains__(self, word):
+        self.lookups += 1
+        if word not in self.bloom:
+            self.bloom_negatives += 1
+            return False
+        if word in self.removed:
+            return False
+        if word in self.pending or word in self.index:
+            self.true_positives += 1
+            return True
+        self.false_positives += 1
+        return False
+
+    def append(self, word):
+        """Add a word (list-compatible so it can stand in for lex_words_list)"""
+        if word in self.removed:
+            self.removed.discard(word)
+            self.size += 1
+            return
+        if word in self.pending or word in self.index:
+            return
+        self.pending.add(word)
+        self.unsaved.append(word)
+        self.bloom.add(word)
+        self.size += 1
+
+    add = append
+
+    def remove(self, word):
+        """Delete a word. Bloom bits cannot be cleared, so it is masked until the next rebuild."""
+        if word in self.removed or not (word in self.pending or word in self.index):
+            return
+        if word in self.unsaved:
+            self.unsaved.remove(word)
+        self.pending.discard(word)
+        self.removed.add(word)
+        self.size -= 1
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for word in self.index:
+            if word not in self.removed:
+                yield word
+        yield from self.pending
+
+    def save(self):
+        """Append new words to the lexicon file instead of rewriting it.
+
+        Once enough words are pending, they are folded into the on-disk index
+        so the in-memory set stays small. Removals need a full rewrite.
+        """
+        if self.removed:
+            tmp_file = self.lexicon_file + ".tmp"
+            with open(tmp_file, "w") as f:
+                for word in heapq.merge(self.index, sorted(self.pending)):
+                    if word not in self.removed:
+                        f.write(word + " ")
+            os.replace(tmp_file, self.lexicon_file)
+            self.unsaved = []
+            self.removed = set()
+            self.reload(rebuild=True)
+            return
+        if self.unsaved:
+            with open(self.lexicon_file, "a") as f:
+                f.write(" " + " ".join(self.unsaved))
+            self.unsaved = []
+            self.source_mtime = os.path.getmtime(self.lexicon_file)
+        if len(self.pending) >= self.compact_threshold:
+            self.reload(rebuild=True)
+
+    def replace(self, words):
+        """Swap in a whole new word list (e.g. a sync snapshot) and rebuild"""
+        with open(self.lexicon_file, "w") as f:
+            f.write(" ".join(words))
+        self.unsaved = []
+        self.removed = set()
+        self.reload(rebuild=True)
+
+    def memory_bytes(self):
+        """Approximate RAM used by the filter and the pending set"""
+        pending = sum(len(word) + 49 for word in self.pending)
+        return self.bloom.memory_bytes() + pending
+
+    def get_stats(self):
+        """Get filter statistics in the same shape as the cache stats"""
+        negatives = self.bloom_negatives + self.false_positives
+        fp_rate = (self.false_positives / negatives * 100) if negatives > 0 else 0
+        return {
+            'words': self.size,
+            'lookups': self.lookups,
+            'bloom_negatives': self.bloom_negatives,
+            'false_positives': self.false_positives,
+            'fp_rate': f"{fp_rate:.3f}%",
+            'memory_bytes': self.memory_bytes(),
+            'bits': self.bloom.num_bits,
+            'hashes': self.bloom.num_hashes
+        }
@@ -8,32 +8,185 @@ import threading
 import random
 import json
 import time
+import argparse
+import hashlib
+import itertools
+import os
+import errno
+from collections import OrderedDict
+try:
+    import fcntl
+except ImportError:  # not on Windows; splice mode is Linux-only anyway
+    fcntl = None
 from health_monitor import HealthMonitor
+from routing import BackendStats, make_strategy, STRATEGIES
+from event_proxy import EventLoopProxy
+from backend_pool import BackendPool
+from admission import AdmissionController, busy_message
+from failover import TrackedRequest, LatencyTracker, HedgeScheduler
+from lb_control import ControlChannel
+from circuit_breaker import CircuitBreaker
+from protocol import (send_message, recv_message, lookup_reply, matches_reply, file_request, Compression,
+                      answer_pipeline_hello)
+
+COPY_BUFFER_SIZE = 64 * 1024   # per forwarding thread in 'threads' mode
+SPLICE_CHUNK = 1024 * 1024     # pipe size and largest single splice in 'splice' mode
+POLL_INTERVAL = 5              # 'l7' mode asks its clients for lexicon updates as often as a server does
+DOCUMENT_OWNERS = 10000        # 'l7' mode: documents whose last checking server is remembered
+
+def line_reply(op, response):
+    """An 'l7' answer (as dispatch hands it over) in the line protocol, or None when there is nothing to send"""
+    if 'busy' in response:
+        return busy_message(response['busy'])
+    if 'error' in response:
+        return f"ERROR: {response['error']}".encode()
+    if op == 'check':
+        if 'matches' in response:
+            return matches_reply(response['matches']).encode()
+        return b"check" + response['text'].encode()
+    if op == 'lookup':
+        return lookup_reply(response).encode()
+    return response['reply'].encode() if response.get('reply') else None
 
 class LoadBalancer:
-    def __init__(self, port=7520):
+    def __init__(self, port=7520, strategy='round-robin', mode='selector', pool_size=4,
+                 admission=None, max_clients=10000, max_attempts=3, hedge_percentile=None,
+                 control_port=None, drain_timeout=30, breaker_options=None, compress_threshold=512):
         self.servers = []  
         self.port = port 
         self.active_connections = {} 
         self.health_monitor = HealthMonitor() 
         self.running = False 
-        self.current_server_index = 0
+        self.strategy = make_strategy(strategy)
+        self.backend_stats = {}  # server address -> BackendStats (in-flight count, latency EWMA)
+        self.mode = mode  # 'selector': one event-loop thread; 'threads'/'splice': three threads per client;
+                          # 'l7': spell-check requests spread individually over pooled backend connections
+        self.proxy = None
+        self.pool_size = pool_size
+        self.pools = {}  # server address -> BackendPool ('l7' mode)
+        self.request_ids = itertools.count(1)
+        self.l7_clients = {}  # client socket -> (username, write lock)
+        self.l7_lock = threading.Lock()
+        self.admission = admission or AdmissionController()  # default: no limits
+        self.max_clients = max_clients  # open client connections beyond this are turned away at accept
+        self.open_clients = 0
+        self.clients_lock = threading.Lock()
+        self.max_attempts = max_attempts  # 'l7' mode: sends per request, counting replays and hedges
+        self.latencies = LatencyTracker(hedge_percentile or 0.95)
+        self.hedger = HedgeScheduler() if hedge_percentile else None
+        self.draining = set()  # servers taking no new work, removed once idle
+        self.drain_timeout = drain_timeout
+        self.breaker_options = breaker_options or {}  # CircuitBreaker settings for every backend
+        self.control = ControlChannel(self, control_port) if control_port else None
+        # 'l7' mode: zlib for framed traffic with pipelining clients and backends that agree to it
+        self.compression = Compression(compress_threshold) if compress_threshold > 0 else None
+        self.document_owners = OrderedDict()  # 'l7' mode: document key -> server that last checked it
+        self.owners_lock = threading.Lock()
         self.stats = { 
             'requests_handled': 0,
             'connections_forwarded': 0,
+            'bytes_forwarded': 0,  # threaded modes; the event loop keeps its own count
+            'requests_routed': 0,  # 'l7' mode: individual checks and lexicon updates
+            'replayed': 0,         # 'l7' requests resent after their backend failed
+            'hedged': 0,           # 'l7' checks duplicated to a second backend for being slow
+            'hedge_wins': 0,       # ... where the duplicate answered first
+            'incremental': 0,      # 'l7' incremental checks answered with a patch
             'start_time': time.time()
         }
         
     def add_server(self, server_ip, server_port):
-        """Add a new server to the load balancer"""
+        """Add a new server to the load balancer (registering a known one again cancels its draining)"""
         server_addr = (server_ip, server_port)
+        if server_addr in self.backend_stats:
+            if server_addr in self.draining:
+                self.draining.discard(server_addr)
+                print(f"[LOAD BALANCER] Server {server_ip}:{server_port} re-registered, draining cancelled")
+            return
         self.servers.append(server_addr)
+        breaker = CircuitBreaker(name=f"{server_ip}:{server_port}", **self.breaker_options)
+        self.backend_stats[server_addr] = BackendStats(on_release=self.admission.release, breaker=breaker)
+        self.pools[server_addr] = BackendPool(server_addr, self.pool_size, self.compression)
         self.health_monitor.add_server(server_addr)
         print(f"[LOAD BALANCER] Added server {server_ip}:{server_port}")
+        if self.running:
+            self.health_monitor.ping_server(server_addr)  # take traffic now, not at the next health round
+            
+    def remove_server(self, server_addr, drain=True):
+        """Stop routing new work to a server, then forget it once its in-flight work is done.
+        
+        Returns the server's in-flight count at the time, or None if it
+        is not registered. Without drain it is forgotten at once, and
+        anything still in flight on it finishes or fails on its own.
+        """
+        backend = self.backend_stats.get(server_addr)
+        if backend is None:
+            return None
+        self.draining.add(server_addr)
+        in_flight = backend.in_flight
+        print(f"[LOAD BALANCER] Draining {server_addr[0]}:{server_addr[1]} ({in_flight} in flight)")
+        if drain:
+            threading.Thread(target=self._drain, args=(server_addr,), daemon=True).start()
+        else:
+            self._forget(server_addr)
+        return in_flight
+        
+    def wait_drained(self, server_addr):
+        """Block until a draining server has been forgotten; False if it was still busy at drain_timeout"""
+        deadline = time.time() + self.drain_timeout + 1
+        while server_addr in self.backend_stats and server_addr in self.draining and time.time() < deadline:
+            time.sleep(0.1)
+        return server_addr not in self.backend_stats
+        
+    def _drain(self, server_addr):
+        backend = self.backend_stats.get(server_addr)
+        if backend is None:
+            return  # forgotten already
+        deadline = time.time() + self.drain_timeout
+        while backend.in_flight > 0 and time.time() < deadline:
+            time.sleep(0.1)
+        if server_addr in self.draining:  # not re-registered meanwhile
+            if backend.in_flight > 0:
+                print(f"[LOAD BALANCER] {server_addr} still has {backend.in_flight} in flight after "
+                      f"{self.drain_timeout}s, removing anyway")
+            self._forget(server_addr)
+            
+    def _forget(self, server_addr):
+        self.draining.discard(server_addr)
+        if server_addr in self.servers:
+            self.servers.remove(server_addr)
+        self.health_monitor.remove_server(server_addr)
+        pool = self.pools.pop(server_addr, None)
+        if pool:
+            pool.close()
+        self.backend_stats.pop(server_addr, None)
+        print(f"[LOAD BALANCER] Removed server {server_addr[0]}:{server_addr[1]}")
         
-    def get_best_server(self):
-        """Pick the best server using round-robin distribution"""
-        healthy_servers = self.health_monitor.get_healthy_servers()
+    def backend_failed(self, server_addr):
+        """A real request or connection to a server failed"""
+        backend = self.backend_stats.get(server_addr)
+        if backend:
+            backend.failed()
+        self.health_monitor.recheck(server_addr)
+        
+    def routable_servers(self, exclude=()):
+        """Healthy servers that are not draining and whose circuit breaker lets traffic through.
+        
+        Servers whose load report shows a stale lexicon, or whose
+        heartbeat is overdue enough to be suspect, are left out too,
+        unless that would leave none.
+        """
+        servers = []
+        for server in self.health_monitor.get_healthy_servers():
+            backend = self.backend_stats.get(server)  # None once the server has been forgotten
+            if backend is not None and backend.available() and server not in exclude and server not in self.draining:
+                servers.append(server)
+        preferred = [server for server in servers
+                     if not self.health_monitor.stale_lexicon(server) and not self.health_monitor.suspect(server)]
+        return preferred or servers
+        
+    def get_best_server(self, key=None, exclude=(), prefer=None):
+        """Pick the best healthy server with the configured routing strategy (prefer wins if it has room)"""
+        healthy_servers = self.routable_servers(exclude)
         
         if not healthy_servers:
             print("[LOAD BALANCER] No healthy servers available!")
@@ -41,38 +194,138 @@ class LoadBalancer:
             
         print(f"[LOAD BALANCER] Healthy servers: {healthy_servers}")
         
-        # Use round-robin instead of random selection
-        if len(healthy_servers) == 1:
-            selected_server = healthy_servers[0]
-        else:
-            # Round-robin selection
-            selected_server = healthy_servers[self.current_server_index % len(healthy_servers)]
-            self.current_server_index += 1
+        # Until real traffic has been timed, the heartbeat round trip is the best latency guess
+        backends = {}  # the servers' stats as of now: a removal may forget one at any moment
+        for server in healthy_servers:
+            backend = self.backend_stats.get(server)
+            if backend is None:
+                continue
+            backends[server] = backend
+            health = self.health_monitor.servers.get(server, {})
+            response_time = health.get('response_time')
+            if backend.latency is None and response_time:
+                backend.observe(response_time)
+            backend.report = health.get('report')  # for capacity-aware strategies
+                
+        # The ring of a content-aware strategy spans the healthy servers, not just those with room
+        self.strategy.track(self.routable_servers() if exclude else healthy_servers)
+
+        # Servers at their concurrency limit are skipped until a slot frees up
+        room = {server: backend for server, backend in backends.items() if self.admission.has_room(backend)}
+        candidates = list(room)
+        if not candidates:
+            print("[LOAD BALANCER] Every healthy server is at its concurrency limit")
+            return None
+            
+        if prefer in room:
+            print(f"[LOAD BALANCER] Selected server (holds the document): {prefer}")
+            return prefer
+        selected_server = self.strategy.choose(candidates, room, key)
             
-        print(f"[LOAD BALANCER] Selected server: {selected_server}")
+        print(f"[LOAD BALANCER] Selected server ({self.strategy.name}): {selected_server}")
         return selected_server
         
+    def reserve_server(self, key=None, block=True, exclude=(), prefer=None):
+        """Pick a server with a free slot and count the caller against it.
+        
+        If every healthy server is full, waits in the admission queue.
+        Returns (server, backend, None), where backend is the BackendStats
+        to release when done (the server may be forgotten meanwhile);
+        (None, None, retry_after) when the cluster is saturated; (None,
+        None, None) when no server is healthy at all.
+        """
+        if not self.routable_servers(exclude):
+            print("[LOAD BALANCER] No healthy servers available!")
+            return None, None, None
+            
+        def pick():
+            while True:
+                server = self.get_best_server(key, exclude, prefer)
+                if server is None:
+                    return None
+                backend = self.backend_stats.get(server)
+                if backend is not None:  # else forgotten since it was picked: pick again
+                    backend.acquire()
+                    return server, backend
+            
+        picked, retry_after = self.admission.admit(pick, block)
+        if picked is None:
+            print(f"[ADMISSION] Saturated, asking client to retry after {retry_after:.2f}s")
+            return None, None, retry_after
+        return picked[0], picked[1], None
+        
+    def admit_client(self):
+        """Count a new client connection in, or return False when max_clients are already open"""
+        with self.clients_lock:
+            if self.max_clients and self.open_clients >= self.max_clients:
+                return False
+            self.open_clients += 1
+            return True
+            
+    def client_done(self):
+        with self.clients_lock:
+            self.open_clients -= 1
+            
+    def reject_client(self, client_socket):
+        """Turn a connection away at accept with a busy reply"""
+        self.admission.stats['rejected_busy'] += 1
+        try:
+            client_socket.sendall(busy_message(self.admission.retry_after()))
+        except OSError:
+            pass
+        client_socket.close()
+        
     def start(self):
         """Start the load balancer"""
         self.running = True
         self.health_monitor.start_monitoring() # start health checks
+        if self.control:
+            self.control.start()  # servers register and deregister here
         
         # Create socket to listen for clients
         lb_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         lb_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         lb_socket.bind(('localhost', self.port))
-        lb_socket.listen(5)
+        lb_socket.listen(1024)
         
         print(f"[LOAD BALANCER] Listening on port {self.port}")
         
+        # The content-affinity relay parses the protocol per client, so it keeps its threads
+        if self.mode == 'selector' and not self.strategy.content_aware:
+            self.proxy = EventLoopProxy(self)
+            try:
+                self.proxy.serve(lb_socket)
+            finally:
+                lb_socket.close()
+            return
+        
+        if self.mode == 'l7':
+            threading.Thread(target=self.poll_l7_clients, daemon=True).start()
+            handler = self.handle_l7_client
+        elif self.strategy.content_aware:
+            handler = self.handle_affinity_client
+        else:
+            handler = self.handle_client
+        
+        def run(client_conn, client_addr):
+            try:
+                handler(client_conn, client_addr)
+            finally:
+                self.client_done()
+                
         while self.running:
             try:
                 client_conn, client_addr = lb_socket.accept()
                 self.stats['requests_handled'] += 1
                 
+                # A thread per client, so the thread count is what max_clients bounds
+                if not self.admit_client():
+                    self.reject_client(client_conn)
+                    continue
+                    
                 # Start thread to handle this client - FIX THIS PART
                 threading.Thread(
-                    target=self.handle_client,
+                    target=run,
                     args=(client_conn, client_addr)  # Pass client_addr not server_addr
                 ).start()
                 
@@ -89,12 +342,15 @@ class LoadBalancer:
         server_socket = None
         
         while attempts < max_retries:
-            server = self.get_best_server()
+            server, backend, retry_after = self.reserve_server()
             
             if not server:
-                print(f"[ERROR] No healthy servers available")
                 try:
-                    client_socket.send(b"ERROR: No servers available")
+                    if retry_after is not None:
+                        client_socket.send(busy_message(retry_after))
+                    else:
+                        print(f"[ERROR] No healthy servers available")
+                        client_socket.send(b"ERROR: No servers available")
                 except:
                     pass
                 break
@@ -108,7 +364,10 @@ class LoadBalancer:
                 
                 # Connection successful, forward traffic
                 print(f"[SUCCESS] Connected to {server}")
-                self.forward_traffic(client_socket, server_socket)
+                try:
+                    self.forward_traffic(client_socket, server_socket, backend)
+                finally:
+                    backend.release()
                 
                 # If we get here, forwarding completed successfully
                 self.stats['connections_forwarded'] += 1
@@ -116,11 +375,10 @@ class LoadBalancer:
                 
             except (ConnectionRefusedError, socket.timeout, OSError) as e:
                 print(f"[FAILOVER] Server {server} failed: {e}")
+                backend.release()
                 
-                # Remove failed server from healthy list
-                if server in self.health_monitor.healthy_servers:
-                    self.health_monitor.healthy_servers.remove(server)
-                    print(f"[HEALTH] Marked {server} as unhealthy")
+                # Count it against the server's breaker and have it re-probed
+                self.backend_failed(server)
                 
                 attempts += 1
                 
@@ -150,20 +408,455 @@ class LoadBalancer:
         except:
             pass
 
-    def forward_traffic(self, client_socket, server_socket):
+    def handle_affinity_client(self, client_socket, client_addr):
+        """Content-affinity mode: relay each spell check to the server that owns its document.
+        
+        The client's username picks a primary server, which gets the
+        handshake, lexicon updates and everything else. Each file check is
+        hashed by content onto the ring and sent over a session (opened on
+        first use with the same username) to that document's server, so
+        repeats of a document hit one server's cache.
+        """
+        sessions = {}  # server -> socket logged in as this client
+        held = {}  # server -> the BackendStats its session counts against
+        client_lock = threading.Lock()  # several server sessions write to the one client
+        pending = {}  # server -> time its current check was sent
+        
+        def open_session(server, username):
+            backend = self.backend_stats.get(server)
+            if backend is None:
+                return None, b""  # removed since it was picked
+            try:
+                server_socket = socket.create_connection(server, timeout=5)
+                server_socket.sendall(username)
+                reply = server_socket.recv(1024)
+                server_socket.settimeout(None)
+            except OSError as e:
+                print(f"[AFFINITY] Could not open session on {server}: {e}")
+                self.backend_failed(server)
+                return None, b""
+            if reply != b"accept":
+                server_socket.close()
+                return None, reply
+            sessions[server] = server_socket
+            held[server] = backend
+            backend.acquire()
+            threading.Thread(target=relay_responses, args=(server, server_socket, backend), daemon=True).start()
+            return server_socket, reply
+            
+        def relay_responses(server, server_socket, backend):
+            try:
+                while True:
+                    data = server_socket.recv(4096)
+                    if not data:
+                        break
+                    sent_at = pending.pop(server, None)
+                    if sent_at is not None:
+                        backend.succeeded(time.time() - sent_at)
+                    with client_lock:
+                        client_socket.sendall(data)
+            except OSError:
+                pass
+                
+        def owner(key):
+            # The document's server and a session on it, falling back to the primary
+            server = self.get_best_server(key=key) or primary
+            server_socket = sessions.get(server) or open_session(server, username)[0]
+            if server_socket is None:
+                return primary, primary_socket
+            return server, server_socket
+            
+        try:
+            client_socket.settimeout(5)
+            username = client_socket.recv(1024)
+            client_socket.settimeout(None)
+            primary = self.get_best_server(key=username)
+            if not username or not primary:
+                if username and self.health_monitor.get_healthy_servers():
+                    client_socket.send(busy_message(self.admission.retry_after()))
+                else:
+                    client_socket.send(b"ERROR: No servers available")
+                return
+            if username.split(b" ")[0] == b"PIPELINE":
+                # Framed pipelined requests have no name/content pairs to route apart: the whole session
+                # goes to one server (--mode l7 spreads them request by request)
+                backend = self.backend_stats.get(primary)
+                if backend is None:
+                    client_socket.send(b"ERROR: No servers available")
+                    return
+                server_socket = socket.create_connection(primary, timeout=5)
+                server_socket.settimeout(None)
+                server_socket.sendall(username)
+                backend.acquire()
+                try:
+                    self.forward_traffic(client_socket, server_socket, backend)
+                finally:
+                    backend.release()
+                return
+            primary_socket, reply = open_session(primary, username)
+            client_socket.sendall(reply or b"ERROR: All servers unavailable")
+            if primary_socket is None:
+                return
+            print(f"[AFFINITY] Client {client_addr} → primary {primary}")
+            
+            while True:
+                data = client_socket.recv(4096)
+                if not data:
+                    break
+                if data == b"Disconnect_Client":
+                    for server_socket in sessions.values():
+                        server_socket.sendall(data)
+                    break
+                if data.startswith(b"DIGEST "):
+                    # A conditional check goes where the document's check would, so that server's cache
+                    # answers it and a miss's upload lands on the same server
+                    try:
+                        key = bytes.fromhex(data.split(b" ")[1].decode())
+                    except (IndexError, ValueError):
+                        primary_socket.sendall(data)
+                        continue
+                    server, server_socket = owner(key)
+                    pending[server] = time.time()
+                    server_socket.sendall(data)
+                    continue
+                if data[:1] not in (b"Y", b"A"):
+                    primary_socket.sendall(data)
+                    continue
+                    
+                # A file check: the name, then the content in a second message ("A": matches only)
+                content = client_socket.recv(4096)
+                retry_after = self.admission.check_rate(username)
+                if retry_after:
+                    with client_lock:
+                        client_socket.sendall(busy_message(retry_after))
+                    continue
+                server, server_socket = owner(hashlib.sha1(content).digest())
+                print(f"[AFFINITY] {data[1:].decode(errors='replace')} → {server}")
+                pending[server] = time.time()
+                server_socket.sendall(file_request(data, content))
+                
+        except OSError as e:
+            print(f"[AFFINITY] Client {client_addr} ended: {e}")
+        finally:
+            for backend in held.values():
+                backend.release()
+            for server_socket in sessions.values():
+                try:
+                    server_socket.close()
+                except OSError:
+                    pass
+            try:
+                client_socket.close()
+            except OSError:
+                pass
+            self.stats['connections_forwarded'] += 1
+
+    def handle_l7_client(self, client_socket, client_addr):
+        """Request-level mode: speak the client protocol here and route every request on its own.
+        
+        The client's handshake, checks and lexicon updates terminate at the
+        load balancer. Each check (and each lexicon update) is dispatched to
+        whichever backend the strategy picks at that moment, over that
+        backend's pool of persistent connections, so one heavy client is
+        spread across all servers instead of pinned to one.
+        """
+        client_lock = threading.Lock()  # responses arrive on the pools' reader threads
+        username = None
+        
+        def answer(op):
+            def reply(response):
+                data = line_reply(op, response)
+                if not data:
+                    return  # nothing to tell the client (a lexicon update with no words in it)
+                with client_lock:
+                    try:
+                        client_socket.sendall(data)
+                    except OSError:
+                        pass
+            return reply
+                    
+        try:
+            client_socket.settimeout(5)
+            name = client_socket.recv(1024).decode(errors='replace')
+            client_socket.settimeout(None)
+            if not name:
+                return
+            if name == "HEARTBEAT":
+                client_socket.sendall(b"ALIVE")
+                return
+            if name.split(" ")[0] == "PIPELINE":
+                self.handle_l7_pipeline(client_socket, client_addr, name)
+                return
+            with self.l7_lock:
+                if name in (user for user, _ in self.l7_clients.values()):
+                    client_socket.sendall(b"exists")
+                    return
+                username = name
+                self.l7_clients[client_socket] = (username, client_lock)
+            client_socket.sendall(b"accept")
+            print(f"[L7] Client {client_addr} logged in as {username}")
+            
+            while True:
+                data = client_socket.recv(65536)
+                if not data or data == b"Disconnect_Client":
+                    break
+                if data[:1] in (b"Y", b"A"):
+                    # A file check: the name, then the content in a second message ("A": matches only)
+                    content = client_socket.recv(65536)
+                    request = {'op': 'check', 'user': username, 'name': data[1:].decode(errors='replace'),
+                               'content': content.decode(errors='replace'), 'annotate': data[:1] == b"A"}
+                    self.dispatch(request, answer('check'), key=hashlib.sha1(content).digest())
+                elif data.startswith(b"lexicon_response:"):
+                    words = data[17:].decode(errors='replace')
+                    if words and words != "NO":
+                        self.dispatch({'op': 'lexicon', 'user': username, 'words': words}, answer('lexicon'))
+                elif data.startswith(b"DIGEST "):
+                    # A conditional check: "DIGEST <digest> <lexicon version>", answered without the content
+                    _, digest, version = (data.decode(errors='replace') + " -").split(" ")[:3]
+                    self.dispatch_lookup(username, digest, version, answer('lookup'))
+                        
+        except OSError as e:
+            print(f"[L7] Client {client_addr} ended: {e}")
+        finally:
+            with self.l7_lock:
+                self.l7_clients.pop(client_socket, None)
+            try:
+                client_socket.close()
+            except OSError:
+                pass
+            self.stats['connections_forwarded'] += 1
+            
+    def handle_l7_pipeline(self, client_socket, client_addr, hello="PIPELINE"):
+        """A pipelining client in l7 mode: framed requests tagged with the client's own ids.
+        
+        Each request is dispatched as it arrives, so a client with many
+        outstanding requests has them spread over every backend, and
+        each answer goes back (in whatever order they finish) under the
+        client's id. Compression is agreed with the client separately from
+        the backends; frames are inflated here and recompressed per hop.
+        """
+        client_lock = threading.Lock()
+        reply, wire = answer_pipeline_hello(hello, self.compression)
+        
+        def answer(client_id):
+            def reply(response):
+                # The backend's answer as it framed it, under the client's id instead of ours
+                with client_lock:
+                    try:
+                        send_message(client_socket, dict(response, id=client_id), wire)
+                    except OSError:
+                        pass
+            return reply
+            
+        client_socket.sendall(reply)
+        print(f"[L7] Pipelining client {client_addr}{' (compressed)' if wire else ''}")
+        try:
+            while True:
+                request = recv_message(client_socket, wire)
+                if request is None:
+                    break
+                user = str(request.get('user') or f"{client_addr[0]}:{client_addr[1]}")
+                if request.get('op') == 'check':
+                    content = str(request.get('content', ''))
+                    self.dispatch({'op': 'check', 'user': user, 'name': str(request.get('name', '')),
+                                   'content': content, 'annotate': bool(request.get('annotate'))},
+                                  answer(request.get('id')), key=hashlib.sha1(content.encode()).digest())
+                elif request.get('op') == 'lexicon':
+                    words = str(request.get('words', ''))
+                    if words and words != "NO":
+                        self.dispatch({'op': 'lexicon', 'user': user, 'words': words}, answer(request.get('id')))
+                    else:
+                        answer(request.get('id'))({'reply': None})  # as a server answers nothing to apply
+                elif request.get('op') == 'lookup':
+                    self.dispatch_lookup(user, str(request.get('digest', '')), str(request.get('version', '-')),
+                                         answer(request.get('id')))
+                elif request.get('op') == 'recheck':
+                    self.dispatch_recheck(user, request, answer(request.get('id')))
+                else:
+                    answer(request.get('id'))({'error': f"unknown op {request.get('op')!r}"})
+        except (OSError, ValueError) as e:
+            print(f"[L7] Pipelining client {client_addr} ended: {e}")
+            
+    def dispatch(self, request, reply, key=None, prefer=None):
+        """Send one request to the best backend's pool; reply(response) gets the answer as a dict.
+        
+        The request is held until a backend answers it. If its backend
+        fails first, it is replayed on another (up to max_attempts sends
+        in all); with hedging on, a check still unanswered past the
+        hedging percentile of recent latencies also goes to a second
+        backend, and whichever answers first wins. The answer is the
+        backend's response without its id, or {'busy': seconds} or
+        {'error': message} from the load balancer itself.
+        """
+        request['id'] = next(self.request_ids)
+        retry_after = self.admission.check_rate(request['user'])
+        if retry_after:
+            reply({'busy': retry_after})
+            return
+        self.send_tracked(TrackedRequest(request, reply, key, prefer))
+        
+    def dispatch_lookup(self, user, digest, version, reply):
+        """Dispatch a conditional check to the server a check of that document would go to"""
+        try:
+            key = bytes.fromhex(digest)
+        except ValueError:
+            reply({'error': f"bad digest {digest!r}"})
+            return
+        self.dispatch({'op': 'lookup', 'user': user, 'digest': digest, 'version': version}, reply, key=key)
+        
+    def dispatch_recheck(self, user, request, reply):
+        """Dispatch an incremental check to the server that last checked its base document.
+        
+        Only that server holds the base, so it goes there whatever the
+        strategy (if it is healthy and has room); a document we have not
+        seen goes where a check of it would. Elsewhere it is a miss, and
+        the client uploads in full.
+        """
+        try:
+            key = bytes.fromhex(str(request.get('base', '')))
+            bytes.fromhex(str(request.get('digest', '')))
+        except ValueError:
+            reply({'error': f"bad digest {request.get('base')!r}"})
+            return
+        with self.owners_lock:
+            owner = self.document_owners.get(key)
+        self.dispatch({'op': 'recheck', 'user': user, 'name': str(request.get('name', '')),
+                       'base': request['base'], 'digest': request['digest'], 'edits': request.get('edits'),
+                       'lead': request.get('lead', ''), 'trail': request.get('trail', '')},
+                      reply, key=key, prefer=owner)
+        
+    def remember_owner(self, key, server):
+        """Note the server that holds a document, for incremental checks against it"""
+        with self.owners_lock:
+            self.document_owners[key] = server
+            self.document_owners.move_to_end(key)
+            if len(self.document_owners) > DOCUMENT_OWNERS:
+                self.document_owners.popitem(last=False)
+        
+    def send_tracked(self, tracked, hedge=False):
+        """Make one more attempt at a tracked request; returns whether a backend took it"""
+        request = tracked.request
+        while len(tracked.tried) < self.max_attempts:
+            # Prefer servers this request has not failed on, unless none are left
+            healthy = self.routable_servers()
+            exclude = tracked.tried if hedge or any(s not in tracked.tried for s in healthy) else ()
+            server, backend, retry_after = self.reserve_server(tracked.key, block=not hedge, exclude=exclude,
+                                                               prefer=tracked.prefer)
+            if server is None:
+                if not hedge and not tracked.outstanding and tracked.finish():
+                    tracked.reply({'busy': retry_after} if retry_after is not None
+                                  else {'error': "No servers available"})
+                return False
+            tracked.tried.append(server)
+            sent_at = time.time()
+            
+            def on_response(response, server=server, backend=backend, sent_at=sent_at):
+                backend.release()
+                with tracked.lock:
+                    tracked.outstanding -= 1
+                # Only a lost connection counts against the backend; an error it sent back goes to the client
+                if response.get('lost'):
+                    self.request_failed(tracked, server, response['error'])
+                    return
+                backend.succeeded(time.time() - sent_at)
+                self.latencies.observe(time.time() - sent_at)
+                if not tracked.finish():
+                    return  # the other copy of a hedged request answered first
+                if hedge:
+                    self.stats['hedge_wins'] += 1
+                if request['op'] == 'check' and tracked.key and 'error' not in response:
+                    self.remember_owner(tracked.key, server)
+                elif request['op'] == 'recheck' and 'patch' in response:
+                    self.stats['incremental'] += 1
+                    self.remember_owner(bytes.fromhex(request['digest']), server)
+                response.pop('id', None)
+                tracked.reply(response)
+                    
+            with tracked.lock:
+                tracked.outstanding += 1
+            try:
+                pool = self.pools.get(server)
+                if pool is None:
+                    raise ConnectionError(f"{server} was removed")
+                pool.submit(request, on_response)
+            except OSError as e:
+                with tracked.lock:
+                    tracked.outstanding -= 1
+                backend.release()
+                print(f"[FAILOVER] Server {server} failed: {e}")
+                self.backend_failed(server)
+                continue
+            self.stats['requests_routed'] += 1
+            print(f"[L7] Request {request['id']} ({request['op']}) → {server}{' (hedge)' if hedge else ''}")
+            if self.hedger and not hedge and request['op'] == 'check' and self.latencies.threshold:
+                self.hedger.schedule(self.latencies.threshold, lambda: self.hedge(tracked))
+            return True
+        if not hedge and not tracked.outstanding and tracked.finish():
+            tracked.reply({'error': "All servers unavailable"})
+        return False
+        
+    def request_failed(self, tracked, server, error):
+        """A backend connection died with this request on it: replay it elsewhere"""
+        print(f"[FAILOVER] Request {tracked.request['id']} lost on {server}: {error}")
+        self.backend_failed(server)
+        if tracked.done or tracked.outstanding:
+            return  # answered already, or a hedged copy is still on its way
+        if len(tracked.tried) >= self.max_attempts:
+            if tracked.finish():
+                tracked.reply({'error': error})
+            return
+        self.stats['replayed'] += 1
+        # Off the failing connection's thread: replaying may wait for a backend slot
+        threading.Thread(target=self.send_tracked, args=(tracked,), daemon=True).start()
+        
+    def hedge(self, tracked):
+        """Hedging deadline passed: send a duplicate to another backend if one has room"""
+        with tracked.lock:
+            if tracked.done or tracked.hedged:
+                return
+            tracked.hedged = True
+        if self.send_tracked(tracked, hedge=True):
+            self.stats['hedged'] += 1
+        
+    def poll_l7_clients(self):
+        """Ask 'l7' clients for lexicon updates, as a server does for clients connected to it directly"""
+        while self.running:
+            time.sleep(POLL_INTERVAL)
+            with self.l7_lock:
+                clients = list(self.l7_clients.items())
+            for client_socket, (username, client_lock) in clients:
+                with client_lock:
+                    try:
+                        client_socket.sendall(b"LEXICON_POLL")
+                    except OSError:
+                        pass
+
+    def forward_traffic(self, client_socket, server_socket, backend=None):
         """Forward traffic between client and server bidirectionally"""
         try:
             # Set sockets to non-blocking would cause issues, keep them blocking
             
+            # The protocol is request/response, so the gap between a client
+            # write and the server's next write is one request's latency
+            request_sent = []
+            
+            def on_request():
+                if not request_sent:
+                    request_sent.append(time.time())
+                    
+            def on_response():
+                if request_sent and backend:
+                    backend.succeeded(time.time() - request_sent.pop())
+            
             # Create threads for bidirectional forwarding
             client_to_server = threading.Thread(
                 target=self.forward_data,
-                args=(client_socket, server_socket, "client->server"),
+                args=(client_socket, server_socket, "client->server", on_request),
                 daemon=True
             )
             server_to_client = threading.Thread(
                 target=self.forward_data, 
-                args=(server_socket, client_socket, "server->client"),
+                args=(server_socket, client_socket, "server->client", on_response),
                 daemon=True
             )
             
@@ -178,30 +871,80 @@ class LoadBalancer:
         except Exception as e:
             print(f"[FORWARD ERROR] {e}")
             
-    def forward_data(self, source, destination, direction):
-        """Forward data from source socket to destination socket"""
+    def forward_data(self, source, destination, direction, on_forward=None):
+        """Forward data from source socket to destination socket.
+
+        Sockets stay blocking: a forwarding thread has nothing else to do
+        until its source has data, and the EOF handling below ends it.
+        """
         try:
-            while True:
-                # Set a timeout to prevent hanging
-                source.settimeout(60)  # 60 second timeout for reads
-                
-                try:
-                    data = source.recv(4096)  # Receive up to 4096 bytes
-                    if not data:
-                        print(f"[FORWARD] {direction} connection closed normally")
-                        break
-                        
-                    destination.send(data)
-                    
-                except socket.timeout:
-                    # Timeout is okay, just continue
-                    continue
+            if self.mode == 'splice' and hasattr(os, 'splice'):
+                self._splice_data(source, destination, on_forward)
+            else:
+                self._copy_data(source, destination, on_forward)
+            print(f"[FORWARD] {direction} connection closed normally")
+            # Pass the close on, so the other side's reader sees EOF too
+            try:
+                destination.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
                     
         except Exception as e:
             if "Broken pipe" not in str(e):
                 print(f"[FORWARD] {direction} ended: {e}")
+            # Unblock the opposite direction, which would otherwise wait on a dead peer
+            for sock in (source, destination):
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def _copy_data(self, source, destination, on_forward):
+        """Copy through one reused buffer until source reaches EOF"""
+        buffer = bytearray(COPY_BUFFER_SIZE)
+        view = memoryview(buffer)
+        while True:
+            count = source.recv_into(buffer)
+            if not count:
+                return
+            destination.sendall(view[:count])  # send() may take only part of it
+            self.stats['bytes_forwarded'] += count
+            if on_forward:
+                on_forward()
+
+    def _splice_data(self, source, destination, on_forward):
+        """Move bytes socket -> pipe -> socket inside the kernel (Linux os.splice).
+
+        The data never enters this process, so there is no copy into or
+        out of Python objects. Falls back to _copy_data if the kernel
+        refuses to splice these sockets.
+        """
+        read_end, write_end = os.pipe()
+        try:
+            if fcntl is not None and hasattr(fcntl, 'F_SETPIPE_SZ'):
+                try:
+                    fcntl.fcntl(write_end, fcntl.F_SETPIPE_SZ, SPLICE_CHUNK)
+                except OSError:
+                    pass  # above /proc/sys/fs/pipe-max-size; the default 64K pipe still works
+            src, dst = source.fileno(), destination.fileno()
+            while True:
+                try:
+                    count = os.splice(src, write_end, SPLICE_CHUNK, flags=os.SPLICE_F_MOVE)
+                except OSError as e:
+                    if e.errno in (errno.EINVAL, errno.ENOSYS):
+                        return self._copy_data(source, destination, on_forward)
+                    raise
+                if not count:
+                    return
+                remaining = count
+                while remaining:
+                    remaining -= os.splice(read_end, dst, remaining, flags=os.SPLICE_F_MOVE)
+                self.stats['bytes_forwarded'] += count
+                if on_forward:
+                    on_forward()
         finally:
-            pass
+            os.close(read_end)
+            os.close(write_end)
                 
     def get_stats(self):
         """Get load balancer performance stats"""
@@ -212,6 +955,26 @@ class LoadBalancer:
             'uptime_seconds': uptime,
             'requests_handled': self.stats['requests_handled'],
             'connections_forwarded': self.stats['connections_forwarded'],
+            'strategy': self.strategy.name,
+            'mode': self.mode,
+            'open_connections': sum(backend.in_flight for backend in list(self.backend_stats.values())),
+            'bytes_forwarded': (self.proxy or self).stats['bytes_forwarded'],
+            'requests_routed': self.stats['requests_routed'],
+            'pools': {f"{ip}:{port}": pool.snapshot() for (ip, port), pool in list(self.pools.items())},
+            'compression': self.compression.snapshot() if self.compression else None,
+            'incremental': {'patched': self.stats['incremental'], 'documents_known': len(self.document_owners)},
+            'open_clients': len(self.proxy.connections) if self.proxy else self.open_clients,
+            'admission': self.admission.get_stats(),
+            'failover': {
+                'replayed': self.stats['replayed'],
+                'hedged': self.stats['hedged'],
+                'hedge_wins': self.stats['hedge_wins'],
+                'hedge_after_ms': round(self.latencies.threshold * 1000, 2)
+                                  if self.hedger and self.latencies.threshold else None
+            },
+            'backends': {f"{ip}:{port}": backend.snapshot() for (ip, port), backend in list(self.backend_stats.items())},
+            'draining': [f"{ip}:{port}" for ip, port in self.draining],
+            'routable_servers': len(self.routable_servers()),
             'servers': health_stats
         }
         
@@ -219,6 +982,12 @@ class LoadBalancer:
         """Stop the load balancer"""
         self.running = False
         self.health_monitor.stop_monitoring()
+        if self.control:
+            self.control.stop()
+        for pool in self.pools.values():
+            pool.close()
+        if self.hedger:
+            self.hedger.stop()
 
     def debug_server_status(self):
         """Print current server status for debugging"""
@@ -233,16 +1002,80 @@ class LoadBalancer:
         print(f"[DEBUG] Health monitor stats: {server_stats}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spell checker load balancer")
+    parser.add_argument('--port', type=int, default=7520)
+    parser.add_argument('--strategy', choices=list(STRATEGIES), default='round-robin',
+                        help="how to pick a backend for each new client")
+    parser.add_argument('--mode', choices=['selector', 'threads', 'splice', 'l7'], default='selector',
+                        help="one event-loop thread for all clients, three threads per client "
+                             "copying through userspace or splicing in the kernel (Linux), "
+                             "or request-level routing over pooled backend connections")
+    parser.add_argument('--pool-size', type=int, default=4,
+                        help="persistent connections per backend in l7 mode")
+    parser.add_argument('--max-clients', type=int, default=10000,
+                        help="client connections beyond this are refused with a busy reply (0 = no limit)")
+    parser.add_argument('--max-per-backend', type=int, default=0,
+                        help="concurrent requests (l7) or sessions per backend (0 = no limit)")
+    parser.add_argument('--queue-size', type=int, default=128,
+                        help="requests that may wait for a free backend slot")
+    parser.add_argument('--queue-timeout', type=float, default=1.0,
+                        help="seconds a request waits for a slot before a busy reply")
+    parser.add_argument('--user-rate', type=float, default=0,
+                        help="checks per second per username, token bucket (0 = no limit)")
+    parser.add_argument('--user-burst', type=int, default=None,
+                        help="token bucket size (default: one second's worth)")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="l7 mode: sends per request, counting replays after backend failure and hedges")
+    parser.add_argument('--hedge-percentile', type=float, default=None,
+                        help="l7 mode: duplicate a check to a second backend once it is slower than "
+                             "this percentile of recent latencies (e.g. 0.95; off by default)")
+    parser.add_argument('--control-port', type=int, default=None,
+                        help="port where servers register and deregister themselves (default: port + 1, 0 = off)")
+    parser.add_argument('--drain-timeout', type=float, default=30,
+                        help="seconds a deregistering server gets to finish its in-flight work")
+    parser.add_argument('--breaker-failure-rate', type=float, default=0.5,
+                        help="open a backend's circuit breaker at this failure rate over its last 20 requests")
+    parser.add_argument('--breaker-open-seconds', type=float, default=5,
+                        help="how long an open breaker keeps traffic off a backend before trial requests")
+    parser.add_argument('--breaker-trials', type=int, default=3,
+                        help="trial requests that must succeed before a recovered backend takes full traffic")
+    parser.add_argument('--breaker-slow-ms', type=float, default=None,
+                        help="count answers slower than this as failures (off by default)")
+    parser.add_argument('--phi-threshold', type=float, default=0,
+                        help="take a server out of rotation at this phi-accrual suspicion on two failed "
+                             "heartbeats in a row (0 = after 3 failed heartbeats, the default)")
+    parser.add_argument('--phi-suspect', type=float, default=3.0,
+                        help="route around a server above this suspicion while others are fine")
+    parser.add_argument('--compress-threshold', type=int, default=512,
+                        help="'l7' mode: zlib-compress frames of at least this many bytes to clients and "
+                             "servers that agree (0 = never)")
+    parser.add_argument('--servers', default="",
+                        help="backend servers to start with (host:port, comma separated); "
+                             "servers also register themselves over the control port")
+    args = parser.parse_args()
+    
     print("DISTRIBUTED SPELL CHECKER LOAD BALANCER")
     print("=" * 50)
     
-    lb = LoadBalancer()
+    admission = AdmissionController(args.max_per_backend, args.queue_size, args.queue_timeout,
+                                    args.user_rate, args.user_burst)
+    lb = LoadBalancer(args.port, args.strategy, args.mode, args.pool_size, admission, args.max_clients,
+                      args.max_attempts, args.hedge_percentile,
+                      args.port + 1 if args.control_port is None else args.control_port, args.drain_timeout,
+                      {'failure_rate': args.breaker_failure_rate, 'open_timeout': args.breaker_open_seconds,
+                       'trials': args.breaker_trials,
+                       'slow_call': args.breaker_slow_ms / 1000 if args.breaker_slow_ms else None},
+                      compress_threshold=args.compress_threshold)
+    
+    lb.health_monitor.phi_threshold = args.phi_threshold or None
+    lb.health_monitor.suspect_phi = args.phi_suspect
     
     # Add servers
-    lb.add_server('localhost', 7530)
-    lb.add_server('localhost', 7531)
+    for server in filter(None, args.servers.split(',')):
+        server_host, server_port = server.rsplit(':', 1)
+        lb.add_server(server_host, int(server_port))
     
-    print("Load balancer starting on port 7520...")
+    print(f"Load balancer starting on port {args.port} ({args.strategy} routing)...")
     print("Registered servers:")
     for server in lb.servers:
         print(f"  - {server[0]}:{server[1]}")
@@ -9,10 +9,63 @@ import subprocess
 import threading
 import time
 import socket
+from lb_control import control_request
+
+LB_CONTROL = ('localhost', 7521) # load balancer control port (its port + 1)
+AUTOSCALE_INTERVAL = 5 # seconds between load readings
+AUTOSCALE_FIRST_PORT = 7532 # autoscaled servers take ports from here up
+LEAVE_TIMEOUT = 70 # seconds a server gets to drain and exit after SIGTERM (the load balancer drains for 30)
+
+class AutoscalePolicy:
+    """Decide from load balancer stats whether to add a server, remove one, or hold.
+    
+    Load is the work at the load balancer per routable server: requests
+    (l7 mode) or sessions (other modes) in flight on the backends plus
+    those waiting for admission. It must stay above scale_up_at, or
+    below scale_down_at, for patience readings in a row before acting,
+    and nothing happens within cooldown seconds of the last action, so
+    one burst does not start a server that the next lull stops again.
+    """
+    
+    def __init__(self, min_servers=2, max_servers=6, scale_up_at=8, scale_down_at=2, patience=3, cooldown=30):
+        self.min_servers = min_servers
+        self.max_servers = max_servers
+        self.scale_up_at = scale_up_at
+        self.scale_down_at = scale_down_at
+        self.patience = patience
+        self.cooldown = cooldown
+        self.high = 0 # consecutive readings above scale_up_at
+        self.low = 0
+        self.last_action = 0
+        
+    def load(self, stats):
+        in_flight = sum(backend['in_flight'] for backend in stats['backends'].values())
+        return (in_flight + stats['admission']['waiting']) / max(1, stats['routable_servers'])
+        
+    def decide(self, stats, now=None):
+        """+1 to start a server, -1 to stop one, 0 to hold"""
+        now = time.time() if now is None else now
+        servers = stats['routable_servers']
+        load = self.load(stats)
+        self.high = self.high + 1 if load > self.scale_up_at else 0
+        self.low = self.low + 1 if load < self.scale_down_at else 0
+        if now - self.last_action < self.cooldown:
+            return 0
+        decision = 0
+        if servers < self.min_servers or (self.high >= self.patience and servers < self.max_servers):
+            decision = 1
+        elif self.low >= self.patience and servers > self.min_servers:
+            decision = -1
+        if decision:
+            self.last_action = now
+            self.high = self.low = 0
+        return decision
 
 class MasterControlPanel:
     def __init__(self):
         self.processes = {}
+        self.autoscaled = {} # port -> process, for servers the autoscaler started
+        self.autoscale_policy = AutoscalePolicy()
         self.component_status = {
             'Server 1 (7530)': 'Stopped',
             'Server 2 (7531)': 'Stopped',
@@ -179,6 +232,11 @@ class MasterControlPanel:
                  bg='#9B59B6', fg='black', font=('Arial', 9, 'bold'),
                  activebackground='#8E44AD', activeforeground='white').pack(side=tk.LEFT, padx=5)
         
+        self.autoscale_enabled = tk.BooleanVar(value=False)
+        tk.Checkbutton(actions_frame, text="Autoscale Servers", variable=self.autoscale_enabled,
+                      bg='#34495E', fg='white', selectcolor='#2C3E50', font=('Arial', 9, 'bold'),
+                      activebackground='#34495E', activeforeground='white').pack(side=tk.LEFT, padx=5)
+        
         # tk.Button(actions_frame, text="View Cache Stats", command=self.view_cache,
         #          bg='#16A085', fg='black', font=('Arial', 9, 'bold'),
         #          activebackground='#138D75', activeforeground='white').pack(side=tk.LEFT, padx=5)
@@ -190,6 +248,7 @@ class MasterControlPanel:
         # Start monitoring
         self.start_time = time.time()
         self.start_monitoring()
+        self.start_autoscaling()
         
     def update_button_states(self):
         """Update button states based on what's currently running"""
@@ -306,10 +365,73 @@ class MasterControlPanel:
     def stop_all(self):
         """Stop all components"""
         self.log("Stopping all components...")
+        for port in list(self.autoscaled.keys()):
+            self.autoscaled.pop(port).terminate()
         for component in list(self.processes.keys()):
             self.stop_component(component)
         self.log("All components stopped")
         
+    def scale_up(self):
+        """Start one more server; it registers itself with the load balancer"""
+        port = AUTOSCALE_FIRST_PORT
+        while port in self.autoscaled:
+            port += 1
+        # Not through a shell, so terminate() signals the server itself
+        self.autoscaled[port] = subprocess.Popen(["python3", "server.py", "--port", str(port)])
+        self.log(f"Autoscale: started server on port {port}")
+        
+    def scale_down(self):
+        """Have the newest autoscaled server leave the load balancer, then make sure it is gone.
+        
+        SIGTERM makes the server stop re-registering, deregister with a
+        drain and exit once drained; deregistering it from here instead
+        would race its own re-registration. A server that does not exit
+        in time is drained from here and killed.
+        """
+        if not self.autoscaled:
+            return
+        port = max(self.autoscaled)
+        process = self.autoscaled.pop(port)
+        self.log(f"Autoscale: draining server on port {port}")
+        process.terminate()
+        try:
+            process.wait(LEAVE_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            self.log(f"Autoscale: server on port {port} did not leave in {LEAVE_TIMEOUT}s, removing it")
+            try:
+                # Servers register under the address they listen on
+                reply = control_request(LB_CONTROL, {'op': 'deregister', 'host': socket.gethostbyname(socket.gethostname()),
+                                                     'port': port, 'drain': True, 'wait': True}, timeout=60)
+                if not reply.get('ok'):
+                    self.log(f"Autoscale: {reply.get('error')}")
+            except (OSError, ValueError) as e:
+                self.log(f"Autoscale: could not drain port {port}: {e}")
+            process.kill()
+        self.log(f"Autoscale: stopped server on port {port}")
+        
+    def start_autoscaling(self):
+        """Read load from the load balancer and start or stop servers to match it"""
+        def autoscale():
+            while True:
+                time.sleep(AUTOSCALE_INTERVAL)
+                if not self.autoscale_enabled.get() or 'loadbalancer' not in self.processes:
+                    continue
+                try:
+                    reply = control_request(LB_CONTROL, {'op': 'stats'})
+                except (OSError, ValueError):
+                    continue # load balancer still starting
+                if not reply.get('ok'):
+                    continue
+                decision = self.autoscale_policy.decide(reply['stats'])
+                if decision > 0:
+                    self.log(f"Autoscale: load {self.autoscale_policy.load(reply['stats']):.1f} per server")
+                    self.scale_up()
+                elif decision < 0 and self.autoscaled:
+                    self.log(f"Autoscale: load {self.autoscale_policy.load(reply['stats']):.1f} per server")
+                    self.scale_down() # only servers the autoscaler started; blocks until drained
+                    
+        threading.Thread(target=autoscale, daemon=True).start()
+        
     def launch_client(self):
         """Launch a client instance"""
         subprocess.Popen("python3 client.py", shell=True)
@@ -342,8 +464,9 @@ class MasterControlPanel:
                     active_servers += 1
                 if 'server2' in self.processes:
                     active_servers += 1
+                active_servers += len(self.autoscaled)
                     
-                self.active_servers_label.config(text=f"Active Servers: {active_servers}/2")
+                self.active_servers_label.config(text=f"Active Servers: {active_servers}/{2 + len(self.autoscaled)}")
                 
                 if 'loadbalancer' in self.processes:
                     self.lb_status_label.config(text="Load Balancer: Active")
@@ -0,0 +1,120 @@
+"""
+Gossip Membership for Distributed Spell Checker
+Heartbeat-counter membership table with timeout-based failure detection
+"""
+
+import random
+import threading
+import time
+
+class GossipMembership:
+    """Cluster view that spreads by gossip instead of a hardcoded peer list.
+
+    Every node bumps its own heartbeat counter each round and ships its
+    table to a few random members. A member whose counter stops rising is
+    suspected after suspect_after seconds, declared dead after dead_after
+    (and no longer gossiped to), and forgotten after forget_after.
+
+    The counter starts again from 0 when a node restarts, so each entry
+    also carries the node's generation (its start time in milliseconds)
+    and entries compare by (generation, heartbeat): a restarted node is
+    alive again on its first heartbeat.
+    """
+
+    def __init__(self, node_id, address, suspect_after=5, dead_after=15, forget_after=60):
+        self.node_id = node_id
+        self.address = tuple(address)
+        self.suspect_after = suspect_after
+        self.dead_after = dead_after
+        self.forget_after = forget_after
+        self.heartbeat = 0
+        self.generation = int(time.time() * 1000)
+        self.members = {}  # address -> {'node_id', 'generation', 'heartbeat', 'updated', 'status'}
+        self.seeds = []
+        self.lock = threading.Lock()
+
+    def add_seed(self, address):
+        address = tuple(address)
+        if address != self.address and address not in self.seeds:
+            self.seeds.append(address)
+
+    def beat(self):
+        """Advance our own heartbeat counter (once per gossip round)"""
+        with self.lock:
+            self.heartbeat += 1
+            return self.heartbeat
+
+    def merge(self, entries):
+        """Merge a gossiped table of [host, port, node_id, heartbeat, generation] entries.
+
+        Entries without a generation (from older nodes) count as
+        generation 0. Returns the addresses of members we had not heard
+        of before.
+        """
+        now = time.time()
+        joined = []
+        with self.lock:
+            for host, port, node_id, heartbeat, *rest in entries:
+                address = (host, port)
+                if address == self.address:
+                    continue
+                generation = rest[0] if rest else 0
+                member = self.members.get(address)
+                if member is None:
+                    self.members[address] = {'node_id': node_id, 'generation': generation, 'heartbeat': heartbeat,
+                                             'updated': now, 'status': 'alive'}
+                    joined.append(address)
+                elif (generation, heartbeat) > (member['generation'], member['heartbeat']):
+                    member.update(node_id=node_id, generation=generation, heartbeat=heartbeat, updated=now,
+                                  status='alive')
+        return joined
+
+    def detect_failures(self):
+        """Update suspect/dead status from heartbeat age; returns (address, status) changes"""
+        now = time.time()
+        changes = []
+        with self.lock:
+            for address, member in list(self.members.items()):
+                age = now - member['updated']
+                if age > self.forget_after:
+                    del self.members[address]
+                    changes.append((address, 'forgotten'))
+                    continue
+                status = 'dead' if age > self.dead_after else 'suspect' if age > self.suspect_after else 'alive'
+                if status != member['status']:
+                    member['status'] = status
+                    changes.append((address, status))
+        return changes
+
+    def alive(self):
+        """Members we can gossip to (suspects still count until declared dead)"""
+        with self.lock:
+            return [address for address, member in self.members.items() if member['status'] != 'dead']
+
+    def pick(self, count, exclude=()):
+        """Random gossip targets, falling back to seeds while we know nobody"""
+        candidates = [address for address in self.alive() if address not in exclude]
+        if not candidates:
+            candidates = [address for address in self.seeds if address not in exclude]
+        return random.sample(candidates, min(count, len(candidates)))
+
+    def digest(self):
+        """Our table (including ourselves) in gossip form, without dead members"""
+        with self.lock:
+            entries = [[self.address[0], self.address[1], self.node_id, self.heartbeat, self.generation]]
+            for address, member in self.members.items():
+                if member['status'] != 'dead':
+                    entries.append([address[0], address[1], member['node_id'], member['heartbeat'],
+                                    member['generation']])
+            return entries
+
+    def get_stats(self):
+        """Member counts by status"""
+        with self.lock:
+            statuses = [member['status'] for member in self.members.values()]
+        return {
+            'alive': statuses.count('alive'),
+            'suspect': statuses.count('suspect'),
+            'dead': statuses.count('dead'),
+            'seeds': len(self.seeds)
+        }
@@ -0,0 +1,111 @@
+"""
+Merkle Digest for Lexicon Reconciliation
+Hash tree over word buckets so peers can find which ranges differ
+"""
+
+import hashlib
+import zlib
+
+class LexiconMerkleTree:
+    """Fixed-shape hash tree over a set of words.
+
+    Every word falls into one of fanout**depth leaf buckets by its hash.
+    A leaf digest is the XOR of its items' hashes, where an item is a word
+    plus an optional tag (the CRDT dots), so adding, re-tagging or removing
+    a word is O(1). Inner nodes hash their children and are rebuilt lazily
+    the next time a digest is requested.
+    """
+
+    def __init__(self, fanout=16, depth=3):
+        self.fanout = fanout
+        self.depth = depth
+        self.num_leaves = fanout ** depth
+        self.leaves = [0] * self.num_leaves
+        self.buckets = [{} for _ in range(self.num_leaves)]  # word -> item hash
+        self.levels = None  # cached inner levels, None when dirty
+
+    @staticmethod
+    def word_hash(word):
+        return int.from_bytes(hashlib.sha1(word.encode("utf-8")).digest()[:8], "big")
+
+    def bucket_of(self, word):
+        """Leaf index of a word (crc32 is plenty to spread words and much cheaper than sha1)"""
+        return zlib.crc32(word.encode("utf-8")) % self.num_leaves
+
+    def add(self, word, tag=""):
+        """Insert a word, or replace its tag if already present"""
+        bucket = self.bucket_of(word)
+        item = self.word_hash(word + "\0" + tag) if tag else self.word_hash(word)
+        old = self.buckets[bucket].get(word)
+        if old != item:
+            if old is not None:
+                self.leaves[bucket] ^= old
+            self.buckets[bucket][word] = item
+            self.leaves[bucket] ^= item
+            self.levels = None
+
+    def add_many(self, items):
+        """Bulk add of (word, tag) pairs, e.g. while loading a snapshot; same result as add()"""
+        sha1, crc32, num_leaves = hashlib.sha1, zlib.crc32, self.num_leaves
+        buckets, leaves = self.buckets, self.leaves
+        for word, tag in items:
+            data = word.encode("utf-8")
+            bucket = crc32(data) % num_leaves
+            item = int.from_bytes(sha1(data + b"\0" + tag.encode("utf-8") if tag else data).digest()[:8], "big")
+            old = buckets[bucket].get(word)
+            if old != item:
+                if old is not None:
+                    leaves[bucket] ^= old
+                buckets[bucket][word] = item
+                leaves[bucket] ^= item
+        self.levels = None
+
+    def discard(self, word):
+        bucket = self.bucket_of(word)
+        item = self.buckets[bucket].pop(word, None)
+        if item is not None:
+            self.leaves[bucket] ^= item
+            self.levels = None
+
+    def _build(self):
+        """Rebuild the inner levels; levels[0] is the root, levels[depth] the leaves"""
+        level = [f"{leaf:016x}" for leaf in self.leaves]
+        levels = [level]
+        while len(level) > 1:
+            level = [
+                hashlib.sha1("".join(level[i:i + self.fanout]).encode()).hexdigest()[:16]
+                for i in range(0, len(level), self.fanout)
+            ]
+            levels.append(level)
+        levels.reverse()
+        self.levels = levels
+
+    def node(self, level, index):
+        """Digest of one node"""
+        if self.levels is None:
+            self._build()
+        return self.levels[level][index]
+
+    def root(self):
+        return self.node(0, 0)
+
+    def children(self, index):
+        """Indexes of a node's children on the next level"""
+        return range(index * self.fanout, (index + 1) * self.fanout)
+
+    def mismatches(self, level, nodes):
+        """Return the indexes whose digest differs from the given (index, digest) pairs"""
+        return [index for index, digest in nodes if self.node(level, index) != digest]
+
+    def words_in(self, bucket):
+        return self.buckets[bucket].keys()
+
+    def __contains__(self, word):
+        return word in self.buckets[self.bucket_of(word)]
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.buckets)
+
+    def __iter__(self):
+        for bucket in self.buckets:
+            yield from bucket
@@ -0,0 +1,106 @@
+"""
+Client Result Cache
+Corrected documents kept on disk, keyed by content digest and the lexicon version they were checked against,
+and the last version of each document sent, for incremental checks
+"""
+
+import hashlib
+import os
+from collections import OrderedDict
+
+class ResultCache:
+    """The latest corrected text for each document this client checked.
+
+    Each result is a file <digest>.<version>.txt in directory, so the
+    cache survives restarts. Only the newest version of a document is
+    kept; past max_entries documents the least recently used goes.
+    """
+
+    def __init__(self, directory="client/cache/", max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # digest -> lexicon version, least recently used first
+        os.makedirs(directory, exist_ok=True)
+        names = [name for name in os.listdir(directory) if name.count('.') == 2 and name.endswith('.txt')]
+        for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(directory, name))):
+            digest, version, _ = name.split('.')
+            self.entries[digest] = version
+
+    def _path(self, digest, version):
+        return os.path.join(self.directory, f"{digest}.{version}.txt")
+
+    def latest(self, digest):
+        """(lexicon version, corrected text) of the newest result for a document, or (None, None)"""
+        version = self.entries.get(digest)
+        if version is not None:
+            try:
+                with open(self._path(digest, version), "r") as f:
+                    text = f.read()
+                self.entries.move_to_end(digest)
+                return version, text
+            except OSError:
+                del self.entries[digest]  # removed from under us
+        return None, None
+
+    def put(self, digest, version, text):
+        """Store a result, replacing any older one for the same document"""
+        old = self.entries.pop(digest, None)
+        if old is not None and old != version:
+            self._remove(digest, old)
+        with open(self._path(digest, version), "w") as f:
+            f.write(text)
+        self.entries[digest] = version
+        while len(self.entries) > self.max_entries:
+            oldest, oldest_version = self.entries.popitem(last=False)
+            self._remove(oldest, oldest_version)
+
+    def _remove(self, digest, version):
+        try:
+            os.remove(self._path(digest, version))
+        except OSError:
+            pass
+
+class SourceHistory:
+    """The last version of each named document this client had checked.
+
+    An incremental check sends only the edits since that version. Each
+    is a file in directory named for a digest of the document name; past
+    max_entries names the least recently checked goes.
+    """
+
+    def __init__(self, directory="client/cache/sources/", max_entries=1000):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # file name -> None, least recently used first
+        os.makedirs(directory, exist_ok=True)
+        names = [name for name in os.listdir(directory) if name.endswith('.txt')]
+        for name in sorted(names, key=lambda name: os.path.getmtime(os.path.join(directory, name))):
+            self.entries[name] = None
+
+    def _file(self, name):
+        return hashlib.sha1(name.encode("utf-8")).hexdigest() + ".txt"
+
+    def previous(self, name):
+        """The last version of document name that was checked, or None"""
+        file_name = self._file(name)
+        if file_name not in self.entries:
+            return None
+        try:
+            with open(os.path.join(self.directory, file_name), "r", newline="") as f:
+                return f.read()
+        except OSError:
+            del self.entries[file_name]
+            return None
+
+    def remember(self, name, text):
+        file_name = self._file(name)
+        with open(os.path.join(self.directory, file_name), "w", newline="") as f:
+            f.write(text)
+        self.entries[file_name] = None
+        self.entries.move_to_end(file_name)
+        while len(self.entries) > self.max_entries:
+            oldest, _ = self.entries.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.directory, oldest))
+            except OSError:
+                pass
@@ -0,0 +1,266 @@
+"""
+Routing Strategies for the Load Balancer
+Pick a backend from live load: in-flight connections and observed latency
+"""
+
+import bisect
+import hashlib
+import random
+import threading
+
+class BackendStats:
+    """Per-backend load figures the load balancer updates as it forwards traffic"""
+
+    def __init__(self, decay=0.3, on_release=None, breaker=None):
+        self.decay = decay  # weight of the newest latency sample
+        self.on_release = on_release  # called (outside the lock) whenever a slot frees up
+        self.breaker = breaker  # CircuitBreaker fed by real request outcomes, if any
+        self.in_flight = 0
+        self.total = 0
+        self.latency = None  # EWMA of request latency in seconds, None until measured
+        self.report = None  # the server's last heartbeat load report, if it sends them
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.in_flight += 1
+            self.total += 1
+        if self.breaker:
+            self.breaker.attempt()
+
+    def release(self):
+        with self.lock:
+            self.in_flight -= 1
+        if self.on_release:
+            self.on_release()
+
+    def observe(self, seconds):
+        """Fold one latency sample into the moving average"""
+        with self.lock:
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += self.decay * (seconds - self.latency)
+
+    def succeeded(self, seconds):
+        """A real request was answered after seconds: time it and tell the breaker"""
+        self.observe(seconds)
+        if self.breaker:
+            self.breaker.record_success(seconds)
+
+    def failed(self):
+        if self.breaker:
+            self.breaker.record_failure()
+
+    def available(self):
+        """False while the breaker keeps traffic off this backend"""
+        return not self.breaker or self.breaker.available()
+
+    def snapshot(self):
+        return {
+            'in_flight': self.in_flight,
+            'total': self.total,
+            'latency_ms': round(self.latency * 1000, 2) if self.latency is not None else None,
+            'breaker': self.breaker.snapshot() if self.breaker else None
+        }
+
+class ConsistentHashRing:
+    """Hash ring with virtual nodes.
+
+    Each server owns `vnodes` points on the ring and a key belongs to the
+    first point at or after its hash, so adding or removing one of N
+    servers only moves about 1/N of the keys, and the many points per
+    server keep the shares even.
+    """
+
+    def __init__(self, vnodes=100):
+        self.vnodes = vnodes
+        self.servers = frozenset()
+        self.ring = ([], {})  # (sorted point hashes, point hash -> server), only ever replaced whole
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _hash(value):
+        if isinstance(value, str):
+            value = value.encode("utf-8")
+        return int.from_bytes(hashlib.md5(value).digest()[:8], "big")
+
+    def _publish(self, servers):
+        """Build the ring for servers and swap it in; callers hold the lock.
+
+        Lookups read self.ring without the lock, so the points and their
+        owners are built aside and replace the old pair in one assignment.
+        """
+        owners = {}
+        for server in servers:
+            for i in range(self.vnodes):
+                owners[self._hash(f"{server[0]}:{server[1]}#{i}")] = server
+        self.servers = frozenset(servers)
+        self.ring = (sorted(owners), owners)
+
+    def add(self, server):
+        with self.lock:
+            self._publish(self.servers | {server})
+
+    def remove(self, server):
+        with self.lock:
+            self._publish(self.servers - {server})
+
+    def sync(self, servers):
+        """Make the ring hold exactly these servers (cheap when nothing changed)"""
+        servers = frozenset(servers)
+        if servers == self.servers:
+            return
+        with self.lock:
+            if servers != self.servers:
+                self._publish(servers)
+
+    def lookup(self, key, allowed=None):
+        """Server owning a key, or None on an empty ring.
+
+        With allowed given (a set or dict of servers, tested as is), owners
+        not in it (full for now) are passed over clockwise, so the key goes
+        to its next server on the ring and comes back once the owner has
+        room again.
+        """
+        points, owners = self.ring
+        if not points:
+            return None
+        index = bisect.bisect_left(points, self._hash(key))
+        for step in range(len(points)):
+            server = owners[points[(index + step) % len(points)]]
+            if allowed is None or server in allowed:
+                return server
+        return None
+
+class RoutingStrategy:
+    """Base class: choose one of the healthy servers given their BackendStats.
+
+    stats maps exactly the servers to choose from to their BackendStats.
+    key identifies what is being routed (a document digest, a username);
+    only content-aware strategies use it.
+    """
+
+    name = None
+    content_aware = False
+
+    def track(self, servers):
+        """Told every routable server before each choice, full or not; only strategies keeping state need it"""
+
+    def choose(self, servers, stats, key=None):
+        raise NotImplementedError
+
+class RoundRobin(RoutingStrategy):
+    name = 'round-robin'
+
+    def __init__(self):
+        self.index = 0
+
+    def choose(self, servers, stats, key=None):
+        server = servers[self.index % len(servers)]
+        self.index += 1
+        return server
+
+class LeastConnections(RoutingStrategy):
+    """Fewest in-flight connections; ties rotate so equal backends share the load"""
+
+    name = 'least-connections'
+
+    def __init__(self):
+        self.index = 0
+
+    def choose(self, servers, stats, key=None):
+        self.index += 1
+        start = self.index % len(servers)
+        rotated = servers[start:] + servers[:start]
+        return min(rotated, key=lambda server: stats[server].in_flight)
+
+class EWMALatency(RoutingStrategy):
+    """Lowest expected wait: latency EWMA scaled by the queue we would join.
+
+    Multiplying by (in_flight + 1) keeps a fast backend from being
+    flooded until its latency catches up. Unmeasured backends count as
+    fastest so every backend gets probed.
+    """
+
+    name = 'ewma'
+
+    def choose(self, servers, stats, key=None):
+        def cost(server):
+            backend = stats[server]
+            return (backend.latency or 0) * (backend.in_flight + 1)
+        return min(random.sample(servers, len(servers)), key=cost)
+
+class PowerOfTwoChoices(RoutingStrategy):
+    """Sample two backends at random and take the less loaded one.
+
+    Nearly as good as least-connections but needs no global minimum, and
+    it does not herd every new client onto the same momentarily idle backend.
+    """
+
+    name = 'p2c'
+
+    def choose(self, servers, stats, key=None):
+        if len(servers) == 1:
+            return servers[0]
+        first, second = random.sample(servers, 2)
+        def load(server):
+            backend = stats[server]
+            return (backend.in_flight, backend.latency or 0)
+        return first if load(first) <= load(second) else second
+
+class CapacityAware(RoutingStrategy):
+    """Lowest expected wait using the servers' own load reports.
+    
+    Like ewma, but the queue we would join also counts the work a
+    server reports queued from other load balancers, and a server busy
+    with work we cannot see (high CPU) is slowed to match. Servers
+    without a report fall back to our own view of them.
+    """
+    
+    name = 'capacity'
+    
+    def choose(self, servers, stats, key=None):
+        def cost(server):
+            backend = stats[server]
+            report = backend.report or {}
+            latency = backend.latency or (report.get('p99_ms') or 0) / 1000
+            queued = max(backend.in_flight, report.get('queued') or 0)
+            return latency * (queued + 1) * (1 + min(report.get('cpu') or 0, 1))
+        return min(random.sample(servers, len(servers)), key=cost)
+
+class ContentAffinity(RoutingStrategy):
+    """Route by document so repeats hit the same server's cache.
+
+    Keys go through a consistent-hash ring over the healthy servers; a
+    server failing or joining only remaps its own share of documents.
+    A server at its concurrency limit stays on the ring and its keys
+    spill to the next server clockwise until it has room. Without a key
+    it falls back to round-robin.
+    """
+
+    name = 'consistent-hash'
+    content_aware = True
+
+    def __init__(self, vnodes=100):
+        self.ring = ConsistentHashRing(vnodes)
+        self.fallback = RoundRobin()
+
+    def choose(self, servers, stats, key=None):
+        if key is None:
+            return self.fallback.choose(servers, stats)
+        if not self.ring.servers:
+            self.ring.sync(servers)
+        return self.ring.lookup(key, stats)
+
+    def track(self, servers):
+        self.ring.sync(servers)
+
+STRATEGIES = {strategy.name: strategy for strategy in
+              (RoundRobin, LeastConnections, EWMALatency, PowerOfTwoChoices, CapacityAware, ContentAffinity)}
+
+def make_strategy(name):
+    """Build a routing strategy by name"""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown routing strategy '{name}' (choose from {', '.join(STRATEGIES)})")
+    return STRATEGIES[name]()
@@ -10,10 +10,18 @@ import tkinter as tk
 import time
 import json
 import hashlib
-import sys
+import argparse
+import os
+import signal
+from collections import deque
 from cache_manager import SpellCheckCache
 from health_monitor import HealthMonitor
 from sync_manager import SyncManager
+from lexicon_index import BloomLexicon
+from protocol import (send_message, recv_message, recv_exact, content_digest, lookup_reply, matches_reply,
+                      parse_file_request, Compression, answer_pipeline_hello)
+from incremental import DocumentStore, split_document, join_document, apply_edits
+from lb_control import control_request
 
 #=================================================================================================================
 """Declaring global variables"""
@@ -21,16 +29,27 @@ from sync_manager import SyncManager
 IP = socket.gethostbyname(socket.gethostname()) # get our IP address automatically
 
 # Check command line arguments for port
-if len(sys.argv) > 1:
-    # Support both "python server.py 7530" and "python server.py --port 7530"
-    if sys.argv[1] == '--port' and len(sys.argv) > 2:
-        PORT = int(sys.argv[2])
-    else:
-        PORT = int(sys.argv[1])
-else:
-    PORT = 7530 # default port
+# Support both "python server.py 7530" and "python server.py --port 7530"
+parser = argparse.ArgumentParser(description="Spell checker server")
+parser.add_argument('port_arg', nargs='?', type=int, metavar='port')
+parser.add_argument('--port', type=int, dest='port_opt')
+parser.add_argument('--bloom', action='store_true',
+                    help="memory-constrained mode: Bloom filter in RAM, exact index on disk")
+parser.add_argument('--bloom-error-rate', type=float, default=0.01)
+parser.add_argument('--seeds', default="localhost:8530,localhost:8531",
+                    help="sync seed nodes (host:port, comma separated); other servers are found by gossip")
+parser.add_argument('--lb', default="localhost:7521",
+                    help="load balancer control address to register with (host:port, empty = don't register)")
+parser.add_argument('--compress-threshold', type=int, default=512,
+                    help="zlib-compress pipelined and sync frames of at least this many bytes when the peer agrees "
+                         "(0 = never)")
+args = parser.parse_args()
+
+PORT = args.port_opt or args.port_arg or 7530 # default port
+BLOOM_MODE = args.bloom
 
 SYNC_PORT = PORT + 1000 # sync port is always PORT + 1000 (8530, 8531, etc)
+BULK_SYNC_CHANGES = 1000 # beyond this many changed words, reload the lexicon instead of patching it
 SIZE = 1024
 FORMAT = "utf-8"
 clients = {} 
@@ -46,8 +65,20 @@ SERVER.bind(ADDR)
 
 NODE_ID = f"server_{PORT}"
 
+REGISTER_INTERVAL = 10 # re-register this often, so a restarted load balancer finds us again
+LB_CONTROL = None
+if args.lb:
+    lb_host, lb_port = args.lb.rsplit(':', 1)
+    LB_CONTROL = (lb_host, int(lb_port))
+leaving = threading.Event()
+register_lock = threading.Lock() # held while a register request is out, so leave() can wait it out
+
+# Wire compression for pipelined connections (negotiated per connection); sync traffic has its own
+compression = Compression(args.compress_threshold) if args.compress_threshold > 0 else None
+
 # Initialize cache with 500 entries max, 1 hour TTL
 cache = SpellCheckCache(max_size=500, ttl=3600)
+documents = DocumentStore(max_documents=200) # recent documents, for incremental checks against them
 
 # Server statistics
 server_stats = {
@@ -57,25 +88,64 @@ server_stats = {
     'uptime_start': time.time()
 }
 
+# Load figures for the HEARTBEAT reply
+check_latencies = deque(maxlen=500) # seconds per recent check
+checks_in_progress = 0 # checks accepted and not yet answered
+pipeline_connections = 0 # pooled load balancer connections
+load_lock = threading.Lock()
+cpu_sample = [time.time(), sum(os.times()[:2])] # wall clock and process CPU seconds at the last report
+
 #=================================================================================================================
 
 """Reading lexicon data and splitting it with respect to space for comparison, saving it into a global list: lex_words_list[]."""
 lex_file = "server/lexicon.txt"
-with open(lex_file, "r") as f:
-    lex_data = f.read()
-lex_words_list = lex_data.strip().split(" ")  
+if BLOOM_MODE:
+    # Huge-lexicon mode: negative lookups answered by the Bloom filter, positives confirmed on disk
+    lex_words_list = BloomLexicon(lex_file, error_rate=args.bloom_error_rate)
+else:
+    with open(lex_file, "r") as f:
+        lex_data = f.read()
+    lex_words_list = lex_data.strip().split(" ")  
+
+def apply_sync_changes(added, removed):
+    """Called by the sync manager when a peer's delta changes our lexicon"""
+    global lex_words_list
+    if len(added) + len(removed) > BULK_SYNC_CHANGES:
+        # Snapshot bootstrap: take the replicated word list wholesale
+        if BLOOM_MODE:
+            lex_words_list.replace(sync_manager.words())
+        else:
+            lex_words_list = sync_manager.words()
+            save_lexicon()
+    else:
+        for word in added:
+            if word not in lex_words_list:
+                lex_words_list.append(word)
+        for word in removed:
+            if word in lex_words_list:
+                lex_words_list.remove(word)
+        save_lexicon()
+    cache.clear()  # Clear cache since lexicon changed
+    try:
+        msg.insert(tk.END, f"[SYNC RECEIVED]: Lexicon updated from peer server (+{len(added)} -{len(removed)})\n")
+        msg.insert(tk.END, f"[LEXICON]: Now tracking {len(lex_words_list)} words\n")
+        auto_scroll(msg)
+    except NameError:
+        pass  # GUI not built yet
 
 # Initialize sync manager for inter-server communication
 sync_manager = SyncManager(
     node_id=NODE_ID,
     lexicon_file=lex_file,
-    sync_port=SYNC_PORT
+    sync_port=SYNC_PORT,
+    on_change=apply_sync_changes,
+    compress_threshold=args.compress_threshold
 )
 
-if PORT == 7530:
-    sync_manager.add_peer(('localhost', 8531))  # Connect to Server 2's sync port
-elif PORT == 7531:
-    sync_manager.add_peer(('localhost', 8530))  # Connect to Server 1's sync port
+# Seeds only bootstrap membership; the sync manager ignores its own address
+for seed in filter(None, args.seeds.split(',')):
+    seed_host, seed_port = seed.rsplit(':', 1)
+    sync_manager.add_peer((seed_host, int(seed_port)))
 
 sync_manager.start()
 
@@ -86,17 +156,42 @@ def lexicon_check(data):
     
     # Simple lexicon check without cache (cache is handled in handle_client)
     words = data.strip().split(" ")
-    updated_data = []
-    for word in words:
-        # Check if word (without punctuation) is in lexicon
-        clean_word = word.strip('.,!?;:').lower()
-        if clean_word in lex_words_list:
-            updated_data.append(f"[{word}]")
-        else:
-            updated_data.append(word)
+    updated_data = [check_word(word) for word in words]
 
     return " ".join(updated_data)
 
+def check_word(word):
+    """One word as a check returns it: in brackets if the lexicon has it"""
+    # Check if word (without punctuation) is in lexicon
+    clean_word = word.strip('.,!?;:').lower()
+    if clean_word in lex_words_list:
+        return f"[{word}]"
+    return word
+
+def lexicon_matches(data, updated_data):
+    """The [offset, length, lexicon entry] of every word a check put in brackets.
+    
+    Offsets and lengths count characters of the text as the client sent
+    it, so a client can bracket the words itself (protocol.render_matches)
+    or highlight them, and the answer is a few bytes per match instead
+    of the whole document again.
+    """
+    matches = []
+    offset = len(data) - len(data.lstrip())
+    for word, checked in zip(data.strip().split(" "), updated_data.split(" ")):
+        if checked != word:
+            matches.append([offset, len(word), word.strip('.,!?;:').lower()])
+        offset += len(word) + 1
+    return matches
+
+def save_lexicon():
+    """Write the in-memory lexicon back to lexicon.txt"""
+    if BLOOM_MODE:
+        lex_words_list.save()
+    else:
+        with open(lex_file, 'w') as f:
+            f.write(' '.join(lex_words_list))
+
 def display_stats():
     """Display server and cache statistics in GUI - runs periodically"""
     try:
@@ -105,6 +200,16 @@ def display_stats():
         
         stats_text = f"[STATS UPDATE] Cache: {stats['hit_rate']} hit rate, {stats['size']}/{stats['max_size']} entries, Uptime: {uptime:.0f}s, Active Clients: {len(clients)}\n"
         msg.insert(tk.END, stats_text)
+        if BLOOM_MODE:
+            bloom_stats = lex_words_list.get_stats()
+            msg.insert(tk.END, f"[BLOOM] {bloom_stats['words']} words, {bloom_stats['memory_bytes'] / 1048576:.1f} MB, {bloom_stats['fp_rate']} false positive rate over {bloom_stats['lookups']} lookups\n")
+        if documents.hits + documents.misses:
+            msg.insert(tk.END, f"[INCREMENTAL] {documents.hits} incremental checks against stored documents, {documents.misses} misses, {len(documents.documents)}/{documents.max_documents} documents kept\n")
+        sync_status = sync_manager.get_status()
+        for name, wire in (("clients", compression and compression.snapshot()), ("sync", sync_status.get('compression'))):
+            if wire and wire['bytes_in'] + wire['bytes_received']:
+                msg.insert(tk.END, f"[COMPRESSION] {name}: sent {wire['bytes_in'] / 1024:.0f} KB as {wire['bytes_on_wire'] / 1024:.0f} KB ({wire['saved']:.0%} saved), {wire['compress_ms_per_mb']:.1f} ms CPU per MB compressed, {wire['decompress_ms_per_mb']:.1f} ms per MB inflated\n")
+        msg.insert(tk.END, f"[SYNC] Apply queue: {sync_status['apply_queue_depth']} (max {sync_status['max_apply_queue']}), {sync_status['deltas_applied']} deltas in {sync_status['apply_batches']} batches, latency avg {sync_status['apply_latency_ms']['avg']:.1f} ms / p99 {sync_status['apply_latency_ms']['p99']:.1f} ms\n")
         msg.insert(tk.END, "-" * 60 + "\n")
         auto_scroll(msg)
     except Exception as e:
@@ -138,6 +243,249 @@ def remove_client(conn, username):
     msg.insert(tk.END, f"[CLEANUP]: Removed {username} from all tracking structures\n")
     auto_scroll(msg)
 
+def check_text(file_content):
+    """Spell check one document, answering repeats from the cache; timed for the load report"""
+    global checks_in_progress
+    with load_lock:
+        checks_in_progress += 1
+    start_time = time.time()
+    try:
+        version = lexicon_fingerprint() # before the check, so a lexicon change during it makes the state stale
+        updated_data = cached_check(file_content)
+        documents.put(content_digest(file_content), file_content, updated_data, version)
+        return updated_data
+    finally:
+        with load_lock:
+            checks_in_progress -= 1
+            check_latencies.append(time.time() - start_time)
+
+def cached_check(file_content):
+    cached_result = cache.get(file_content)
+    
+    if cached_result:
+        # CACHE HIT
+        server_stats['cache_hits'] += 1
+        msg.insert(tk.END, f"[CACHE HIT]: Using cached result\n")
+        stats = cache.get_stats()
+        msg.insert(tk.END, f"[CACHE INFO]: {stats['hit_rate']} hit rate, {stats['size']}/{stats['max_size']} entries\n")
+        auto_scroll(msg)
+        return cached_result
+    
+    # CACHE MISS - Process the file
+    msg.insert(tk.END, f"[CACHE MISS]: Processing new text\n")
+    auto_scroll(msg)
+    
+    updated_data = lexicon_check(file_content)
+    
+    # Now cache the result
+    cache.put(file_content, updated_data)
+    server_stats['requests_processed'] += 1
+    
+    stats = cache.get_stats()
+    msg.insert(tk.END, f"[CACHED]: Result stored in cache\n")
+    msg.insert(tk.END, f"[CACHE INFO]: {stats['hit_rate']} hit rate, {stats['size']}/{stats['max_size']} entries\n")
+    auto_scroll(msg)
+    return updated_data
+
+def lexicon_fingerprint():
+    """The lexicon version that conditional checks compare.
+    
+    A fingerprint of every lexicon event applied here, so two servers
+    that agree on it have the same lexicon (the load report's event
+    count can tie by chance).
+    """
+    vector = sorted(sync_manager.version_vector().items())
+    return hashlib.sha1(json.dumps(vector).encode(FORMAT)).hexdigest()[:16]
+
+def lookup_digest(digest, version):
+    """Conditional check: answer from the digest alone when possible.
+    
+    The client sends the digest of its document and the lexicon version
+    of the result it already holds. If that is still our version its
+    result stands ("unchanged"); if we have the document cached we send
+    the result; otherwise it is a miss and the client uploads in full.
+    """
+    current = lexicon_fingerprint()
+    if version == current:
+        msg.insert(tk.END, f"[UNCHANGED]: Client's result for {digest[:12]} is current\n")
+        auto_scroll(msg)
+        return {'unchanged': True, 'version': current}
+    corrected = cache.get_by_digest(digest)
+    if corrected is not None:
+        server_stats['cache_hits'] += 1
+        msg.insert(tk.END, f"[CACHE HIT]: Answered {digest[:12]} without an upload\n")
+        auto_scroll(msg)
+        return {'text': corrected, 'version': current}
+    return {'miss': True, 'version': current}
+
+def recheck_document(base, digest, edits, lead, trail):
+    """Incremental check: re-check only the tokens a client edited since base.
+    
+    The client sends the edits that turn a document we checked lately
+    (by digest) into its new version. We rebuild the new version, make
+    sure it has the digest the client claims, and check just the
+    replaced tokens; the answer is the patch to apply to the client's
+    copy of the old result, with the digest of the new result so the
+    client can tell its copy was right. If the lexicon changed since the
+    old check, every token is checked again, but still nothing is
+    uploaded. A miss (base unknown here, or edits that do not fit it)
+    means the client uploads in full.
+    """
+    current = lexicon_fingerprint()
+    state = documents.get(base)
+    if state is None:
+        return {'miss': True, 'version': current}
+    text, corrected, version = state
+    try:
+        tokens = apply_edits(split_document(text)[1], edits)
+        new_text = join_document(lead, tokens, trail)
+    except (ValueError, TypeError) as e:
+        msg.insert(tk.END, f"[INCREMENTAL]: Bad edits against {base[:12]}: {e}\n")
+        auto_scroll(msg)
+        return {'miss': True, 'version': current}
+    if content_digest(new_text) != digest:
+        msg.insert(tk.END, f"[INCREMENTAL]: Edits against {base[:12]} do not make {digest[:12]}\n")
+        auto_scroll(msg)
+        return {'miss': True, 'version': current}
+    
+    if version == current:
+        patch = [[start, end, [check_word(word) for word in replacement]] for start, end, replacement in edits]
+        updated_data = " ".join(apply_edits(corrected.split(" "), patch))
+        checked = sum(len(replacement) for _, _, replacement in edits)
+    else:
+        updated_data = lexicon_check(new_text)
+        patch = [[0, len(corrected.split(" ")), updated_data.split(" ")]]
+        checked = len(tokens)
+    documents.put(digest, new_text, updated_data, current)
+    cache.put(new_text, updated_data)
+    server_stats['requests_processed'] += 1
+    msg.insert(tk.END, f"[INCREMENTAL]: Re-checked {checked} of {len(tokens)} words for {digest[:12]}\n")
+    auto_scroll(msg)
+    return {'patch': patch, 'result': content_digest(updated_data), 'version': current}
+
+def apply_client_words(words_data, username):
+    """Apply a client's lexicon_response ("word" adds, "-word" removes).
+
+    Returns the reply for the client: "PollingSuccess", "NoNewWords",
+    or None when the client had nothing to send.
+    """
+    global lex_words_list
+    
+    if not words_data or words_data == "NO":
+        msg.insert(tk.END, f"[POLL]: {username} has no lexicon updates\n")
+        auto_scroll(msg)
+        return None
+    
+    new_words = words_data.split(',')
+    added_count = 0
+    added_words = []
+    removed_words = []
+    
+    # Add to global lexicon list ("-word" asks for a removal)
+    for word in new_words:
+        word = word.strip().lower()
+        if word.startswith('-'):
+            word = word[1:]
+            if word and word in lex_words_list:
+                lex_words_list.remove(word)
+                removed_words.append(word)
+        elif word and word not in lex_words_list:
+            lex_words_list.append(word)
+            added_words.append(word)
+            added_count += 1
+    
+    if not (added_count > 0 or removed_words):
+        return "NoNewWords"
+    
+    # Update lexicon file
+    save_lexicon()
+    
+    # Clear cache since lexicon changed
+    cache.clear()
+    
+    msg.insert(tk.END, f"[LEXICON UPDATE]: Added {added_count} new words from {username}\n")
+    msg.insert(tk.END, f"[NEW WORDS]: {', '.join(added_words[:5])}{'...' if len(added_words) > 5 else ''}\n")
+    if removed_words:
+        msg.insert(tk.END, f"[REMOVED WORDS]: {', '.join(removed_words[:5])}{'...' if len(removed_words) > 5 else ''}\n")
+    msg.insert(tk.END, f"[CACHE]: Cache cleared due to lexicon update\n")
+    
+    # BROADCAST TO OTHER SERVERS - THIS IS THE KEY PART
+    sync_manager.broadcast_update(added_words)
+    sync_manager.remove_words(removed_words)
+    msg.insert(tk.END, f"[SYNC]: Broadcasting {added_count + len(removed_words)} changes to peer servers\n")
+    
+    auto_scroll(msg)
+    return "PollingSuccess"
+
+def load_report():
+    """This server's load, sent to health monitors in reply to HEARTBEAT"""
+    now, cpu = time.time(), sum(os.times()[:2])
+    with load_lock:
+        last_now, last_cpu = cpu_sample
+        cpu_sample[:] = [now, cpu]
+        latencies = sorted(check_latencies)
+        queued = checks_in_progress
+    lookups = cache.hits + cache.misses
+    return {
+        'connections': len(clients) + pipeline_connections,
+        'queued': queued,
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2) if latencies else None,
+        'cache_hit_rate': round(cache.hits / lookups, 3) if lookups else None,
+        'lexicon_version': sum(sync_manager.version_vector().values()), # events seen; lower = missing some
+        'cpu': round((cpu - last_cpu) / max(now - last_now, 0.001), 3) # CPU seconds per second since last report
+    }
+
+def handle_pipeline(conn, addr, hello="PIPELINE"):
+    """A load balancer's pooled connection: id-tagged framed requests from many clients.
+    
+    The load balancer speaks the client protocol itself and multiplexes
+    its clients' checks and lexicon updates over a few of these
+    persistent connections; every response carries its request's id so
+    the balancer can route it back to the right client. The hello may
+    offer compression ("PIPELINE zlib"); we accept it if it is enabled.
+    """
+    global pipeline_connections
+    reply, wire = answer_pipeline_hello(hello, compression)
+    conn.send(reply)
+    with load_lock:
+        pipeline_connections += 1
+    heartbeat_msg.insert(tk.END, f"[PIPELINE] Pooled load balancer connection from {addr[0]}:{addr[1]}\n")
+    auto_scroll(heartbeat_msg)
+    try:
+        while True:
+            request = recv_message(conn, wire)
+            if request is None:
+                break
+            if request['op'] == 'check':
+                msg.insert(tk.END, f"[FILE]: {request['name']} from {request['user']} (request {request['id']}, via load balancer)\n")
+                auto_scroll(msg)
+                updated_data = check_text(request['content'])
+                if request.get('annotate'):
+                    response = {'id': request['id'], 'matches': lexicon_matches(request['content'], updated_data)}
+                else:
+                    response = {'id': request['id'], 'text': updated_data}
+            elif request['op'] == 'lexicon':
+                response = {'id': request['id'], 'reply': apply_client_words(request['words'], request['user'])}
+            elif request['op'] == 'lookup':
+                response = dict(lookup_digest(request['digest'], request['version']), id=request['id'])
+            elif request['op'] == 'recheck':
+                msg.insert(tk.END, f"[FILE]: {request['name']} from {request['user']} (incremental, request {request['id']})\n")
+                response = dict(recheck_document(request['base'], request['digest'], request['edits'],
+                                                 request['lead'], request['trail']), id=request['id'])
+            else:
+                response = {'id': request['id'], 'error': f"unknown op {request['op']!r}"}
+            send_message(conn, response, wire)
+    except (OSError, ValueError) as e:
+        msg.insert(tk.END, f"[PIPELINE]: Connection from {addr[0]}:{addr[1]} ended: {e}\n")
+        auto_scroll(msg)
+    finally:
+        with load_lock:
+            pipeline_connections -= 1
+        try:
+            conn.close()
+        except:
+            pass
+
 """This function handles the multiple clients and the process of lexicon spell check"""
 def handle_client(conn, addr):
     global lex_words_list, server_stats
@@ -151,12 +499,17 @@ def handle_client(conn, addr):
         
         # Check if it's a heartbeat
         if cname == "HEARTBEAT":
-            conn.send(b"ALIVE")
+            conn.send(b"ALIVE " + json.dumps(load_report(), separators=(',', ':')).encode(FORMAT))
             heartbeat_msg.insert(tk.END, f"[HEARTBEAT] Health check from monitor @ {addr[0]}:{addr[1]}\n")
             auto_scroll(heartbeat_msg)
             conn.close()
             return
         
+        if cname.split(" ")[0] == "PIPELINE":
+            conn.settimeout(None)
+            handle_pipeline(conn, addr, cname)
+            return
+        
         username = cname
         
         # Check for username collision
@@ -190,15 +543,16 @@ def handle_client(conn, addr):
             try:
                 # Set socket timeout for recv
                 conn.settimeout(60.0)  # 60 second timeout
-                data = conn.recv(SIZE)
+                raw = conn.recv(SIZE)
                 
-                if not data:
+                if not raw:
                     # Empty data means connection closed
                     msg.insert(tk.END, f"[DISCONNECT]: {username} connection closed (empty data)\n")
                     auto_scroll(msg)
                     break
                 
-                data = data.decode(FORMAT)
+                request = parse_file_request(raw) if raw[:1] in (b"Y", b"A") else None
+                data = (request[0] if request else raw).decode(FORMAT)
                 
                 if data == "Disconnect_Client":
                     msg.insert(tk.END, f"[DISCONNECT]: {username} requested disconnect\n")
@@ -213,101 +567,44 @@ def handle_client(conn, addr):
                     
                 elif data.startswith("lexicon_response:"):
                     # Client sending lexicon words back to server
-                    words_data = data[17:]  # Remove "lexicon_response:" prefix
+                    reply = apply_client_words(data[17:], username)  # Remove "lexicon_response:" prefix
+                    if reply:
+                        conn.send(reply.encode(FORMAT))
                     
-                    if words_data and words_data != "NO":
-                        new_words = words_data.split(',')
-                        added_count = 0
-                        added_words = []
-                        
-                        # Add to global lexicon list
-                        for word in new_words:
-                            word = word.strip().lower()
-                            if word and word not in lex_words_list:
-                                lex_words_list.append(word)
-                                added_words.append(word)
-                                added_count += 1
-                        
-                        if added_count > 0:
-                            # Update lexicon file
-                            with open(lex_file, 'w') as f:
-                                f.write(' '.join(lex_words_list))
-                            
-                            # Clear cache since lexicon changed
-                            cache.clear()
-                            
-                            msg.insert(tk.END, f"[LEXICON UPDATE]: Added {added_count} new words from {username}\n")
-                            msg.insert(tk.END, f"[NEW WORDS]: {', '.join(added_words[:5])}{'...' if len(added_words) > 5 else ''}\n")
-                            msg.insert(tk.END, f"[CACHE]: Cache cleared due to lexicon update\n")
-                            
-                            # BROADCAST TO OTHER SERVERS - THIS IS THE KEY PART
-                            sync_manager.broadcast_update(added_words)
-                            msg.insert(tk.END, f"[SYNC]: Broadcasting {added_count} words to peer servers\n")
-                            
-                            auto_scroll(msg)
-                            
-                            # Send confirmation to client
-                            conn.send("PollingSuccess".encode(FORMAT))
-                        else:
-                            conn.send("NoNewWords".encode(FORMAT))
-                    else:
-                        msg.insert(tk.END, f"[POLL]: {username} has no lexicon updates\n")
-                        auto_scroll(msg)
+                elif data.startswith("DIGEST "):
+                    # Conditional check: "DIGEST <digest> <lexicon version of the client's result, or ->"
+                    _, digest, version = (data + " -").split(" ")[:3]
+                    conn.send(lookup_reply(lookup_digest(digest, version)).encode(FORMAT))
                     
-                elif data[:1] == "Y":
-                    # Handle file spell check
+                elif data[:1] in ("Y", "A"):
+                    # Handle file spell check ("A": answer with the matches only)
                     filename = data[1:]
                     msg.insert(tk.END, f"[FILE]: {filename} uploaded by {username}\n")
                     auto_scroll(msg)
                     
-                    # Receive file content
-                    file_content = conn.recv(SIZE).decode(FORMAT)
+                    # Receive file content: the rest of a one-message request, else the next message
+                    if request:
+                        _, length, content = request
+                        if len(content) < length:
+                            content += recv_exact(conn, length - len(content)) or b""
+                        file_content = content.decode(FORMAT)
+                    else:
+                        file_content = conn.recv(SIZE).decode(FORMAT)
                     
                     msg.insert(tk.END, f"[RECEIVED]: File content ({len(file_content)} chars)\n")
                     auto_scroll(msg)
                     
-                    # Check cache first (cache key is the file content)
-                    cached_result = cache.get(file_content)
-                    
-                    if cached_result:
-                        # CACHE HIT
-                        server_stats['cache_hits'] += 1
-                        msg.insert(tk.END, f"[CACHE HIT]: Using cached result\n")
-                        stats = cache.get_stats()
-                        msg.insert(tk.END, f"[CACHE INFO]: {stats['hit_rate']} hit rate, {stats['size']}/{stats['max_size']} entries\n")
-                        auto_scroll(msg)
-                        updated_data = cached_result
-                    else:
-                        # CACHE MISS - Process the file
-                        msg.insert(tk.END, f"[CACHE MISS]: Processing new text\n")
-                        auto_scroll(msg)
-                        
-                        # Process with lexicon_check (but without cache - we'll cache here)
-                        # Temporarily remove cache from lexicon_check
-                        words = file_content.strip().split(" ")
-                        updated_data = []
-                        for word in words:
-                            # Remove punctuation for checking but keep it in output
-                            clean_word = word.strip('.,!?;:').lower()
-                            if clean_word in lex_words_list:
-                                updated_data.append(f"[{word}]")
-                            else:
-                                updated_data.append(word)
-                        updated_data = " ".join(updated_data)
-                        
-                        # Now cache the result
-                        cache.put(file_content, updated_data)
-                        server_stats['requests_processed'] += 1
-                        
-                        stats = cache.get_stats()
-                        msg.insert(tk.END, f"[CACHED]: Result stored in cache\n")
-                        msg.insert(tk.END, f"[CACHE INFO]: {stats['hit_rate']} hit rate, {stats['size']}/{stats['max_size']} entries\n")
-                        auto_scroll(msg)
+                    updated_data = check_text(file_content)
                     
                     # Send back to client
-                    response = "check" + updated_data
-                    conn.send(response.encode(FORMAT))
-                    msg.insert(tk.END, f"[SENT]: Corrected text sent to {username}\n")
+                    if data[:1] == "A":
+                        matches = lexicon_matches(file_content, updated_data)
+                        conn.send(matches_reply(matches).encode(FORMAT))
+                        msg.insert(tk.END, f"[SENT]: {len(matches)} matches sent to {username}\n")
+                    else:
+                        response = "check" + updated_data
+                        conn.send(response.encode(FORMAT))
+                        msg.insert(tk.END, f"[SENT]: Corrected text sent to {username}\n")
                     msg.insert(tk.END, "-" * 60 + "\n")
                     auto_scroll(msg)
                     
@@ -344,7 +641,7 @@ def handle_client(conn, addr):
 
 def connect():
     """Main server listening function"""
-    SERVER.listen(5)
+    SERVER.listen(128)  # a burst of connects should queue, not get refused
     msg.insert(tk.END, f"[LISTENING] Server {NODE_ID} listening on {IP}:{PORT}\n")
     auto_scroll(msg)
     
@@ -379,35 +676,43 @@ def periodic_updates():
         except:
             pass
 
-def handle_sync_updates():
-    """Check for sync updates from other servers and update our lexicon"""
-    global lex_words_list
-    
-    while True:
-        time.sleep(2)  # Check every 2 seconds
+def register_with_balancer():
+    """Keep this server registered with the load balancer until it starts leaving"""
+    registered = False
+    while not leaving.is_set():
         try:
-            # Check if sync manager received any updates
-            # This is a passive check - the sync manager's listener handles the actual receiving
-            # We just need to reload the lexicon if it was updated
-            with open(lex_file, 'r') as f:
-                current_lexicon = f.read().strip().split()
-            
-            # If lexicon changed, update our in-memory list
-            if len(current_lexicon) != len(lex_words_list):
-                lex_words_list = current_lexicon
-                msg.insert(tk.END, f"[SYNC RECEIVED]: Lexicon updated from peer server\n")
-                msg.insert(tk.END, f"[LEXICON]: Now tracking {len(lex_words_list)} words\n")
-                cache.clear()  # Clear cache since lexicon changed
+            with register_lock:
+                if leaving.is_set():
+                    break
+                reply = control_request(LB_CONTROL, {'op': 'register', 'host': IP, 'port': PORT})
+            if reply.get('ok') and not registered:
+                msg.insert(tk.END, f"[REGISTERED]: With load balancer at {LB_CONTROL[0]}:{LB_CONTROL[1]}\n")
                 auto_scroll(msg)
-        except:
-            pass
-
-# Then start this thread after the periodic_updates thread (around line 430):
-sync_thread = threading.Thread(target=handle_sync_updates, daemon=True)
-sync_thread.start()
+            registered = reply.get('ok', False)
+        except (OSError, ValueError):
+            registered = False  # load balancer not up yet; try again next round
+        leaving.wait(REGISTER_INTERVAL)
+
+def leave():
+    """Deregister and wait for the load balancer to drain our in-flight work, then close"""
+    leaving.set()
+    with register_lock:
+        pass # a register already on its way lands before the deregister, not during the drain
+    if LB_CONTROL:
+        msg.insert(tk.END, "[LEAVING]: Draining in-flight requests before shutdown\n")
+        auto_scroll(msg)
+        try:
+            control_request(LB_CONTROL, {'op': 'deregister', 'host': IP, 'port': PORT, 'drain': True, 'wait': True},
+                            timeout=60)
+        except (OSError, ValueError):
+            pass  # no load balancer to drain from
+    window.after(0, window.destroy)
 
 # GUI Setup
 window = tk.Tk()
+window.protocol("WM_DELETE_WINDOW", lambda: threading.Thread(target=leave, daemon=True).start())
+# SIGTERM (the autoscaler stopping us) leaves the same way as closing the window
+signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=leave, daemon=True).start())
 window.title(f"SERVER NODE: {NODE_ID} | Port: {PORT} | Sync Port: {SYNC_PORT}")
 window.configure(bg='#E8F4FD')
 window.geometry("1200x600")  # Set larger default size
@@ -486,6 +791,8 @@ msg.insert(tk.END, f"Main Port: {PORT}")
 msg.insert(tk.END, f"Sync Port: {SYNC_PORT}")
 msg.insert(tk.END, f"Cache Size: {cache.max_size} entries")
 msg.insert(tk.END, f"Lexicon loaded: {len(lex_words_list)} words")
+if BLOOM_MODE:
+    msg.insert(tk.END, f"Bloom filter: {lex_words_list.bloom.memory_bytes() / 1048576:.1f} MB, target error rate {args.bloom_error_rate}")
 msg.insert(tk.END, "=" * 80)
 
 # Start server listening thread
@@ -498,12 +805,14 @@ update_thread = threading.Thread(target=periodic_updates)
 update_thread.daemon = True
 update_thread.start()
 
+# Register with the load balancer so it starts sending us clients
+if LB_CONTROL:
+    threading.Thread(target=register_with_balancer, daemon=True).start()
+
 # Run GUI
 tk.mainloop()
 
 # Save lexicon when server closes
-with open(lex_file, 'w+') as f:
-    write_to_file = ' '.join(lex_words_list)
-    f.write(write_to_file)
+save_lexicon()
 
 SERVER.close()
\ No newline at end of file
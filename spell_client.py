@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+"""
+Spell Checker Client Library
+Headless asyncio client over pooled pipelined connections, with timeouts and retries, plus a command-line tool
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import sys
+import time
+from protocol import (write_message, read_message, content_digest, render_matches, Compression, pipeline_hello,
+                      pipeline_accepted)
+from result_cache import ResultCache, SourceHistory
+from incremental import diff_document, apply_patch
+
+class SpellCheckError(Exception):
+    """The cluster answered a request with an error, or never answered it within the retries"""
+
+class PipelineConnection:
+    """One connection in pipeline mode to a server or load balancer.
+
+    Requests are framed and tagged with an id, so many can be
+    outstanding at once; a reader task resolves each one's future when
+    its response arrives. If the connection drops, every request still
+    waiting on it fails with ConnectionError.
+    """
+
+    def __init__(self, reader, writer, compression=None):
+        self.reader = reader
+        self.writer = writer
+        self.compression = compression  # as agreed at the handshake
+        self.pending = {}  # request id -> future
+        self.assigned = 0  # requests handed to this connection and not yet finished (some not yet written)
+        self.ids = itertools.count(1)
+        self.alive = True
+        self.task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    @classmethod
+    async def open(cls, address, timeout=5, compression=None):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(*address), timeout)
+        try:
+            writer.write(pipeline_hello(compression))
+            reply = await asyncio.wait_for(reader.read(1024), timeout)
+        except (OSError, asyncio.TimeoutError):
+            writer.close()
+            raise
+        accepted, compression = pipeline_accepted(reply, compression)
+        if not accepted:
+            writer.close()
+            raise ConnectionError(f"{address[0]}:{address[1]} refused pipeline mode: {reply!r}")
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return cls(reader, writer, compression)
+
+    async def request(self, message):
+        """Send one request and wait for its response"""
+        if not self.alive:
+            raise ConnectionError("connection is closed")
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            write_message(self.writer, dict(message, id=request_id), self.compression)
+            await self.writer.drain()
+            return await future
+        except OSError:
+            self._fail()
+            raise
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                response = await read_message(self.reader, self.compression)
+                if response is None:
+                    break
+                future = self.pending.get(response.get('id'))
+                if future and not future.done():
+                    future.set_result(response)
+        except (OSError, ValueError):
+            pass
+        finally:
+            self._fail()
+
+    def _fail(self):
+        if not self.alive:
+            return
+        self.alive = False
+        self.writer.close()
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("connection lost"))
+
+    async def close(self):
+        self._fail()
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+
+class SpellClient:
+    """Check documents and update the lexicon from any asyncio program.
+
+    Connections to address (a server, or the load balancer) are opened
+    on demand, up to pool_size, and reused: a request takes an idle
+    connection if there is one and is pipelined onto the least busy
+    otherwise, so thousands of concurrent checks share a few sockets.
+    Every attempt is bounded by timeout seconds. A lost connection or a
+    timeout is retried up to retries times after an exponential backoff
+    starting at backoff seconds, and a BUSY answer is retried after the
+    wait it advises. Use it as an async context manager, or call close().
+
+    With cache_dir, results are kept on disk by content digest and
+    lexicon version, and a check first sends only the digest: the
+    server confirms the stored result is current, answers from its own
+    cache, or asks for the upload. A document checked before under the
+    same name with different content is sent as edits to that version
+    instead, and the answer patches the stored result.
+
+    Frames of compress_threshold bytes or more are zlib-compressed when
+    the other end agrees (None turns compression off). With annotate,
+    uploads are answered with the matched words' spans only, and the
+    brackets are put in here.
+    """
+
+    def __init__(self, address=('localhost', 7520), user="sdk", pool_size=4, timeout=30.0,
+                 connect_timeout=5.0, retries=3, backoff=0.2, cache_dir=None, compress_threshold=512,
+                 annotate=False):
+        self.address = address
+        self.user = user
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.connections = []
+        self.opening = None  # lock against opening more connections than pool_size at once
+        self.results = ResultCache(cache_dir) if cache_dir else None
+        self.sources = SourceHistory(os.path.join(cache_dir, "sources")) if cache_dir else None
+        self.compression = Compression(compress_threshold) if compress_threshold else None
+        self.annotate = annotate
+        self.stats = {'requests': 0, 'retries': 0, 'busy': 0, 'connections_opened': 0,
+                      'unchanged': 0, 'server_cached': 0, 'uploaded': 0, 'patched': 0}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def check(self, text, name="text.txt"):
+        """Spell check a document; returns the text with lexicon words in brackets"""
+        if self.results is None:
+            return await self._upload(text, name)
+        digest = content_digest(text)
+        previous = self.sources.previous(name)
+        if previous is not None and previous != text:
+            patched = await self._recheck(previous, text, name)
+            if patched is not None:
+                version, corrected = patched
+                self.results.put(digest, version, corrected)
+                self.sources.remember(name, text)
+                return corrected
+        version, stored = self.results.latest(digest)
+        response = await self._call({'op': 'lookup', 'user': self.user, 'digest': digest, 'version': version or "-"})
+        if response.get('unchanged') and stored is not None:
+            self.stats['unchanged'] += 1
+            corrected = stored
+        elif 'text' in response:
+            self.stats['server_cached'] += 1
+            corrected = response['text']
+        else:
+            corrected = await self._upload(text, name)
+        self.results.put(digest, response['version'], corrected)
+        self.sources.remember(name, text)
+        return corrected
+
+    async def _recheck(self, previous, text, name):
+        """Check text as edits to previous; (lexicon version, result), or None to check it in full"""
+        base = content_digest(previous)
+        _, stored = self.results.latest(base)
+        change = diff_document(previous, text) if stored is not None else None
+        if change is None:
+            return None
+        response = await self._call(dict(change, op='recheck', user=self.user, name=name, base=base,
+                                         digest=content_digest(text)))
+        if 'patch' not in response:
+            return None  # the server no longer has the old version
+        try:
+            corrected = apply_patch(stored, response['patch'])
+        except ValueError:
+            return None
+        if content_digest(corrected) != response['result']:
+            return None  # our stored result was not what the server had for the old version
+        self.stats['patched'] += 1
+        return response['version'], corrected
+
+    async def _upload(self, text, name):
+        self.stats['uploaded'] += 1
+        if self.annotate:
+            return render_matches(text, await self.matches(text, name))
+        response = await self._call({'op': 'check', 'user': self.user, 'name': name, 'content': text})
+        return response['text']
+
+    async def matches(self, text, name="text.txt"):
+        """The lexicon words in a document, as (offset, length, lexicon entry) character spans into text.
+        
+        The server sends only these, not the document back; pass them to
+        protocol.render_matches for the bracketed text.
+        """
+        response = await self._call({'op': 'check', 'user': self.user, 'name': name, 'content': text,
+                                     'annotate': True})
+        if 'matches' not in response:
+            # A server from before annotation-only checks sends the whole text back instead
+            raise SpellCheckError("server does not support annotation-only checks")
+        return [tuple(match) for match in response['matches']]
+
+    async def check_file(self, path, out_dir=None):
+        """Spell check a file; with out_dir, also save the result there as corrected_<name>.txt"""
+        with open(path, "r") as f:
+            text = f.read()
+        name = os.path.basename(path)
+        corrected = await self.check(text, name)
+        if out_dir is not None:
+            base_name = name.replace('.txt', '')
+            with open(os.path.join(out_dir, f"corrected_{base_name}.txt"), "w") as f:
+                f.write(corrected)
+        return corrected
+
+    async def add_words(self, words):
+        """Add words to the lexicon on every server ("-word" removes one).
+
+        Returns the server's reply: "PollingSuccess", or "NoNewWords" if
+        it already had them all.
+        """
+        if isinstance(words, str):
+            words = [words]
+        words = [word.strip() for word in words if word.strip()]
+        if not words:
+            return None
+        response = await self._call({'op': 'lexicon', 'user': self.user, 'words': ",".join(words)})
+        return response.get('reply')
+
+    async def _call(self, message):
+        self.stats['requests'] += 1
+        failures = 0
+        while True:
+            try:
+                conn = await self._connection()
+                conn.assigned += 1
+                try:
+                    response = await asyncio.wait_for(conn.request(message), self.timeout)
+                finally:
+                    conn.assigned -= 1
+            except (OSError, asyncio.TimeoutError) as e:
+                failures += 1
+                if failures > self.retries:
+                    raise SpellCheckError(f"{message['op']} failed after {failures} attempts: "
+                                          f"{str(e) or type(e).__name__}") from e
+                self.stats['retries'] += 1
+                await asyncio.sleep(self.backoff * 2 ** (failures - 1))
+                continue
+            if 'busy' in response:
+                # The load balancer shed this request: come back when it says to
+                self.stats['busy'] += 1
+                await asyncio.sleep(response['busy'])
+                continue
+            if 'error' in response:
+                raise SpellCheckError(response['error'])
+            return response
+
+    async def _connection(self):
+        self.connections = [conn for conn in self.connections if conn.alive]
+        idle = [conn for conn in self.connections if not conn.assigned]
+        if idle:
+            return idle[0]
+        if self.opening is None:
+            self.opening = asyncio.Lock()
+        async with self.opening:
+            self.connections = [conn for conn in self.connections if conn.alive]
+            if len(self.connections) < self.pool_size:
+                conn = await PipelineConnection.open(self.address, self.connect_timeout, self.compression)
+                self.connections.append(conn)
+                self.stats['connections_opened'] += 1
+                return conn
+        return min(self.connections, key=lambda conn: conn.assigned)
+
+    async def close(self):
+        connections, self.connections = self.connections, []
+        for conn in connections:
+            await conn.close()
+
+async def check_files(client, paths, out_dir, concurrency, spans=False):
+    """Check many files at once, at most concurrency in flight; returns the number that failed.
+    
+    With spans, each file's matches are printed as a line of JSON instead of its checked text.
+    """
+    slots = asyncio.Semaphore(concurrency)
+    failed = 0
+
+    async def check_one(path):
+        nonlocal failed
+        async with slots:
+            try:
+                if spans:
+                    if path == "-":
+                        text = sys.stdin.read()
+                    else:
+                        with open(path, "r") as f:
+                            text = f.read()
+                    matches = await client.matches(text, os.path.basename(path))
+                elif path == "-":
+                    corrected = await client.check(sys.stdin.read(), "stdin.txt")
+                else:
+                    corrected = await client.check_file(path, out_dir)
+            except (OSError, SpellCheckError) as e:
+                failed += 1
+                print(f"[ERROR] {path}: {e}", file=sys.stderr)
+                return
+        if spans:
+            print(json.dumps({'file': path, 'matches': matches}))
+        elif out_dir is None:
+            if len(paths) > 1:
+                print(f"==> {path} <==")
+            print(corrected)
+
+    await asyncio.gather(*(check_one(path) for path in paths))
+    return failed
+
+async def run(args):
+    host, port = args.server.rsplit(':', 1)
+    async with SpellClient((host, int(port)), user=args.user, pool_size=args.pool_size,
+                           timeout=args.timeout, retries=args.retries, cache_dir=args.cache_dir,
+                           compress_threshold=args.compress_threshold, annotate=args.annotate) as client:
+        if args.command == 'add':
+            try:
+                print(await client.add_words(args.words))
+            except (OSError, SpellCheckError) as e:
+                print(f"[ERROR] {e}", file=sys.stderr)
+                return 1
+            return 0
+
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+        start_time = time.time()
+        failed = await check_files(client, args.files, args.out, args.concurrency, args.spans)
+        elapsed = time.time() - start_time
+        done = len(args.files) - failed
+        print(f"[DONE] {done}/{len(args.files)} files in {elapsed:.2f}s ({done / max(elapsed, 1e-9):.1f} files/s), "
+              f"{client.stats['retries']} retries, {client.stats['busy']} busy", file=sys.stderr)
+        wire = client.compression.snapshot() if client.compression else None
+        if wire and wire['bytes_in']:
+            print(f"[DONE] Compression: sent {wire['bytes_in'] / 1024:.0f} KB as {wire['bytes_on_wire'] / 1024:.0f} KB, "
+                  f"received {wire['bytes_received'] / 1024:.0f} KB for {wire['bytes_decompressed'] / 1024:.0f} KB; "
+                  f"{wire['compress_ms_per_mb']:.1f} ms CPU per MB compressed, "
+                  f"{wire['decompress_ms_per_mb']:.1f} ms per MB inflated", file=sys.stderr)
+        if client.results is not None:
+            print(f"[DONE] {client.stats['unchanged']} unchanged, {client.stats['server_cached']} from the server "
+                  f"cache, {client.stats['patched']} patched from edits, {client.stats['uploaded']} uploaded",
+                  file=sys.stderr)
+        return 1 if failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Spell check files or update the lexicon without the GUI")
+    parser.add_argument('--server', default="localhost:7520", help="server or load balancer (host:port)")
+    parser.add_argument('--user', default="cli")
+    parser.add_argument('--pool-size', type=int, default=4, help="connections to keep open")
+    parser.add_argument('--timeout', type=float, default=30, help="seconds to wait for each answer")
+    parser.add_argument('--retries', type=int, default=3, help="resends after a lost connection or timeout")
+    parser.add_argument('--compress-threshold', type=int, default=512,
+                        help="zlib-compress frames of at least this many bytes if the server agrees (0 = never)")
+    parser.add_argument('--annotate', action='store_true',
+                        help="have the server send only the matched words' offsets and bracket them here")
+    parser.add_argument('--cache-dir', help="keep results here and send only digests for documents seen before, "
+                                            "or only the edits to ones changed since (e.g. client/cache/)")
+    commands = parser.add_subparsers(dest='command', required=True)
+    check = commands.add_parser('check', help="spell check files ('-' reads stdin)")
+    check.add_argument('files', nargs='+')
+    check.add_argument('--out', help="save corrected_<name>.txt files here instead of printing them")
+    check.add_argument('--concurrency', type=int, default=32, help="checks in flight at once")
+    check.add_argument('--spans', action='store_true',
+                       help="print each file's matches as JSON ({file, matches: [[offset, length, entry]]})")
+    add = commands.add_parser('add', help="add words to the lexicon, or remove them with --remove")
+    add.add_argument('words', nargs='*')
+    add.add_argument('--remove', nargs='+', default=[], metavar='WORD', help="words to take out of the lexicon")
+    args = parser.parse_args()
+    if args.command == 'add':
+        if not args.words and not args.remove:
+            add.error("give words to add or --remove")
+        args.words += ['-' + word for word in args.remove] # the wire form of a removal
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
@@ -7,89 +7,726 @@ import socket
 import threading
 import time
 import json
+import queue
+import random
+import os
+import math
+import argparse
+import zlib
+from collections import OrderedDict, deque
+from protocol import send_message, recv_message, send_frame, recv_frame, Compression, CODEC
+from merkle_tree import LexiconMerkleTree
+from lexicon_crdt import LexiconORSet, encode_chunk, decode_chunk
+from membership import GossipMembership
+
+def offer_compression(sock, compression, timeout=2):
+    """Open a sync connection with a hello offering compression; returns what the peer agreed to (or None)"""
+    if compression is None:
+        return None
+    send_message(sock, {'type': 'hello', 'compression': [CODEC]})
+    previous = sock.gettimeout()
+    sock.settimeout(timeout)
+    try:
+        reply = recv_message(sock)
+    except socket.timeout:
+        reply = None  # a peer from before compression ignores the hello
+    finally:
+        sock.settimeout(previous)
+    return compression if reply and reply.get('compression') == CODEC else None
+
+class PeerConnection:
+    """Long-lived connection to one peer with reconnect and exponential backoff"""
+    
+    def __init__(self, address, connect_timeout=2, min_backoff=0.5, max_backoff=30, compression=None):
+        self.address = address
+        self.compression = compression  # offered at connect
+        self.wire = None  # what this connection agreed to
+        self.connect_timeout = connect_timeout
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.sock = None
+        self.backoff = min_backoff
+        self.next_attempt = 0
+        self.lock = threading.Lock()
+        
+    def connected(self):
+        return self.sock is not None
+        
+    def _connect(self):
+        sock = socket.create_connection(self.address, timeout=self.connect_timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.settimeout(None)
+        try:
+            self.wire = offer_compression(sock, self.compression, self.connect_timeout)
+        except (OSError, ValueError):
+            sock.close()
+            raise
+        self.sock = sock
+        self.backoff = self.min_backoff
+        print(f"[SYNC] Connected to peer {self.address[0]}:{self.address[1]}")
+        
+    def _fail(self, error):
+        self.close()
+        self.next_attempt = time.time() + self.backoff
+        print(f"[SYNC] Peer {self.address[0]}:{self.address[1]} unavailable ({error}), retrying in {self.backoff:.1f}s")
+        self.backoff = min(self.backoff * 2, self.max_backoff)
+        
+    def send(self, message):
+        """Send a message, reconnecting if needed. Returns False while the peer is down."""
+        with self.lock:
+            if self.sock is None:
+                if time.time() < self.next_attempt:
+                    return False
+                try:
+                    self._connect()
+                except OSError as e:
+                    self._fail(e)
+                    return False
+            try:
+                send_message(self.sock, message, self.wire)
+                return True
+            except OSError as e:
+                self._fail(e)
+                return False
+                
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except:
+                pass
+            self.sock = None
 
 class SyncManager:
-    def __init__(self, node_id, lexicon_file, sync_port=8000):
+    """Lexicon replication for a cluster of any size.
+    
+    Membership and updates spread by gossip: every round a node sends its
+    membership table to `fanout` random live members, and each new delta
+    becomes a rumor that every receiver forwards once to `fanout` others,
+    so it reaches all N nodes in O(log N) hops without a full mesh.
+    Periodic Merkle anti-entropy repairs anything a rumor missed.
+    
+    A node with no saved state, or one that anti-entropy finds far behind,
+    pulls a compressed snapshot of a peer's whole state instead.
+    
+    Connection readers only decode: received deltas and anti-entropy
+    repairs go through a bounded queue to a single applier, which joins
+    whatever deltas are queued into one merge and persists the state at
+    most every save_interval seconds, so a slow disk backs up the queue
+    instead of stalling the readers.
+    """
+    
+    def __init__(self, node_id, lexicon_file, sync_port=8000, batch_window=0.05, anti_entropy_interval=10,
+                 state_file=None, on_change=None, host='localhost', fanout=3, gossip_interval=1,
+                 max_connections=8, suspect_after=5, dead_after=15, snapshot_threshold=0.25,
+                 snapshot_chunk=50000, apply_queue_size=1024, apply_batch=256, save_interval=1,
+                 compress_threshold=512):
         self.node_id = node_id
         self.lexicon_file = lexicon_file
         self.sync_port = sync_port
-        self.peers = []  # List of peer servers
-        self.lexicon_version = 0
+        self.address = (host, sync_port)
+        self.batch_window = batch_window  # seconds to coalesce updates into one message
+        self.anti_entropy_interval = anti_entropy_interval
+        self.fanout = fanout
+        self.gossip_interval = gossip_interval
+        self.max_connections = max_connections  # pooled peer sockets kept open
+        self.snapshot_threshold = snapshot_threshold  # fraction of differing leaves that triggers a snapshot
+        self.snapshot_chunk = snapshot_chunk  # words per compressed snapshot frame
+        self.apply_batch = apply_batch  # most queued deltas joined into one merge
+        self.save_interval = save_interval  # seconds between state file writes
+        # zlib for gossip and anti-entropy frames, offered on every connection we open (snapshots compress their own)
+        self.compression = Compression(compress_threshold) if compress_threshold > 0 else None
+        self.state_file = state_file or f"{os.path.splitext(lexicon_file)[0]}.{node_id}.crdt.json"
+        self.on_change = on_change  # callback(added_words, removed_words) for remote changes
+        self.membership = GossipMembership(node_id, self.address, suspect_after, dead_after)
+        self.connections = OrderedDict()  # peer address -> PeerConnection, least recently used first
+        self.connections_lock = threading.Lock()
+        self.outbox = queue.Queue()
+        self.forward_queue = queue.Queue()  # (rumors, sender) to pass on
+        self.apply_queue = queue.Queue(maxsize=apply_queue_size)  # (delta, source, time queued, buckets, reply)
+        self.apply_latencies = deque(maxlen=1000)  # seconds from queued to applied
+        self.rumor_seq = 0
+        self.active_rumors = {}  # rumor id -> [rumor, rounds left]
+        self.seen_rumors = {}  # rumor id -> time first seen
+        self.rumor_lock = threading.Lock()
         self.running = False
         self.sync_socket = None
         self.listener_thread = None
+        self.sender_thread = None
+        self.anti_entropy_thread = None
+        self.apply_thread = None
+        self.stats = {
+            'batches_sent': 0,
+            'words_sent': 0,
+            'updates_coalesced': 0,
+            'anti_entropy_rounds': 0,
+            'words_repaired': 0,
+            'anti_entropy_bytes': 0,
+            'gossip_messages': 0,
+            'rumors_received': 0,
+            'duplicate_rumors': 0,
+            'max_rumor_hops': 0,
+            'snapshots_sent': 0,
+            'snapshots_received': 0,
+            'snapshot_bytes': 0,
+            'last_snapshot_seconds': 0,
+            'apply_batches': 0,
+            'deltas_applied': 0,
+            'max_apply_queue': 0,
+            'state_saves': 0
+        }
         
-    def add_peer(self, peer_address):
-        """Add a peer server to sync with"""
-        if peer_address not in self.peers:
-            self.peers.append(peer_address)
-            print(f"[SYNC] Added peer: {peer_address}")
+        # Replicated lexicon, plus a Merkle tree over its words and dots
+        self.lexicon_lock = threading.Lock()
+        self.state_dirty = False
+        self.last_save = 0
+        self.bootstrapping = not os.path.exists(self.state_file)
+        self.lexicon = self._load_lexicon()
+        self.tree = self._build_tree(self.lexicon)
             
-    def broadcast_update(self, new_words):
-        """Send lexicon updates to all peers"""
-        if not new_words:
-            return
+    def _load_lexicon(self):
+        """Restore the CRDT state; a first start begins empty and bootstraps in start()"""
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as f:
+                return LexiconORSet.from_state(self.node_id, json.load(f))
+        return LexiconORSet(self.node_id)
+        
+    @staticmethod
+    def _build_tree(lexicon):
+        tree = LexiconMerkleTree()
+        tree.add_many((word, lexicon.tag(word)) for word in lexicon)
+        return tree
+        
+    def _seed_from_file(self):
+        """First node of a cluster: seed the CRDT from the plain lexicon file"""
+        with open(self.lexicon_file, 'r') as f:
+            words = f.read().split()
+        with self.lexicon_lock:
+            self.lexicon.seed(words)
+            for word in words:
+                self._retag(word)
+            self._save_state()
+        print(f"[SYNC] Seeded {len(self.lexicon)} words from {self.lexicon_file}")
+        
+    def _save_state(self):
+        """Mark the CRDT state for the applier to persist (caller holds lexicon_lock)"""
+        self.state_dirty = True
+        
+    def _flush_state(self):
+        """Write the CRDT state file; only the encoding happens under lexicon_lock"""
+        with self.lexicon_lock:
+            if not self.state_dirty:
+                return
+            state = self.lexicon.state()
+            self.state_dirty = False
+        tmp_file = self.state_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            f.write(json.dumps(state))
+        os.replace(tmp_file, self.state_file)
+        self.last_save = time.time()
+        self.stats['state_saves'] += 1
+        
+    def add_peer(self, peer_address):
+        """Add a seed node; the rest of the cluster is discovered by gossip"""
+        self.membership.add_seed(peer_address)
+        print(f"[SYNC] Added seed: {peer_address}")
+        
+    def _connection(self, address):
+        """Pooled connection to a peer, closing the least recently used beyond max_connections"""
+        with self.connections_lock:
+            peer = self.connections.get(address)
+            if peer is None:
+                peer = self.connections[address] = PeerConnection(address, compression=self.compression)
+            self.connections.move_to_end(address)
+            while len(self.connections) > self.max_connections:
+                _, evicted = self.connections.popitem(last=False)
+                evicted.close()
+            return peer
             
-        self.lexicon_version += 1
+    def _send_gossip(self, targets, rumors=(), members=False):
+        """Send one gossip message to each target; returns how many were delivered"""
         message = {
-            'type': 'lexicon_update',
+            'type': 'gossip',
             'from': self.node_id,
-            'version': self.lexicon_version,
-            'words': list(new_words)
+            'addr': list(self.address),
+            'heartbeat': self.membership.heartbeat,
+            'generation': self.membership.generation,
+            'rumors': list(rumors)
         }
+        if members:
+            message['members'] = self.membership.digest()
+        delivered = 0
+        for address in targets:
+            if self._connection(address).send(message):
+                delivered += 1
+                self.stats['gossip_messages'] += 1
+        return delivered
+        
+    def _rumor_rounds(self):
+        """How many gossip rounds a rumor stays active: enough for log2(N) hops plus slack"""
+        return int(math.ceil(math.log2(len(self.membership.alive()) + 2))) + 1
+            
+    def _local_update(self, delta_fn, words):
+        with self.lexicon_lock:
+            delta = delta_fn(words)
+            for word in words:
+                self._retag(word)
+            self._save_state()
+        self.outbox.put(delta)
         
-        print(f"[SYNC] Broadcasting {len(new_words)} new words to {len(self.peers)} peers")
+    def broadcast_update(self, new_words):
+        """Record locally added words and queue the delta for all peers"""
+        if not new_words:
+            return
+        self._local_update(self.lexicon.add, list(new_words))
+        
+    def remove_words(self, words):
+        """Record locally removed words and queue the delta for all peers"""
+        if not words:
+            return
+        self._local_update(self.lexicon.remove, list(words))
         
-        for peer_host, peer_port in self.peers:
+    def _retag(self, word):
+        """Refresh a word's Merkle leaf after its dots changed (caller holds lexicon_lock)"""
+        if word in self.lexicon:
+            self.tree.add(word, self.lexicon.tag(word))
+        else:
+            self.tree.discard(word)
+            
+    def _collect_batch(self):
+        """Block for the first delta, then join whatever arrives within the batch window"""
+        try:
+            delta = self.outbox.get(timeout=1)
+        except queue.Empty:
+            return None
+        batch = LexiconORSet(self.node_id)
+        batch.merge(delta)
+        removed = list(delta.get('r', ()))
+        updates = 1
+        deadline = time.time() + self.batch_window
+        while True:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                delta = self.outbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.merge(delta)
+            removed.extend(delta.get('r', ()))
+            updates += 1
+        self.stats['updates_coalesced'] += updates - 1
+        return dict(batch.state(), r=removed)
+        
+    def _sender_loop(self):
+        """Turn each batch of local deltas into a rumor and push it to fanout members"""
+        while self.running:
+            delta = self._collect_batch()
+            if not delta:
+                continue
+            self.rumor_seq += 1
+            rumor = {'id': [self.node_id, self.rumor_seq], 'hops': 0, 'delta': delta}
+            rumor_id = (self.node_id, self.rumor_seq)
+            with self.rumor_lock:
+                self.seen_rumors[rumor_id] = time.time()
+                self.active_rumors[rumor_id] = [rumor, self._rumor_rounds()]
+            targets = self.membership.pick(self.fanout)
+            if self._send_gossip(targets, [rumor]):
+                self.stats['batches_sent'] += 1
+                self.stats['words_sent'] += sum(len(items) for items in delta['e'].values())
+                    
+    def _forward_loop(self):
+        """Pass freshly received rumors on, off the connection reader threads"""
+        while self.running:
             try:
-                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                sock.settimeout(2)
-                sock.connect((peer_host, peer_port))
-                sock.send(json.dumps(message).encode())
-                sock.close()
-                print(f"[SYNC] Successfully sent update to {peer_host}:{peer_port}")
-            except Exception as e:
-                print(f"[SYNC] Failed to send to {peer_host}:{peer_port}: {e}")
+                rumors, sender = self.forward_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            self._send_gossip(self.membership.pick(self.fanout, exclude={sender}), rumors)
+            
+    def _gossip_loop(self):
+        """Heartbeat, failure detection, membership exchange and rumor re-sends"""
+        while self.running:
+            time.sleep(self.gossip_interval)
+            self.membership.beat()
+            for address, status in self.membership.detect_failures():
+                print(f"[SYNC] Member {address[0]}:{address[1]} is now {status}")
                 
-    def receive_update(self, message):
-        """Process lexicon update from peer"""
-        try:
-            if message['version'] > self.lexicon_version:
-                # Update our lexicon with new words
-                new_words = message['words']
+            now = time.time()
+            with self.rumor_lock:
+                rumors = []
+                for rumor_id, entry in list(self.active_rumors.items()):
+                    rumors.append(entry[0])
+                    entry[1] -= 1
+                    if entry[1] <= 0:
+                        del self.active_rumors[rumor_id]
+                for rumor_id, seen in list(self.seen_rumors.items()):
+                    if now - seen > 60:
+                        del self.seen_rumors[rumor_id]
+                        
+            targets = self.membership.pick(self.fanout)
+            # Occasionally contact a seed too, so partitions heal
+            if self.membership.seeds and random.random() < 0.1:
+                seed = random.choice(self.membership.seeds)
+                if seed not in targets:
+                    targets.append(seed)
+            self._send_gossip(targets, rumors, members=True)
+            
+    def receive_gossip(self, message):
+        """Merge a gossiped membership table and any rumors it carries"""
+        sender = tuple(message['addr'])
+        self.membership.merge(message.get('members') or
+                              [[sender[0], sender[1], message['from'], message['heartbeat'],
+                                message.get('generation', 0)]])
+        fresh = []
+        with self.rumor_lock:
+            for rumor in message.get('rumors', []):
+                rumor_id = tuple(rumor['id'])
+                if rumor_id in self.seen_rumors:
+                    self.stats['duplicate_rumors'] += 1
+                    continue
+                self.seen_rumors[rumor_id] = time.time()
+                rumor = dict(rumor, hops=rumor['hops'] + 1)
+                self.active_rumors[rumor_id] = [rumor, self._rumor_rounds()]
+                fresh.append(rumor)
+        if fresh:
+            self.forward_queue.put((fresh, sender))
+        for rumor in fresh:
+            self.stats['rumors_received'] += 1
+            self.stats['max_rumor_hops'] = max(self.stats['max_rumor_hops'], rumor['hops'])
+            # Blocks when the applier is behind, which pushes back on this peer's connection
+            self.apply_queue.put((rumor['delta'], rumor['id'][0], time.time(), None, None))
+            self.stats['max_apply_queue'] = max(self.stats['max_apply_queue'], self.apply_queue.qsize())
+            
+    def _apply_loop(self):
+        """Single applier: merge queued deltas in batches and persist the state now and then"""
+        while self.running:
+            try:
+                items = [self.apply_queue.get(timeout=1)]
+            except queue.Empty:
+                items = []
+            while items and len(items) < self.apply_batch:
+                try:
+                    items.append(self.apply_queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Gossip deltas join into batches; a Merkle repair is merged on its own, in queue order
+            run = []
+            for item in items:
+                if item[3] is None:
+                    run.append(item)
+                    continue
+                if run:
+                    self._apply_batch(run)
+                    run = []
+                self._apply_repair(item)
+            if run:
+                self._apply_batch(run)
+            if self.state_dirty and time.time() - self.last_save >= self.save_interval:
+                self._flush_state()
                 
-                # Read current lexicon
-                with open(self.lexicon_file, 'r') as f:
-                    current_words = f.read().strip().split()
+    def _apply_batch(self, items):
+        """Join a batch of queued deltas and merge them into the lexicon as one"""
+        batch = LexiconORSet(self.node_id)
+        removed = []
+        for delta, _, _, _, _ in items:
+            batch.merge(delta)
+            removed.extend(delta.get('r', ()))
+        sources = ", ".join(sorted({source for _, source, _, _, _ in items}))
+        self.apply_delta(dict(batch.state(), r=removed), sources)
+        now = time.time()
+        self.apply_latencies.extend(now - queued for _, _, queued, _, _ in items)
+        self.stats['apply_batches'] += 1
+        self.stats['deltas_applied'] += len(items)
+        
+    def _apply_repair(self, item):
+        """Merge a peer's state for some Merkle buckets and hand (added, removed) back to its waiter"""
+        state, source, queued, buckets, reply = item
+        reply.put(self.apply_delta(state, source, buckets))
+        self.apply_latencies.append(time.time() - queued)
+        
+    def _queue_repair(self, state, source, buckets):
+        """Have the applier merge a peer's bucket state; returns (added, removed), or None on stop.
+        
+        Repairs take the apply queue like gossip deltas, so they are
+        merged in arrival order and a full queue holds the peer back.
+        """
+        reply = queue.Queue(maxsize=1)
+        self.apply_queue.put((state, source, time.time(), buckets, reply))
+        while self.running:
+            try:
+                return reply.get(timeout=1)
+            except queue.Empty:
+                continue
+        return None
                 
-                # Add new words that aren't already in lexicon
-                words_added = []
-                for word in new_words:
-                    if word not in current_words:
-                        current_words.append(word)
-                        words_added.append(word)
+    def apply_delta(self, delta, source, buckets=None):
+        """Join a delta, or a peer's state for some Merkle buckets, into the local lexicon. Idempotent."""
+        with self.lexicon_lock:
+            if buckets is None:
+                added, removed, changed = self.lexicon.merge(delta)
+            else:
+                bucket_set = set(buckets)
+                local_words = [word for bucket in bucket_set for word in self.tree.words_in(bucket)]
+                added, removed, changed = self.lexicon.merge(
+                    delta, lambda word: self.tree.bucket_of(word) in bucket_set, local_words)
+            for word in changed:
+                self._retag(word)
+            if changed:
+                self._save_state()
                 
-                # Write updated lexicon
-                if words_added:
-                    with open(self.lexicon_file, 'w') as f:
-                        f.write(' '.join(current_words))
-                    
-                    print(f"[SYNC] Received and added {len(words_added)} new words from {message['from']}")
-                    print(f"[SYNC] New words: {', '.join(words_added[:5])}{'...' if len(words_added) > 5 else ''}")
-                    self.lexicon_version = message['version']
-                    return True
-                    
+        if added or removed:
+            print(f"[SYNC] Applied delta from {source}: +{len(added)} -{len(removed)} words")
+            if added:
+                print(f"[SYNC] New words: {', '.join(added[:5])}{'...' if len(added) > 5 else ''}")
+            if self.on_change:
+                self.on_change(added, removed)
+        return added, removed
+        
+    def _bucket_state(self, buckets):
+        """CRDT state of the words in some leaf buckets (caller holds lexicon_lock)"""
+        words = [word for bucket in buckets for word in self.tree.words_in(bucket)]
+        return self.lexicon.state(words)
+        
+    def _answer_merkle(self, conn, message, wire=None):
+        """Responder side of anti-entropy: report differing nodes, then swap bucket states"""
+        if self.bootstrapping:
+            # Our lexicon is still arriving as a snapshot; comparing against it would ship everything
+            return send_message(conn, {'type': 'merkle_busy'}, wire)
+        if message['type'] == 'merkle_level':
+            with self.lexicon_lock:
+                mismatch = self.tree.mismatches(message['level'], message['nodes'])
+                words = len(self.lexicon)
+            return send_message(conn, {'type': 'merkle_diff', 'level': message['level'], 'mismatch': mismatch,
+                                       'words': words}, wire)
+            
+        if message['type'] == 'merkle_context':
+            reply = self._exchange_context(message)
+            return send_message(conn, reply, wire)
+            
+        # bucket_state: merge the initiator's buckets, send back ours (which now include theirs)
+        buckets = message['buckets']
+        if self._queue_repair(message['state'], message['from'], buckets) is None:
+            return 0
+        with self.lexicon_lock:
+            state = self._bucket_state(buckets)
+        return send_message(conn, {'type': 'bucket_state', 'from': self.node_id, 'buckets': buckets, 'state': state},
+                            wire)
+        
+    def _exchange_context(self, message):
+        """Absorb a peer's causal context when both replicas hold identical entries.
+        
+        Scoped bucket merges only absorb dots they saw, so dots of words
+        removed elsewhere can linger in the context cloud. Once the digests
+        match, the peer's whole context is safe to take, which lets
+        compact() garbage-collect those dots.
+        """
+        with self.lexicon_lock:
+            digest = self.tree.root()
+            if message['digest'] == digest:
+                self.lexicon.absorb_context(message['context'])
+            return {'type': 'merkle_context', 'digest': digest, 'context': self.lexicon.context.to_dict()}
+            
+    def _send_snapshot(self, conn):
+        """Stream our whole CRDT state: a header with the causal context, then compressed chunks.
+        
+        Only the entry references are copied under the lock (merges replace a
+        word's dot set rather than mutating it), so encoding and sending the
+        chunks does not block local updates or incoming deltas.
+        """
+        if self.bootstrapping:
+            return send_message(conn, {'type': 'snapshot_unavailable'})
+        with self.lexicon_lock:
+            entries = list(self.lexicon.entries.items())
+            context = self.lexicon.context.to_dict()
+        starts = range(0, len(entries), self.snapshot_chunk)
+        sent = send_message(conn, {'type': 'snapshot_begin', 'from': self.node_id, 'context': context,
+                                   'words': len(entries), 'chunks': len(starts)})
+        for start in starts:
+            chunk = encode_chunk(entries[start:start + self.snapshot_chunk])
+            sent += send_frame(conn, zlib.compress(chunk, 1))
+        sent += send_message(conn, {'type': 'snapshot_end'})
+        self.stats['snapshots_sent'] += 1
+        return sent
+        
+    def fetch_snapshot(self, peer_address):
+        """Replace a missing or far-behind lexicon with a peer's full state.
+        
+        Chunks are decoded into a staging replica (and its Merkle tree) as
+        they arrive, while the
+        live replica keeps serving and applying gossip. The staging replica
+        then takes the snapshot's causal context, joins whatever the live
+        replica holds (including deltas that arrived meanwhile), and replaces
+        it; from there on the node just follows deltas again.
+        Returns the number of words received, or None if the peer declined.
+        """
+        start = time.time()
+        received = 0
+        staging = LexiconORSet(self.node_id)
+        sock = socket.create_connection(peer_address, timeout=5)
+        try:
+            send_message(sock, {'type': 'snapshot_request', 'from': self.node_id})
+            header = recv_message(sock)
+            if header is None or header['type'] != 'snapshot_begin':
+                return None
+            tree = LexiconMerkleTree()
+            for _ in range(header['chunks']):
+                frame = recv_frame(sock)
+                if frame is None:
+                    raise ConnectionError("peer closed during snapshot")
+                received += len(frame)
+                entries = decode_chunk(zlib.decompress(frame))
+                staging.load_entries(entries)
+                tree.add_many((word, staging.tag(word)) for word in entries)
+            if recv_message(sock) is None:
+                raise ConnectionError("peer closed before snapshot end")
+        finally:
+            sock.close()
+        staging.absorb_context(header['context'])
+        
+        with self.lexicon_lock:
+            previous = self.lexicon
+            _, _, changed = staging.merge(previous.state())
+            self.lexicon, self.tree = staging, tree
+            for word in changed:
+                self._retag(word)
+            self._save_state()
+            # staging is the live lexicon now, which gossip changes as soon as the lock is released
+            added = [word for word in staging if word not in previous]
+            removed = [word for word in previous if word not in staging]
+        
+        elapsed = time.time() - start
+        self.stats['snapshots_received'] += 1
+        self.stats['snapshot_bytes'] += received
+        self.stats['last_snapshot_seconds'] = elapsed
+        print(f"[SYNC] Snapshot from {header['from']}: {header['words']} words, "
+              f"{received / 1e6:.1f} MB compressed in {elapsed:.2f}s")
+        if (added or removed) and self.on_change:
+            self.on_change(added, removed)
+        return header['words']
+        
+    def _bootstrap(self):
+        """First start: pull a snapshot from a seed, or seed from the file if none can serve one"""
+        for peer in list(self.membership.seeds):
+            try:
+                if self.fetch_snapshot(peer) is not None:
+                    break
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"[SYNC] Snapshot from {peer[0]}:{peer[1]} failed: {e}")
+        else:
+            self._seed_from_file()
+        self.bootstrapping = False
+        
+    def handle_peer(self, conn, addr):
+        """Read framed sync messages from one long-lived peer connection"""
+        wire = None  # compression, once the peer's hello asks for it
+        try:
+            while self.running:
+                message = recv_message(conn, wire)
+                if message is None:
+                    break
+                if message['type'] == 'hello':
+                    wire = self.compression if self.compression and CODEC in message.get('compression', ()) else None
+                    send_message(conn, {'type': 'hello', 'compression': CODEC if wire else None})
+                elif message['type'] == 'gossip':
+                    self.receive_gossip(message)
+                elif message['type'] == 'status':
+                    send_message(conn, self.get_status(), wire)
+                elif message['type'] in ('merkle_level', 'merkle_context', 'bucket_state'):
+                    self.stats['anti_entropy_bytes'] += self._answer_merkle(conn, message, wire)
+                elif message['type'] == 'snapshot_request':
+                    self._send_snapshot(conn)
         except Exception as e:
-            print(f"[SYNC] Error processing update: {e}")
-        return False
+            if self.running:
+                print(f"[SYNC] Peer connection {addr} ended: {e}")
+        finally:
+            conn.close()
+            
+    def reconcile(self, peer_address):
+        """Run one anti-entropy round with a peer.
         
+        Descend the hash tree level by level, only expanding nodes whose
+        digests differ, then exchange the CRDT state of the differing leaf
+        buckets. Traffic grows with the difference, not the lexicon size.
+        When the trees already match, swap causal contexts instead; when
+        most leaves differ and the peer is at least as big, a snapshot is
+        cheaper than shipping nearly every bucket.
+        """
+        sent = 0
+        repaired = 0
+        snapshot = False
+        sock = socket.create_connection(peer_address, timeout=5)
+        try:
+            wire = offer_compression(sock, self.compression)
+            candidates = [0]
+            for level in range(self.tree.depth + 1):
+                with self.lexicon_lock:
+                    nodes = [[index, self.tree.node(level, index)] for index in candidates]
+                sent += send_message(sock, {'type': 'merkle_level', 'level': level, 'nodes': nodes}, wire)
+                reply = recv_message(sock, wire)
+                if reply is None:
+                    raise ConnectionError("peer closed during digest exchange")
+                if reply['type'] == 'merkle_busy':
+                    return 0
+                mismatch = reply['mismatch']
+                if not mismatch:
+                    break
+                if level < self.tree.depth:
+                    candidates = [child for index in mismatch for child in self.tree.children(index)]
+            else:
+                if (len(mismatch) >= self.snapshot_threshold * self.tree.num_leaves
+                        and reply.get('words', 0) >= len(self.lexicon)):
+                    snapshot = True
+                    mismatch = []
+            if mismatch:
+                with self.lexicon_lock:
+                    state = self._bucket_state(mismatch)
+                sent += send_message(sock, {'type': 'bucket_state', 'from': self.node_id, 'buckets': mismatch, 'state': state},
+                                     wire)
+                reply = recv_message(sock, wire)
+                if reply is None:
+                    raise ConnectionError("peer closed during bucket exchange")
+                added, removed = self._queue_repair(reply['state'], reply['from'], reply['buckets']) or ((), ())
+                repaired = len(added) + len(removed)
+                
+            if level == 0 and not mismatch:
+                with self.lexicon_lock:
+                    message = {'type': 'merkle_context', 'digest': self.tree.root(), 'context': self.lexicon.context.to_dict()}
+                sent += send_message(sock, message, wire)
+                reply = recv_message(sock, wire)
+                if reply is not None:
+                    self._exchange_context(reply)
+        finally:
+            sock.close()
+            
+        if snapshot:
+            print(f"[SYNC] Lexicon far behind {peer_address[0]}:{peer_address[1]}, fetching a snapshot")
+            repaired = self.fetch_snapshot(peer_address) or 0
+        self.stats['anti_entropy_rounds'] += 1
+        self.stats['words_repaired'] += repaired
+        self.stats['anti_entropy_bytes'] += sent
+        return repaired
+        
+    def _anti_entropy_loop(self):
+        """Periodically reconcile with one random live member"""
+        while self.running:
+            time.sleep(self.anti_entropy_interval)
+            targets = self.membership.pick(1)
+            if not targets or self.bootstrapping:
+                continue
+            peer = targets[0]
+            try:
+                self.reconcile(peer)
+            except (OSError, ValueError, zlib.error) as e:
+                print(f"[SYNC] Anti-entropy with {peer[0]}:{peer[1]} failed: {e}")
+            
     def listen_for_updates(self):
-        """Listen for incoming sync messages from peers"""
+        """Listen for incoming sync connections from peers"""
         try:
             self.sync_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.sync_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.sync_socket.bind(('localhost', self.sync_port))
-            self.sync_socket.listen(5)
+            self.sync_socket.bind(self.address)
+            self.sync_socket.listen(64)
             
             print(f"[SYNC] Listening for sync updates on port {self.sync_port}")
             
@@ -97,14 +734,10 @@ class SyncManager:
                 try:
                     self.sync_socket.settimeout(1)  # Check for stop signal every second
                     conn, addr = self.sync_socket.accept()
+                    conn.settimeout(None)
                     
-                    # Receive sync message
-                    data = conn.recv(4096).decode()
-                    if data:
-                        message = json.loads(data)
-                        self.receive_update(message)
-                    
-                    conn.close()
+                    # Peers keep their connection open, so each gets its own reader
+                    threading.Thread(target=self.handle_peer, args=(conn, addr), daemon=True).start()
                     
                 except socket.timeout:
                     continue  # Check if still running
@@ -123,6 +756,16 @@ class SyncManager:
         self.running = True
         self.listener_thread = threading.Thread(target=self.listen_for_updates, daemon=True)
         self.listener_thread.start()
+        self.sender_thread = threading.Thread(target=self._sender_loop, daemon=True)
+        self.sender_thread.start()
+        threading.Thread(target=self._forward_loop, daemon=True).start()
+        self.apply_thread = threading.Thread(target=self._apply_loop, daemon=True)
+        self.apply_thread.start()
+        threading.Thread(target=self._gossip_loop, daemon=True).start()
+        self.anti_entropy_thread = threading.Thread(target=self._anti_entropy_loop, daemon=True)
+        self.anti_entropy_thread.start()
+        if self.bootstrapping:
+            threading.Thread(target=self._bootstrap, daemon=True).start()
         print(f"[SYNC] Sync manager started for {self.node_id}")
         
     def stop(self):
@@ -133,13 +776,93 @@ class SyncManager:
                 self.sync_socket.close()
             except:
                 pass
+        with self.connections_lock:
+            for peer in self.connections.values():
+                peer.close()
+        # The applier may be mid-flush to the same .tmp file: let it finish before the last write
+        if self.apply_thread:
+            self.apply_thread.join()
+        self._flush_state()
         print(f"[SYNC] Sync manager stopped for {self.node_id}")
         
+    def digest(self):
+        """Root digest of the local lexicon"""
+        with self.lexicon_lock:
+            return self.tree.root()
+            
+    def version_vector(self):
+        """Vector clock of every lexicon event this node has observed"""
+        with self.lexicon_lock:
+            return self.lexicon.version_vector()
+            
+    def words(self):
+        """Snapshot of the current lexicon words"""
+        with self.lexicon_lock:
+            return list(self.lexicon)
+            
     def get_status(self):
         """Get sync manager status"""
+        latencies = sorted(self.apply_latencies)
         return {
             'node_id': self.node_id,
-            'version': self.lexicon_version,
-            'peers': len(self.peers),
+            'version': self.version_vector(),
+            'peers': len(self.membership.alive()),
+            'members': self.membership.get_stats(),
+            'connected_peers': sum(1 for peer in list(self.connections.values()) if peer.connected()),
+            'queued_updates': self.outbox.qsize(),
+            'batches_sent': self.stats['batches_sent'],
+            'updates_coalesced': self.stats['updates_coalesced'],
+            'words': len(self.lexicon),
+            'pending_dots': len(self.lexicon.context.cloud),
+            'digest': self.digest(),
+            'anti_entropy_rounds': self.stats['anti_entropy_rounds'],
+            'words_repaired': self.stats['words_repaired'],
+            'gossip_messages': self.stats['gossip_messages'],
+            'rumors_received': self.stats['rumors_received'],
+            'duplicate_rumors': self.stats['duplicate_rumors'],
+            'max_rumor_hops': self.stats['max_rumor_hops'],
+            'bootstrapping': self.bootstrapping,
+            'snapshots_sent': self.stats['snapshots_sent'],
+            'snapshots_received': self.stats['snapshots_received'],
+            'snapshot_bytes': self.stats['snapshot_bytes'],
+            'compression': self.compression.snapshot() if self.compression else None,
+            'last_snapshot_seconds': self.stats['last_snapshot_seconds'],
+            'apply_queue_depth': self.apply_queue.qsize(),
+            'max_apply_queue': self.stats['max_apply_queue'],
+            'apply_batches': self.stats['apply_batches'],
+            'deltas_applied': self.stats['deltas_applied'],
+            'apply_latency_ms': {
+                'avg': sum(latencies) / len(latencies) * 1000 if latencies else 0,
+                'p99': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0
+            },
+            'state_saves': self.stats['state_saves'],
             'running': self.running
-        }
\ No newline at end of file
+        }
+
+if __name__ == "__main__":
+    # Headless sync node, e.g. for local multi-process cluster tests
+    parser = argparse.ArgumentParser(description="Run a standalone lexicon sync node")
+    parser.add_argument('--node-id', required=True)
+    parser.add_argument('--port', type=int, required=True)
+    parser.add_argument('--lexicon', required=True)
+    parser.add_argument('--seeds', default="", help="comma separated host:port list")
+    parser.add_argument('--fanout', type=int, default=3)
+    parser.add_argument('--gossip-interval', type=float, default=1)
+    parser.add_argument('--anti-entropy-interval', type=float, default=10)
+    parser.add_argument('--suspect-after', type=float, default=5)
+    parser.add_argument('--dead-after', type=float, default=15)
+    args = parser.parse_args()
+    
+    node = SyncManager(args.node_id, args.lexicon, args.port, fanout=args.fanout,
+                       gossip_interval=args.gossip_interval,
+                       anti_entropy_interval=args.anti_entropy_interval,
+                       suspect_after=args.suspect_after, dead_after=args.dead_after)
+    for seed in filter(None, args.seeds.split(',')):
+        host, port = seed.rsplit(':', 1)
+        node.add_peer((host, int(port)))
+    node.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        node.stop()
@@ -0,0 +1,83 @@
+"""
+Tests for admission control: token buckets and the bounded wait queue
+"""
+
+import threading
+import time
+
+from admission import AdmissionController, TokenBucket, busy_message, parse_busy
+
+def test_bucket_allows_a_burst_then_refuses():
+    bucket = TokenBucket(rate=1, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    wait = bucket.take()
+    assert 0 < wait <= 1
+
+def test_bucket_refills_at_its_rate():
+    bucket = TokenBucket(rate=10, burst=2)
+    bucket.take()
+    bucket.take()
+    bucket.updated -= 0.15  # 0.15 s later: one and a half tokens
+    assert bucket.take() == 0
+    assert bucket.take() > 0
+
+def test_bucket_never_holds_more_than_burst():
+    bucket = TokenBucket(rate=1, burst=2)
+    bucket.updated -= 60
+    assert [bucket.take() for _ in range(2)] == [0, 0]
+    assert bucket.take() > 0
+
+def test_rate_is_per_user():
+    admission = AdmissionController(rate=1, burst=1)
+    assert admission.check_rate("alice") == 0
+    assert admission.check_rate("alice") > 0
+    assert admission.check_rate("bob") == 0
+    assert admission.get_stats()['rejected_rate'] == 1
+
+def test_no_rate_limit_by_default():
+    admission = AdmissionController()
+    assert all(admission.check_rate("alice") == 0 for _ in range(100))
+
+def test_admits_while_a_backend_has_room():
+    admission = AdmissionController()
+    assert admission.admit(lambda: "server") == ("server", None)
+    assert admission.get_stats()['admitted'] == 1
+
+def test_full_queue_rejects_at_once():
+    admission = AdmissionController(queue_size=0)
+    server, retry_after = admission.admit(lambda: None)
+    assert server is None and retry_after > 0
+    assert admission.get_stats()['rejected_busy'] == 1
+
+def test_non_blocking_admit_does_not_queue():
+    admission = AdmissionController(queue_timeout=5)
+    start = time.time()
+    assert admission.admit(lambda: None, block=False)[0] is None
+    assert time.time() - start < 1
+    assert admission.get_stats()['queued'] == 0
+
+def test_queued_request_times_out():
+    admission = AdmissionController(queue_timeout=0.05)
+    server, retry_after = admission.admit(lambda: None)
+    assert server is None and retry_after > 0
+    stats = admission.get_stats()
+    assert stats['queued'] == 1 and stats['rejected_timeout'] == 1 and stats['waiting'] == 0
+
+def test_released_slot_wakes_a_queued_request():
+    admission = AdmissionController(queue_timeout=5)
+    free = []
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(admission.admit(lambda: free.pop() if free else None)))
+    waiter.start()
+    while not admission.get_stats()['waiting']:
+        time.sleep(0.001)
+    with admission.slots:
+        free.append("server")
+    admission.release()
+    waiter.join(5)
+    assert result == [("server", None)]
+
+def test_busy_message_round_trip():
+    assert parse_busy(busy_message(1.5)) == 1.5
+    assert parse_busy("BUSY retry_after=junk") == 1.0
+    assert parse_busy(b"OK") is None
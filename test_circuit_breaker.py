@@ -0,0 +1,91 @@
+"""
+Tests for the circuit breaker's closed, open and half-open states
+"""
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+def expire(breaker):
+    """Pretend the breaker's open (or trial) period is over"""
+    breaker.changed_at -= breaker.open_timeout
+
+def opened(**options):
+    breaker = CircuitBreaker(**options)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    return breaker
+
+def test_consecutive_failures_open_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.available()
+    breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.available()
+
+def test_success_resets_the_failure_streak():
+    breaker = CircuitBreaker(failure_threshold=3, failure_rate=1.0)
+    for _ in range(5):
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success()
+    assert breaker.state == CLOSED
+
+def test_failure_rate_opens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=100, failure_rate=0.5, min_calls=4)
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.state == CLOSED  # under min_calls
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=2, slow_call=1.0)
+    breaker.record_success(0.5)
+    breaker.record_success(2.0)
+    breaker.record_success(3.0)
+    assert breaker.state == OPEN
+
+def test_half_open_lets_through_only_the_trials():
+    breaker = opened(trials=2)
+    expire(breaker)
+    assert breaker.available() and breaker.state == HALF_OPEN
+    breaker.attempt()
+    assert breaker.available()
+    breaker.attempt()
+    assert not breaker.available()
+
+def test_passed_trials_close_the_breaker():
+    breaker = opened(trials=2, open_timeout=5.0)
+    expire(breaker)
+    for _ in range(2):
+        assert breaker.available()
+        breaker.attempt()
+        breaker.record_success()
+    assert breaker.state == CLOSED and breaker.available()
+    assert breaker.snapshot()['recovered'] == 1
+
+def test_failed_trial_reopens_for_longer():
+    breaker = opened(open_timeout=5.0, max_open_timeout=12.0)
+    for expected in (10.0, 12.0):
+        expire(breaker)
+        assert breaker.available()
+        breaker.attempt()
+        breaker.record_failure()
+        assert breaker.state == OPEN and breaker.open_timeout == expected
+    expire(breaker)
+    breaker.available()
+    for _ in range(breaker.trials):
+        breaker.attempt()
+        breaker.record_success()
+    assert breaker.state == CLOSED and breaker.open_timeout == 5.0
+
+def test_unanswered_trials_are_renewed():
+    breaker = opened(trials=1)
+    expire(breaker)
+    breaker.available()
+    breaker.attempt()
+    assert not breaker.available()
+    expire(breaker)
+    assert breaker.available() and breaker.state == HALF_OPEN
@@ -0,0 +1,85 @@
+"""
+Tests for the phi-accrual failure detector and the health monitor's use of it
+"""
+
+from failure_detector import MAX_PHI, PhiAccrualDetector
+from health_monitor import HealthMonitor
+
+SERVER = ("localhost", 7530)
+
+def steady(delays, min_std=0.2):
+    """A detector that saw heartbeats every second, arriving the given delays late"""
+    detector = PhiAccrualDetector(min_std=min_std)
+    detector.heartbeat(0.0, 1.0)
+    for beat, delay in enumerate(delays, 1):
+        detector.heartbeat(beat + delay, beat + 1.0)
+    return detector, len(delays) + 1.0
+
+def test_no_suspicion_before_the_first_heartbeat():
+    assert PhiAccrualDetector().phi(1e9) == 0.0
+
+def test_phi_grows_with_lateness():
+    detector, due = steady([0.05] * 20)
+    readings = [detector.phi(due + late) for late in (0.0, 0.5, 1.0, 2.0)]
+    assert readings == sorted(readings)
+    assert readings[0] < 1 < readings[-1]
+
+def test_phi_is_capped():
+    detector, due = steady([0.05] * 20)
+    assert detector.phi(due + 1e6) == MAX_PHI
+
+def test_jitter_raises_the_bar():
+    calm, due = steady([0.05] * 20, min_std=0.01)
+    jittery, _ = steady([0.0, 0.5] * 10, min_std=0.01)
+    assert jittery.phi(due + 1.0) < calm.phi(due + 1.0)
+
+def test_unsampled_heartbeat_is_not_timed():
+    detector, due = steady([0.05] * 5)
+    detector.heartbeat(due + 60, due + 61, sample=False)  # back after an outage
+    assert len(detector.delays) == 5 and max(detector.delays) < 1
+
+def test_expect_by_only_brings_the_deadline_forward():
+    detector = PhiAccrualDetector()
+    detector.heartbeat(0.0, 10.0)
+    detector.expect_by(2.0)
+    detector.expect_by(5.0)
+    assert detector.expected == 2.0
+
+def overdue_monitor(**options):
+    """A monitor whose one server answered once and then went quiet long ago"""
+    monitor = HealthMonitor(**options)
+    monitor.add_server(SERVER)
+    monitor._record(SERVER, (0.01, None))
+    monitor.detectors[SERVER].expected -= 1000
+    return monitor
+
+def test_phi_takes_phi_probes_failed_checks_to_remove_a_server():
+    monitor = overdue_monitor(phi_threshold=8, phi_probes=2, failure_threshold=100)
+    assert monitor.suspect(SERVER)
+    monitor._record(SERVER, None)
+    assert SERVER in monitor.healthy_servers and monitor.servers[SERVER]['phi_over'] == 1
+    monitor._record(SERVER, None)
+    assert SERVER not in monitor.healthy_servers
+
+def test_failed_check_below_threshold_resets_the_count():
+    monitor = overdue_monitor(phi_threshold=8, phi_probes=2)
+    monitor._record(SERVER, None)
+    monitor.detectors[SERVER].expected += 2000  # not due yet
+    monitor._record(SERVER, None)
+    assert monitor.servers[SERVER]['phi_over'] == 0
+    assert SERVER in monitor.healthy_servers
+
+def test_healthy_answer_clears_suspicion():
+    monitor = overdue_monitor(phi_threshold=8, phi_probes=2)
+    monitor._record(SERVER, None)
+    monitor._record(SERVER, (0.01, None))
+    assert monitor.servers[SERVER]['phi_over'] == 0 and not monitor.suspect(SERVER)
+
+def test_without_phi_failed_checks_decide():
+    monitor = overdue_monitor(failure_threshold=3)
+    assert not monitor.suspect(SERVER)
+    for _ in range(2):
+        monitor._record(SERVER, None)
+    assert SERVER in monitor.healthy_servers
+    monitor._record(SERVER, None)
+    assert SERVER not in monitor.healthy_servers
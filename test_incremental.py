@@ -0,0 +1,83 @@
+"""
+Tests for incremental checks: document diffs apply back to the new version
+"""
+
+import random
+
+import pytest
+
+from incremental import (DocumentStore, apply_edits, apply_patch, diff_document, diff_tokens, join_document,
+                         split_document)
+
+WORDS = ["colour", "grey", "theatre", "the", "a", "centre.", "favour!", "line\nbreak", "metre?"]
+
+def document(rng, size):
+    return " ".join(rng.choice(WORDS) for _ in range(size))
+
+def edit(rng, text, changes):
+    tokens = text.split(" ")
+    for _ in range(changes):
+        position = rng.randrange(len(tokens) + 1)
+        action = rng.choice(("insert", "delete", "replace"))
+        if action == "insert" or not tokens[position:]:
+            tokens.insert(position, rng.choice(WORDS))
+        elif action == "delete" and len(tokens) > 1:
+            del tokens[position]
+        else:
+            tokens[position] = rng.choice(WORDS)
+    return " ".join(tokens)
+
+def round_trip(old_text, new_text):
+    change = diff_document(old_text, new_text)
+    if change is None:
+        return None
+    _, old, _ = split_document(old_text)
+    return join_document(change['lead'], apply_edits(old, change['edits']), change['trail'])
+
+def test_split_and_join_are_inverse():
+    for text in ("  colour grey \n", "colour", "", "   ", "a\nb  c"):
+        assert join_document(*split_document(text)) == text
+
+@pytest.mark.parametrize("seed", range(20))
+def test_token_diff_round_trip(seed):
+    rng = random.Random(seed)
+    old = document(rng, 200).split(" ")
+    new = edit(rng, " ".join(old), rng.randrange(1, 10)).split(" ")
+    assert apply_edits(old, diff_tokens(old, new)) == new
+
+@pytest.mark.parametrize("seed", range(20))
+def test_document_diff_round_trip(seed):
+    rng = random.Random(seed)
+    old = document(rng, 300)
+    new = "\n " + edit(rng, old, rng.randrange(1, 6)) + "  "
+    assert round_trip(old, new) == new
+
+def test_unchanged_document_has_no_edits():
+    text = "colour grey\ntheatre"
+    assert diff_document(text, text)['edits'] == []
+
+def test_rewrite_is_sent_whole():
+    assert diff_document("colour grey theatre centre", "one two three four") is None
+
+def test_edits_that_do_not_fit_are_rejected():
+    with pytest.raises(ValueError):
+        apply_edits(["a", "b"], [[1, 3, ["c"]]])
+    with pytest.raises(ValueError):
+        apply_edits(["a", "b", "c"], [[2, 2, ["x"]], [0, 1, []]])
+
+def test_patch_applies_to_the_corrected_text():
+    old, new = "the colour is grey", "the colour was grey"
+    corrected = "the [colour] is [grey]"
+    patch = [[2, 3, ["was"]]]
+    assert diff_document(old, new)['edits'] == patch
+    assert apply_patch(corrected, patch) == "the [colour] was [grey]"
+
+def test_store_drops_the_least_recently_used():
+    store = DocumentStore(max_documents=2)
+    store.put("a", "a", "A", 1)
+    store.put("b", "b", "B", 1)
+    store.get("a")
+    store.put("c", "c", "C", 1)
+    assert store.get("b") is None
+    assert store.get("a") == ("a", "A", 1)
+    assert (store.hits, store.misses) == (2, 1)
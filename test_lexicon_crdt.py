@@ -0,0 +1,75 @@
+"""
+Tests for the lexicon OR-set: deltas and full states converge
+"""
+
+import itertools
+
+from lexicon_crdt import LexiconORSet
+
+def replicas(*names):
+    return [LexiconORSet(name) for name in names]
+
+def test_deltas_converge_in_any_order():
+    a, b = replicas("a", "b")
+    deltas = [a.add(["colour", "favour"]), b.add(["grey"]), a.remove(["favour"]), b.add(["favour"])]
+    results = []
+    for order in itertools.permutations(deltas):
+        replica = LexiconORSet("c")
+        for delta in order + order:  # duplicated deltas change nothing
+            replica.merge(delta)
+        results.append(sorted(replica))
+    assert all(result == results[0] for result in results)
+    # b's add of "favour" never saw a's dot, so it survives a's remove
+    assert results[0] == ["colour", "favour", "grey"]
+
+def test_concurrent_add_wins_over_remove():
+    a, b = replicas("a", "b")
+    b.merge(a.add(["colour"]))
+    removal = a.remove(["colour"])
+    readd = b.add(["colour"])
+    a.merge(readd)
+    b.merge(removal)
+    assert "colour" in a and "colour" in b
+    assert a.tag("colour") == b.tag("colour")
+
+def test_observed_remove_propagates():
+    a, b = replicas("a", "b")
+    b.merge(a.add(["colour", "grey"]))
+    added, removed, changed = a.merge(b.remove(["grey"]))
+    assert sorted(a) == ["colour"]
+    assert (added, removed, changed) == ([], ["grey"], ["grey"])
+
+def test_full_state_merge_converges_both_ways():
+    a, b = replicas("a", "b")
+    shared = a.add(["colour", "grey", "favour"])
+    b.merge(shared)
+    a.remove(["grey"])
+    a.add(["theatre"])
+    b.remove(["favour"])
+    b.add(["centre"])
+    a_state, b_state = a.state(), b.state()
+    a.merge(b_state)
+    b.merge(a_state)
+    assert sorted(a) == sorted(b) == ["centre", "colour", "theatre"]
+    assert a.version_vector() == b.version_vector()
+
+def test_full_state_with_only_cloud_dots_removes_words():
+    a, b, c = replicas("a", "b", "c")
+    a.add(["grey"])  # a:1, which b and c never see
+    added = a.add(["colour"])
+    b.merge(added)
+    c.merge(added)
+    c.merge(a.remove(["colour"]))
+    state = c.state()
+    assert not state['c']['vv'] and state['c']['dots']  # c only knows a:2, out of order
+    b.merge(state)
+    assert "colour" not in b
+
+def test_from_state_round_trip():
+    a = LexiconORSet("a")
+    a.add(["colour", "grey"])
+    a.remove(["grey"])
+    copy = LexiconORSet.from_state("b", a.state())
+    assert sorted(copy) == sorted(a)
+    assert copy.tag("colour") == a.tag("colour")
+    assert copy.version_vector() == a.version_vector()
@@ -0,0 +1,66 @@
+"""
+Tests for Merkle-scoped reconciliation of lexicon replicas
+"""
+
+from lexicon_crdt import LexiconORSet
+from merkle_tree import LexiconMerkleTree
+
+def digest(replica):
+    tree = LexiconMerkleTree(fanout=4, depth=2)
+    tree.add_many((word, replica.tag(word)) for word in replica)
+    return tree
+
+def differing_buckets(mine, theirs):
+    """Walk both trees from the root, as peers do over the wire, down to the leaves that differ"""
+    nodes = [0]
+    for level in range(mine.depth + 1):
+        nodes = mine.mismatches(level, [(index, theirs.node(level, index)) for index in nodes])
+        if level < mine.depth:
+            nodes = [child for index in nodes for child in mine.children(index)]
+    return set(nodes)
+
+def reconcile(a, b):
+    """Exchange the states of the differing buckets only, each side merging with a scope"""
+    a_tree, b_tree = digest(a), digest(b)
+    buckets = differing_buckets(a_tree, b_tree)
+    a_words = [word for bucket in buckets for word in a_tree.words_in(bucket)]
+    b_words = [word for bucket in buckets for word in b_tree.words_in(bucket)]
+    a_state, b_state = a.state(a_words), b.state(b_words)
+    a.merge(b_state, lambda word: a_tree.bucket_of(word) in buckets, a_words)
+    b.merge(a_state, lambda word: b_tree.bucket_of(word) in buckets, b_words)
+    return buckets
+
+def test_identical_replicas_have_no_differing_buckets():
+    a, b = LexiconORSet("a"), LexiconORSet("b")
+    b.merge(a.add(["colour", "grey", "theatre"]))
+    assert digest(a).root() == digest(b).root()
+    assert reconcile(a, b) == set()
+
+def test_tag_change_alone_changes_the_digest():
+    a, b = LexiconORSet("a"), LexiconORSet("b")
+    b.merge(a.add(["colour"]))
+    b.add(["colour"])  # same word, new dot
+    assert digest(a).root() != digest(b).root()
+
+def test_scoped_reconcile_repairs_missed_deltas():
+    a, b = LexiconORSet("a"), LexiconORSet("b")
+    b.merge(a.add(["word%d" % i for i in range(40)]))
+    a.remove(["word3", "word17"])  # deltas b never receives
+    a.add(["colour"])
+    b.add(["grey"])
+    buckets = reconcile(a, b)
+    assert 0 < len(buckets) < digest(a).num_leaves
+    assert sorted(a) == sorted(b)
+    assert "word3" not in b and "colour" in b and "grey" in a
+    assert digest(a).root() == digest(b).root()
+
+def test_scoped_merge_leaves_other_buckets_alone():
+    a, b = LexiconORSet("a"), LexiconORSet("b")
+    b.merge(a.add(["colour", "grey"]))
+    a.remove(["colour", "grey"])
+    tree = digest(b)
+    bucket = tree.bucket_of("colour")
+    b.merge(a.state([]), lambda word: tree.bucket_of(word) == bucket, list(tree.words_in(bucket)))
+    assert "colour" not in b
+    if tree.bucket_of("grey") != bucket:
+        assert "grey" in b
@@ -0,0 +1,82 @@
+"""
+Tests for the consistent-hash ring and content-affinity routing
+"""
+
+from routing import BackendStats, ConsistentHashRing, ContentAffinity
+
+SERVERS = [("localhost", port) for port in range(7530, 7534)]
+KEYS = ["doc%d" % i for i in range(2000)]
+
+def owners(ring):
+    return {key: ring.lookup(key) for key in KEYS}
+
+def test_empty_ring_has_no_owner():
+    assert ConsistentHashRing().lookup("doc") is None
+
+def test_lookup_is_stable():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS)
+    assert owners(ring) == owners(ring)
+    other = ConsistentHashRing()
+    other.sync(reversed(SERVERS))
+    assert owners(other) == owners(ring)
+
+def test_every_server_gets_a_share():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS)
+    counts = {}
+    for owner in owners(ring).values():
+        counts[owner] = counts.get(owner, 0) + 1
+    assert set(counts) == set(SERVERS)
+    assert min(counts.values()) > len(KEYS) / len(SERVERS) / 2
+
+def test_removing_a_server_only_moves_its_keys():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS)
+    before = owners(ring)
+    ring.remove(SERVERS[0])
+    after = owners(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved and all(before[key] == SERVERS[0] for key in moved)
+    ring.add(SERVERS[0])
+    assert owners(ring) == before
+
+def test_adding_a_server_only_takes_keys_for_itself():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS[:3])
+    before = owners(ring)
+    ring.sync(SERVERS)
+    after = owners(ring)
+    moved = [key for key in KEYS if before[key] != after[key]]
+    assert moved and all(after[key] == SERVERS[3] for key in moved)
+    assert len(moved) < len(KEYS) / 2
+
+def test_full_owner_spills_clockwise_and_gets_its_keys_back():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS)
+    before = owners(ring)
+    room = {server: None for server in SERVERS[1:]}  # SERVERS[0] is full
+    spilled = {key: ring.lookup(key, room) for key in KEYS}
+    assert SERVERS[0] not in spilled.values()
+    assert all(spilled[key] == before[key] for key in KEYS if before[key] != SERVERS[0])
+    # The spill target is the one the key would move to if the owner left
+    ring.remove(SERVERS[0])
+    assert spilled == owners(ring)
+    ring.add(SERVERS[0])
+    assert owners(ring) == before
+
+def test_no_server_with_room():
+    ring = ConsistentHashRing()
+    ring.sync(SERVERS)
+    assert ring.lookup("doc", {}) is None
+
+def test_content_affinity_routes_by_key():
+    strategy = ContentAffinity()
+    strategy.track(SERVERS)
+    stats = {server: BackendStats() for server in SERVERS}
+    choice = strategy.choose(SERVERS, stats, "doc1")
+    assert choice == strategy.choose(SERVERS, stats, "doc1")
+    del stats[choice]
+    spill = strategy.choose(list(stats), stats, "doc1")
+    assert spill in stats
+    assert strategy.choose(SERVERS, stats) in SERVERS  # no key: round-robin